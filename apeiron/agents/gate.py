@@ -0,0 +1,157 @@
+import logging
+import os
+import re
+import time
+import unicodedata
+from pathlib import Path
+from typing import Literal
+
+from discord import Message
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from pydantic import BaseModel, Field
+
+from apeiron.agents.utils import load_prompt
+from apeiron.chat_models import create_chat_model
+
+logger = logging.getLogger(__name__)
+
+# Messages answered with a reaction by the heuristic gate
+REACTIONS = {
+    "👍": {"ok", "okay", "k", "kk", "got it", "nice", "cool", "great", "gg"},
+    "❤️": {"thanks", "thank you", "thx", "ty", "tysm", "merci"},
+    "😂": {"lol", "lmao", "haha", "hahaha", "xd", "mdr"},
+}
+
+MENTION_PATTERN = re.compile(r"<(?:@[!&]?|#)\d+>")
+CUSTOM_EMOJI_PATTERN = re.compile(r"<a?:\w+:\d+>")
+
+
+class GateDecision(BaseModel):
+    """Decision of how to handle new messages before running the agent."""
+
+    action: Literal["noop", "react", "agent"] = Field(
+        ...,
+        description="Action: ignore, react with an emoji, or run the full agent",
+    )
+    emoji: str | None = Field(None, description="Emoji to react with")
+    reason: str | None = Field(None, description="Short reason of the decision")
+
+
+def _is_emoji_only(text: str) -> bool:
+    """Check if a text only contains emojis, punctuation and spaces."""
+    text = CUSTOM_EMOJI_PATTERN.sub("😀", text)
+    return any(unicodedata.category(c) == "So" for c in text) and not any(
+        c.isalnum() for c in text
+    )
+
+
+class HeuristicGate:
+    """Gate deciding the obvious cases from the message content.
+
+    Short acknowledgements get a reaction, emoji-only messages are ignored and
+    questions run the agent. Other messages, and messages with attachments,
+    are left undecided.
+    """
+
+    def decide(self, messages: list[Message]) -> GateDecision | None:
+        """Decide how to handle messages, None if undecided."""
+        if any(m.attachments or m.stickers or m.embeds for m in messages):
+            return None
+        text = " ".join(MENTION_PATTERN.sub("", m.content) for m in messages).strip()
+        if not text:
+            return None
+        if "?" in text:
+            return GateDecision(action="agent", reason="question")
+        normalized = text.casefold().strip(" !.~")
+        for emoji, texts in REACTIONS.items():
+            if normalized in texts:
+                return GateDecision(action="react", emoji=emoji, reason=normalized)
+        if _is_emoji_only(text):
+            return GateDecision(action="noop", reason="emoji only")
+        return None
+
+
+class ModelGate:
+    """Gate asking a small chat model to triage the messages."""
+
+    def __init__(self, model: BaseChatModel):
+        prompt = load_prompt(
+            Path(__file__).parent.resolve() / f"{Path(__file__).stem}.yaml",
+        )
+        self.runnable = prompt | model.with_structured_output(GateDecision)
+
+    async def adecide(self, messages: list[BaseMessage]) -> GateDecision:
+        """Decide how to handle the chat messages of a message event."""
+        return await self.runnable.ainvoke({"messages": messages})
+
+
+class Gate:
+    """Pre-filter deciding whether new messages need the full agent.
+
+    The heuristic gate decides first, then the model gate if configured, and
+    undecided messages run the agent. Every decision is logged with its source
+    so the precision of the gate can be measured against the agent responses.
+    """
+
+    def __init__(
+        self,
+        heuristic: HeuristicGate | None = None,
+        model: ModelGate | None = None,
+        shadow: bool = False,
+    ):
+        self.heuristic = heuristic
+        self.model = model
+        self.shadow = shadow
+
+    async def decide(
+        self, messages: list[Message], chat_messages: list[BaseMessage]
+    ) -> GateDecision:
+        """Decide how to handle new messages.
+
+        Args:
+            messages: Discord messages of the event, latest last
+            chat_messages: Chat messages created from the Discord messages
+
+        Returns:
+            Decision of the gate, ``agent`` if undecided
+        """
+        start = time.monotonic()
+        source = "heuristic"
+        decision = self.heuristic.decide(messages) if self.heuristic else None
+        if decision is None and self.model:
+            source = "model"
+            try:
+                decision = await self.model.adecide(chat_messages)
+            except Exception as e:
+                logger.warning(f"Error deciding with the model gate: {str(e)}")
+        if decision is None:
+            source = "default"
+            decision = GateDecision(action="agent", reason="undecided")
+        logger.info(
+            "Gate decision for message %s: %s%s by %s in %.3fs (%s)",
+            messages[-1].id,
+            decision.action,
+            f" {decision.emoji}" if decision.emoji else "",
+            source,
+            time.monotonic() - start,
+            decision.reason,
+        )
+        return decision
+
+
+def create_gate() -> Gate | None:
+    """Create the gate selected by the environment, None if disabled."""
+    shadow = bool(int(os.getenv("APEIRON_GATE_SHADOW", "0")))
+    match os.getenv("APEIRON_GATE", "off"):
+        case "off":
+            return None
+        case "heuristic":
+            return Gate(HeuristicGate(), shadow=shadow)
+        case "model":
+            model = create_chat_model(
+                model=os.getenv("APEIRON_GATE_MODEL", "mistralai:mistral-small-latest")
+            )
+            return Gate(HeuristicGate(), ModelGate(model), shadow=shadow)
+        case gate:
+            raise ValueError(f"Invalid gate: {gate}")
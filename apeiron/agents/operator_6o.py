@@ -3,11 +3,12 @@ from pathlib import Path
 from typing import Literal
 
 from langchain_core.language_models.chat_models import BaseChatModel
-from langgraph.checkpoint.memory import InMemorySaver
 from langgraph.prebuilt import create_react_agent
 from pydantic import BaseModel, Field
 
-from apeiron.agents.utils import load_prompt
+from apeiron.agents.utils import create_trimmed_prompt, load_prompt
+from apeiron.checkpoint import create_checkpointer
+from apeiron.images import ImageCache
 
 logger = logging.getLogger(__name__)
 
@@ -35,23 +36,41 @@ class Response(BaseModel):
     )
 
 
-def create_agent(**kwargs) -> BaseChatModel:
+def create_agent(
+    max_history_tokens: int | None = None,
+    image_cache: ImageCache | None = None,
+    **kwargs,
+) -> BaseChatModel:
     """Create the Operator 6O agent for the graph.
 
     Args:
         tools: Sequence of tools available to the agent
         model: Base chat model to use
+        max_history_tokens: Token budget of the prompt sent to the model,
+            shared by the static prefix and the conversation history, the
+            history is not trimmed if None
+        image_cache: Cache of the downscaled images replacing the attachment
+            URLs in the prompt, the URLs are sent as is if None
         **kwargs: Additional arguments passed to create_react_agent
 
     Returns:
         Configured chat model agent
     """
+    prompt = load_prompt(
+        Path(__file__).parent.resolve() / f"{Path(__file__).stem}.yaml",
+    )
+    if max_history_tokens is not None or image_cache is not None:
+        prompt = create_trimmed_prompt(
+            prompt,
+            kwargs["model"].get_token_ids,
+            max_history_tokens,
+            image_cache=image_cache,
+        )
+    if "checkpointer" not in kwargs:
+        kwargs["checkpointer"] = create_checkpointer()
     return create_react_agent(
         name="Operator 6O",
-        checkpointer=InMemorySaver(),
-        prompt=load_prompt(
-            Path(__file__).parent.resolve() / f"{Path(__file__).stem}.yaml",
-        ),
+        prompt=prompt,
         response_format=(RESPONSE_PROMPT, Response),
         version="v2",
         **kwargs,
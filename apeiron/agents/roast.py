@@ -1,22 +1,28 @@
 import logging
 from pathlib import Path
 
-from langgraph.checkpoint.memory import InMemorySaver
 from langgraph.prebuilt import create_react_agent
 
-from apeiron.agents.utils import load_prompt
+from apeiron.agents.utils import create_trimmed_prompt, load_prompt
+from apeiron.checkpoint import create_checkpointer
 
 logger = logging.getLogger(__name__)
 
 
-def create_agent(**kwargs):
+def create_agent(max_history_tokens: int | None = None, **kwargs):
     """Create the roast generation node for the graph."""
+    prompt = load_prompt(
+        Path(__file__).parent.resolve() / f"{Path(__file__).stem}.yaml",
+    )
+    if max_history_tokens is not None:
+        prompt = create_trimmed_prompt(
+            prompt, kwargs["model"].get_token_ids, max_history_tokens
+        )
+    if "checkpointer" not in kwargs:
+        kwargs["checkpointer"] = create_checkpointer()
     return create_react_agent(
         name="Roast",
-        checkpointer=InMemorySaver(),
-        prompt=load_prompt(
-            Path(__file__).parent.resolve() / f"{Path(__file__).stem}.yaml",
-        ),
+        prompt=prompt,
         version="v2",
         **kwargs,
     )
@@ -1,12 +1,34 @@
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from functools import cache
 from os import PathLike
+from pathlib import Path
+from typing import TYPE_CHECKING
 
 import yaml
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.prompt_values import ChatPromptValue
 from langchain_core.prompts import (
     ChatPromptTemplate,
     FewShotChatMessagePromptTemplate,
-    MessagesPlaceholder,
 )
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+
+from apeiron.messages.utils import (
+    get_image_urls,
+    get_message_token_count,
+    replace_image_urls,
+    trim_messages_images,
+    trim_messages_tokens,
+)
+
+if TYPE_CHECKING:
+    from apeiron.images import ImageCache
+
+logger = logging.getLogger(__name__)
 
 
 def _validate_message(message: dict) -> bool:
@@ -46,8 +68,8 @@ def _create_messages(
     return processed_messages
 
 
-def load_prompt(path: PathLike) -> ChatPromptTemplate:
-    """Create the prompt template from the given YAML file."""
+def _render_prompt_prefix(path: PathLike) -> list[BaseMessage]:
+    """Render the static messages and examples of a YAML prompt file."""
     with open(path) as f:
         prompt_config = yaml.safe_load(f)
     if not prompt_config:
@@ -68,5 +90,119 @@ def load_prompt(path: PathLike) -> ChatPromptTemplate:
                 examples=examples,
             )
         )
-    messages.append(MessagesPlaceholder(variable_name="messages"))
-    return ChatPromptTemplate.from_messages(messages)
+    return ChatPromptTemplate.from_messages(messages).format_messages()
+
+
+class CompiledPrompt(Runnable[dict, ChatPromptValue]):
+    """Prompt of a YAML file with its static prefix rendered once.
+
+    The system messages and few-shot examples are rendered into concrete
+    messages when the file is loaded, and every call only appends the messages
+    of the graph state to them. The file is rendered again when its
+    modification time changes, checked at most every ``check_interval``
+    seconds.
+    """
+
+    def __init__(self, path: PathLike, check_interval: float = 5.0):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._checked_at: float | None = None
+        self._mtime_ns: int | None = None
+        self._prefix: list[BaseMessage] = []
+        self._lock = threading.Lock()
+        self._reload_if_modified()
+
+    @property
+    def prefix(self) -> list[BaseMessage]:
+        """Rendered static messages of the prompt."""
+        self._reload_if_modified()
+        return self._prefix
+
+    def get_token_count(self, get_token_ids: Callable[[str], list[int]]) -> int:
+        """Get the number of text tokens of the static prefix.
+
+        Counts are cached in the rendered messages, until the file changes.
+        """
+        return sum(
+            get_message_token_count(message, get_token_ids) for message in self.prefix
+        )
+
+    def invoke(
+        self, input: dict, config: RunnableConfig | None = None, **kwargs
+    ) -> ChatPromptValue:
+        return ChatPromptValue(messages=[*self.prefix, *input["messages"]])
+
+    async def ainvoke(
+        self, input: dict, config: RunnableConfig | None = None, **kwargs
+    ) -> ChatPromptValue:
+        return self.invoke(input, config, **kwargs)
+
+    def _reload_if_modified(self):
+        now = time.monotonic()
+        if (
+            self._checked_at is not None
+            and now - self._checked_at < self.check_interval
+        ):
+            return
+        self._checked_at = now
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        if mtime_ns == self._mtime_ns:
+            return
+        with self._lock:
+            if mtime_ns != self._mtime_ns:
+                logger.debug("Rendering prompt %s", self.path)
+                self._prefix = _render_prompt_prefix(self.path)
+                self._mtime_ns = mtime_ns
+
+
+@cache
+def _load_prompt(path: Path) -> CompiledPrompt:
+    return CompiledPrompt(path)
+
+
+def load_prompt(path: PathLike) -> CompiledPrompt:
+    """Load the prompt of the given YAML file, shared between agents."""
+    return _load_prompt(Path(path).resolve())
+
+
+def create_trimmed_prompt(
+    prompt: Runnable,
+    get_token_ids: Callable[[str], list[int]],
+    max_tokens: int | None,
+    max_images: int = 8,
+    image_cache: "ImageCache | None" = None,
+) -> Runnable:
+    """Trim the messages of the graph state to a budget before the prompt.
+
+    The budget of the messages is what is left of ``max_tokens`` after the
+    static prefix of a compiled prompt, the messages are not trimmed to a
+    token budget if None. The attachment URLs of the kept images are replaced
+    by the downscaled images of ``image_cache``.
+    """
+
+    def trim_messages(state: dict) -> dict:
+        messages = state["messages"]
+        if max_tokens is not None:
+            budget = max_tokens
+            if isinstance(prompt, CompiledPrompt):
+                # Counted on first use, cached until the prompt file changes
+                budget = max(0, max_tokens - prompt.get_token_count(get_token_ids))
+            messages = trim_messages_tokens(messages, budget, get_token_ids)
+        return {**state, "messages": trim_messages_images(messages, max_images)}
+
+    def replace_images(state: dict) -> dict:
+        # Only the images already cached are replaced without an event loop
+        image_urls = {}
+        for url in get_image_urls(state["messages"]):
+            if (image := image_cache.peek(url)) is not None:
+                image_urls[url] = image.url
+        return {**state, "messages": replace_image_urls(state["messages"], image_urls)}
+
+    async def areplace_images(state: dict) -> dict:
+        image_urls = await image_cache.get_data_urls(get_image_urls(state["messages"]))
+        return {**state, "messages": replace_image_urls(state["messages"], image_urls)}
+
+    runnable = RunnableLambda(trim_messages)
+    if image_cache is not None:
+        runnable |= RunnableLambda(replace_images, afunc=areplace_images)
+    return runnable | prompt
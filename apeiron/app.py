@@ -1,85 +1,394 @@
 import asyncio
+import importlib
 import logging
 import os
+import time
+from collections.abc import Callable
 from contextlib import asynccontextmanager, suppress
+from typing import TYPE_CHECKING
 
-from discord import AutoShardedBot, Client, Intents, Message
 from fastapi import FastAPI
-from fastapi.responses import JSONResponse
-from langchain_core.runnables import RunnableConfig
+from fastapi.responses import JSONResponse, PlainTextResponse
 
+import apeiron.importtime
 import apeiron.logging
-from apeiron.agents.operator_6o import Response, create_agent
-from apeiron.chat_models import create_chat_model
-from apeiron.store import create_store
-from apeiron.toolkits.discord.toolkit import DiscordToolkit
-from apeiron.tools.discord.utils import (
-    create_chat_message,
-    create_configurable,
-    is_bot_mentioned,
-    is_bot_message,
-    is_private_channel,
-)
+import apeiron.metrics
+import apeiron.sharding
+
+if TYPE_CHECKING:
+    from discord import Client
+    from langchain_core.embeddings import Embeddings
+    from langchain_core.language_models import BaseChatModel
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MODEL = "mistralai:pixtral-large-2411"
+DEFAULT_EMBEDDING = "mistralai:mistral-embed"
+
+# Heavy modules imported by the warm-up instead of at application startup
+WARM_UP_MODULES = [
+    "discord",
+    "langchain_core.runnables",
+    "apeiron.agents.gate",
+    "apeiron.agents.operator_6o",
+    "apeiron.callbacks",
+    "apeiron.chat_models",
+    "apeiron.images",
+    "apeiron.response_cache",
+    "apeiron.store",
+    "apeiron.toolkits.discord.toolkit",
+    "apeiron.tools.discord.utils",
+    "apeiron.tracing",
+]
+
+
+def warm_up():
+    """Import the heavy dependencies and load the tokenizers.
+
+    Blocking, meant to run in a worker thread so the health probes answer in
+    the meantime.
+    """
+    apeiron.logging.init_tracing()
+    for module in WARM_UP_MODULES:
+        importlib.import_module(module)
+
+    from apeiron.tokenizers import get_mistral_tokenizer, get_token_counter
+
+    model = os.getenv("APEIRON_MODEL", DEFAULT_MODEL)
+    if model.startswith("mistralai:"):
+        importlib.import_module("langchain_mistralai")
+        get_token_counter(model.removeprefix("mistralai:"))
+    embedding = os.getenv("APEIRON_EMBEDDING", DEFAULT_EMBEDDING)
+    if embedding.startswith("mistralai:"):
+        get_mistral_tokenizer(embedding.removeprefix("mistralai:"))
+
+
+def create_bot(
+    bot: "Client | None" = None,
+    chat_model: "BaseChatModel | None" = None,
+    embeddings: "Embeddings | None" = None,
+) -> "Client":
+    """Create the Discord bot running the agent on the message events.
+
+    Args:
+        bot: Discord client to add the listeners to, a new sharded bot if None
+        chat_model: Chat model of the agent, created from ``APEIRON_MODEL``
+            if None
+        embeddings: Embeddings of the store and of the response cache,
+            created from ``APEIRON_EMBEDDING`` if None
+
+    Returns:
+        Discord client handling the message events
+    """
+    # Imported on first use to keep the application startup fast
+    from discord import AutoShardedBot, Intents, Message
+    from langchain_core.messages import AIMessage
+    from langchain_core.runnables import RunnableConfig
+
+    from apeiron.agents.gate import create_gate
+    from apeiron.agents.operator_6o import Response, create_agent
+    from apeiron.callbacks import MetricsCallbackHandler
+    from apeiron.chat_models import create_chat_model
+    from apeiron.checkpoint import get_thread_count
+    from apeiron.embeddings import create_embeddings
+    from apeiron.images import create_image_cache
+    from apeiron.response_cache import create_response_cache
+    from apeiron.scheduler import Coalescer, Scheduler
+    from apeiron.store import create_store
+    from apeiron.tokenizers import get_token_counter
+    from apeiron.toolkits.discord.toolkit import DiscordToolkit
+    from apeiron.tools.discord.encoding import create_event_encoder
+    from apeiron.tools.discord.rest import RestScheduler
+    from apeiron.tools.discord.streaming import DraftReply, astream_agent
+    from apeiron.tools.discord.utils import (
+        create_chat_message,
+        create_configurable,
+        create_thread_id,
+        is_bot_mentioned,
+        is_bot_message,
+        is_private_channel,
+    )
+    from apeiron.tracing import create_tracer
 
-def create_bot():
     # Initialize the MistralAI model
-    chat_model = create_chat_model(
-        model=os.getenv("APEIRON_MODEL", "mistralai:pixtral-large-2411")
+    model = os.getenv("APEIRON_MODEL", DEFAULT_MODEL)
+    if chat_model is None:
+        chat_model = create_chat_model(model=model)
+    embedding = os.getenv("APEIRON_EMBEDDING", DEFAULT_EMBEDDING)
+    if embeddings is None:
+        embeddings = create_embeddings(embedding)
+    store = create_store(model=embedding, embeddings=embeddings)
+
+    # Initialize the Discord client, running a subset of the shards if given
+    if bot is None:
+        shards = apeiron.sharding.create_shard_config()
+        bot = AutoShardedBot(
+            intents=Intents.all(),
+            shard_count=shards.shard_count,
+            shard_ids=shards.shard_ids,
+        )
+        if shards.shard_ids is not None:
+            logger.info(
+                f"Running shards {shards.shard_ids} of {shards.shard_count} shards"
+            )
+    # Send replies and reactions ahead of the REST reads of the tools
+    rest_scheduler = RestScheduler(
+        bot.http,
+        rate=float(os.getenv("APEIRON_DISCORD_RATE", "45")),
+        max_concurrency=int(os.getenv("APEIRON_DISCORD_MAX_CONCURRENCY", "16")),
     )
-    store = create_store(
-        model=os.getenv("APEIRON_EMBEDDING", "mistralai:mistral-embed"),
+    rest_scheduler.install()
+    # Answer repeated questions of a channel without running the agent
+    response_cache = create_response_cache(embeddings, bot)
+    toolkit = DiscordToolkit(client=bot, get_token_ids=chat_model.get_token_ids)
+    tools = toolkit.get_tools()
+    # Send downscaled copies of the image attachments to the model
+    image_cache = create_image_cache()
+    graph = create_agent(
+        tools=tools,
+        model=chat_model,
+        store=store,
+        max_history_tokens=int(os.getenv("APEIRON_MAX_HISTORY_TOKENS", "32000")),
+        image_cache=image_cache,
     )
 
-    # Initialize the Discord client
-    bot = AutoShardedBot(intents=Intents.all())
-    tools = DiscordToolkit(client=bot).get_tools()
-    graph = create_agent(tools=tools, model=chat_model, store=store)
+    encoder = create_event_encoder()
+    # Decide the messages needing no answer before running the agent
+    gate = create_gate()
 
-    # Discord message handler directly in create_app
-    @bot.listen
-    async def on_message(message: Message):
-        if is_bot_message(bot, message):
-            return
+    # Serialize runs per conversation thread and cap concurrent graph runs
+    scheduler = Scheduler(
+        max_concurrency=int(os.getenv("APEIRON_MAX_CONCURRENCY", "8")),
+        max_pending=int(os.getenv("APEIRON_MAX_PENDING", "1000")),
+    )
 
-        if not is_bot_mentioned(bot, message) and not is_private_channel(message):
-            logger.debug(
-                f"Message from {message.author.name} in {message.channel.name} "
-            )
-            return
+    # Post the answer as a draft reply while it is generated
+    stream_replies = bool(int(os.getenv("APEIRON_STREAM_REPLIES", "0")))
+    stream_min_length = int(os.getenv("APEIRON_STREAM_MIN_LENGTH", "40"))
+    stream_edit_interval = float(os.getenv("APEIRON_STREAM_EDIT_INTERVAL", "1.0"))
+
+    # Export the statistics of the components on /metrics
+    caches = {
+        "discord": toolkit.cache,
+        "response": response_cache,
+        "image": image_cache,
+    }
+    if hasattr(embeddings, "hits"):
+        caches["embeddings"] = embeddings
+    if model.startswith("mistralai:"):
+        caches["tokens"] = get_token_counter(model.removeprefix("mistralai:"))
+    apeiron.metrics.REGISTRY.add_collector(
+        apeiron.metrics.create_bot_collector(
+            bot,
+            scheduler,
+            rest_scheduler,
+            {name: cache for name, cache in caches.items() if cache is not None},
+            lambda: get_thread_count(graph.checkpointer),
+        )
+    )
+    callbacks = [MetricsCallbackHandler()]
+    if tracer := create_tracer():
+        callbacks.append(tracer)
 
+    async def send_response(message: Message, response: Response):
+        match response.type:
+            case "send":
+                with apeiron.metrics.SEND_SECONDS.time(type=response.type):
+                    await message.channel.send(content=response.content)
+            case "reply":
+                with apeiron.metrics.SEND_SECONDS.time(type=response.type):
+                    await message.reply(content=response.content)
+            case "noop":
+                logger.debug("No action needed")
+            case _:
+                logger.warning("Unknown response type: %s", response.type)
+
+    async def handle_messages(events: list[tuple[Message, float]]):
+        apeiron.metrics.EVENT_WAIT_SECONDS.observe(time.monotonic() - events[0][1])
+        messages = [message for message, _ in events]
+        # Reply to the latest message of the burst
+        message = messages[-1]
+        draft = None
         try:
             config: RunnableConfig = {
                 "configurable": create_configurable(message),
+                "callbacks": callbacks,
             }
             if message.guild:
                 config["configurable"]["guild_id"] = message.guild.id
-            async with message.channel.typing():
-                result = await graph.ainvoke(
-                    {"messages": [create_chat_message(message)]},
-                    config=config,
+            duplicate_urls = set()
+            if image_cache:
+                # Images are compared with the previous images of the channel
+                duplicate_urls = await image_cache.get_duplicates(
+                    [
+                        attachment.url
+                        for m in messages
+                        for attachment in m.attachments
+                        if attachment.content_type
+                        and attachment.content_type.startswith("image/")
+                    ],
+                    (message.guild.id if message.guild else None, message.channel.id),
                 )
+            history = []
+            if encoder.uses_history:
+                # Encode the events against the checkpointed thread
+                snapshot = await graph.aget_state(config)
+                history = list(snapshot.values.get("messages", []))
+            state = {"messages": []}
+            for m in messages:
+                chat_message = create_chat_message(m, encoder, duplicate_urls, history)
+                state["messages"].append(chat_message)
+                history.append(chat_message)
+            decision = await gate.decide(messages, state["messages"]) if gate else None
+            if decision and decision.action != "agent" and not gate.shadow:
+                if decision.action == "react" and decision.emoji:
+                    await message.add_reaction(decision.emoji)
+                apeiron.metrics.RESPONSES.inc(type=decision.action, source="gate")
+                # Keep the skipped messages in the history of the thread
+                await graph.aupdate_state(
+                    config, state, as_node="generate_structured_response"
+                )
+                return
+
+            vector = None
+            scope = (
+                message.guild.id if message.guild else None,
+                message.channel.id,
+                message.author.id,
+            )
+            # Responses depend on the asker, cached for bursts of one author
+            if (
+                response_cache
+                and not any(m.attachments for m in messages)
+                and all(m.author.id == message.author.id for m in messages)
+            ):
+                try:
+                    vector = await response_cache.embed(
+                        "\n".join(m.content for m in messages)
+                    )
+                except Exception as e:
+                    # Answer with the agent when the embeddings are unavailable
+                    logger.warning(f"Error embedding messages: {str(e)}")
+                if vector is not None and (
+                    response := response_cache.get(scope, vector)
+                ):
+                    apeiron.metrics.RESPONSES.inc(type=response.type, source="cache")
+                    await graph.aupdate_state(
+                        config,
+                        {
+                            "messages": [
+                                *state["messages"],
+                                AIMessage(content=response.content),
+                            ]
+                        },
+                        as_node="generate_structured_response",
+                    )
+                    await send_response(message, response)
+                    return
+
+            start = time.monotonic()
+            async with message.channel.typing():
+                if stream_replies:
+                    draft = DraftReply(
+                        message,
+                        min_length=stream_min_length,
+                        edit_interval=stream_edit_interval,
+                    )
+                    result = await astream_agent(graph, state, config, draft.update)
+                else:
+                    result = await graph.ainvoke(state, config=config)
             response: Response = result["structured_response"]
+            apeiron.metrics.RESPONSES.inc(type=response.type, source="agent")
+            if vector is not None and response.type != "noop":
+                response_cache.put(scope, vector, response, time.monotonic() - start)
+            if decision and gate.shadow:
+                logger.info(
+                    "Gate decision for message %s: %s, agent response: %s",
+                    message.id,
+                    decision.action,
+                    response.type,
+                )
 
-            match response.type:
-                case "send":
-                    await message.channel.send(content=response.content)
-                case "reply":
-                    await message.reply(content=response.content)
-                case "noop":
-                    logger.debug("No action needed")
-                case _:
-                    logger.warning("Unknown response type: %s", response.type)
+            # Edit the draft reply with the final content instead of sending it
+            if response.type in ("send", "reply") and draft and draft.draft:
+                with apeiron.metrics.SEND_SECONDS.time(type=response.type):
+                    await draft.finish(response.content)
+                return
+            if draft:
+                await draft.discard()
+            await send_response(message, response)
 
         except Exception as e:
+            if draft:
+                await draft.discard()
             logger.error(f"Error handling message event: {str(e)}")
 
+    # Fold bursts of messages in the same thread into a single graph run
+    coalescer = Coalescer(
+        scheduler,
+        handle_messages,
+        window=float(os.getenv("APEIRON_COALESCE_WINDOW", "0.5")),
+        max_delay=float(os.getenv("APEIRON_COALESCE_MAX_DELAY", "5.0")),
+    )
+
+    # Discord message handler directly in create_app
+    @bot.listen
+    async def on_message(message: Message):
+        if is_bot_message(bot, message):
+            return
+
+        if not is_bot_mentioned(bot, message) and not is_private_channel(message):
+            logger.debug(
+                f"Message from {message.author.name} in {message.channel.name} "
+            )
+            return
+
+        coalescer.add(create_thread_id(message), (message, time.monotonic()))
+
     return bot
 
 
-def create_api_lifespan(bot: Client):
+class WarmUp:
+    """State of the background warm-up of the bot."""
+
+    def __init__(self):
+        self.status = "pending"
+        self.duration: float | None = None
+        self.bot: Client | None = None
+
+    def to_dict(self) -> dict:
+        return {"status": self.status, "duration": self.duration}
+
+
+def create_api_lifespan(create_bot: "Callable[[], Client]", warmup: WarmUp):
+    async def start_bot(token: str):
+        warmup.status = "running"
+        start = time.monotonic()
+        loop = asyncio.get_running_loop()
+
+        def create_bot_in_thread() -> "Client":
+            # The Discord client is bound to the event loop of its thread
+            asyncio.set_event_loop(loop)
+            try:
+                return create_bot()
+            finally:
+                asyncio.set_event_loop(None)
+
+        try:
+            await asyncio.to_thread(warm_up)
+            # The model, store, agent and databases are created off the loop
+            warmup.bot = await asyncio.to_thread(create_bot_in_thread)
+        except Exception:
+            warmup.status = "failed"
+            logger.exception("Error warming up the bot")
+            raise
+        warmup.status = "done"
+        warmup.duration = time.monotonic() - start
+        logger.info(f"Warmed up the bot in {warmup.duration:.3f}s")
+        if limit := int(os.getenv("APEIRON_IMPORT_TIME", "0")):
+            logger.info(apeiron.importtime.format_report(limit))
+        await warmup.bot.start(token)
+
     @asynccontextmanager
     async def lifespan(app: FastAPI):
         # Initialize bot on startup
@@ -87,22 +396,24 @@ def create_api_lifespan(bot: Client):
         if not token:
             raise ValueError("DISCORD_TOKEN environment variable is not set")
 
-        # Start the bot in the background
-        bot_task = asyncio.create_task(bot.start(token))
+        # Warm up and start the bot in the background
+        bot_task = asyncio.create_task(start_bot(token))
 
         yield
 
         # Cleanup on shutdown
-        await bot.close()
+        if warmup.bot:
+            await warmup.bot.close()
         bot_task.cancel()
-        with suppress(asyncio.CancelledError):
+        with suppress(asyncio.CancelledError, Exception):
             await bot_task
 
     return lifespan
 
 
-def create_api(bot: Client):
-    app = FastAPI(lifespan=create_api_lifespan(bot))
+def create_api(create_bot: "Callable[[], Client]"):
+    warmup = WarmUp()
+    app = FastAPI(lifespan=create_api_lifespan(create_bot, warmup))
 
     @app.get("/healthz")
     async def liveness_probe():
@@ -110,13 +421,28 @@ def create_api(bot: Client):
 
     @app.get("/readyz")
     async def readiness_probe():
-        if bot.is_ready():
-            return {"status": "ready"}
-        return JSONResponse(content={"status": "not ready"}, status_code=503)
+        content = {"warmup": warmup.to_dict()}
+        if warmup.bot:
+            content["shards"] = apeiron.sharding.get_shard_status(warmup.bot)
+        # Not ready while any shard of the process is disconnected
+        if (
+            warmup.bot
+            and warmup.bot.is_ready()
+            and all(shard["ready"] for shard in content["shards"].values())
+        ):
+            return {"status": "ready", **content}
+        return JSONResponse(content={"status": "not ready", **content}, status_code=503)
+
+    @app.get("/metrics")
+    async def metrics():
+        return PlainTextResponse(
+            content=apeiron.metrics.REGISTRY.expose(),
+            media_type=apeiron.metrics.CONTENT_TYPE,
+        )
 
     @app.get("/livez")
     async def startup_probe():
-        if not bot.is_closed():
+        if warmup.status != "failed" and not (warmup.bot and warmup.bot.is_closed()):
             return {"status": "live"}
         return JSONResponse(content={"status": "not live"}, status_code=503)
 
@@ -124,5 +450,7 @@ def create_api(bot: Client):
 
 
 def create_app():
+    if int(os.getenv("APEIRON_IMPORT_TIME", "0")):
+        apeiron.importtime.enable()
     apeiron.logging.init()
-    return create_api(create_bot())
+    return create_api(create_bot)
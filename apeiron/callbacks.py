@@ -0,0 +1,63 @@
+import time
+from collections import OrderedDict
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from apeiron.metrics import LLM_CALL_SECONDS, TOOL_CALL_SECONDS, TOOL_ERRORS
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Record the duration of the LLM and tool calls of the graph runs.
+
+    Calls cancelled with their graph run never end, the oldest of the
+    ``max_runs`` calls in progress are forgotten.
+    """
+
+    # Only updates counters, no need to run in a worker thread
+    run_inline = True
+
+    def __init__(self, max_runs: int = 10_000):
+        self.max_runs = max_runs
+        self._runs: OrderedDict[UUID, tuple[str, float]] = OrderedDict()
+
+    def _start(self, run_id: UUID, name: str):
+        self._runs[run_id] = (name, time.monotonic())
+        while len(self._runs) > self.max_runs:
+            self._runs.popitem(last=False)
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: list,
+        *,
+        run_id: UUID,
+        metadata: dict[str, Any] | None = None,
+        **kwargs,
+    ):
+        model = (metadata or {}).get("ls_model_name") or serialized.get("name", "")
+        self._start(run_id, model)
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs):
+        if run := self._runs.pop(run_id, None):
+            model, start = run
+            LLM_CALL_SECONDS.observe(time.monotonic() - start, model=model)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self.on_llm_end(None, run_id=run_id)
+
+    def on_tool_start(
+        self, serialized: dict[str, Any], input_str: str, *, run_id: UUID, **kwargs
+    ):
+        self._start(run_id, serialized.get("name", ""))
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs):
+        if run := self._runs.pop(run_id, None):
+            tool, start = run
+            TOOL_CALL_SECONDS.observe(time.monotonic() - start, tool=tool)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        if run := self._runs.get(run_id):
+            TOOL_ERRORS.inc(tool=run[0])
+        self.on_tool_end(None, run_id=run_id)
@@ -1,25 +1,14 @@
 from collections.abc import Callable
-from functools import cache
 
 from langchain.chat_models import init_chat_model
 from langchain_core.language_models import BaseChatModel
-from mistral_common.tokens.tokenizers.mistral import MistralTokenizer
 
-
-@cache
-def get_mistral_tokenizer(model_name: str) -> MistralTokenizer:
-    """Get the tokenizer for a given model."""
-    return MistralTokenizer.from_model(model_name, strict=True)
+from apeiron.tokenizers import get_token_counter
 
 
 def create_mistral_get_token_ids(model: str, **kwargs) -> Callable[[str], list[int]]:
-    """Create a MistralAI chat model."""
-    tokenizer = get_mistral_tokenizer(model)
-
-    def _get_token_ids(text: str) -> list[int]:
-        return tokenizer.instruct_tokenizer.tokenizer.encode(text, bos=False, eos=False)
-
-    return _get_token_ids
+    """Create a memoized token encoder for a MistralAI chat model."""
+    return get_token_counter(model).encode
 
 
 def create_chat_model(model: str, **kwargs) -> BaseChatModel:
@@ -0,0 +1,572 @@
+import asyncio
+import itertools
+import logging
+import os
+import random
+import sqlite3
+import threading
+from collections.abc import AsyncIterator, Callable, Iterator, Sequence
+from os import PathLike
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.types import TASKS, ChannelProtocol
+
+from apeiron.sharding import create_shard_config, get_thread_shard_id
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    checkpoint_type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB,
+    task_path TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+def get_next_sortable_version(current: str | int | None) -> str:
+    """Generate sortable string versions, as done by the in-memory saver."""
+    if current is None:
+        current_v = 0
+    elif isinstance(current, int):
+        current_v = current
+    else:
+        current_v = int(current.split(".")[0])
+    return f"{current_v + 1:032}.{random.random():016}"
+
+
+class SQLiteSaver(BaseCheckpointSaver[str]):
+    """Checkpoint saver persisting checkpoints to a local SQLite database.
+
+    The database runs in WAL mode. Channel values are stored once per channel
+    version, the pending writes of a task are committed as soon as they are
+    saved, and only the requested (by default the latest) checkpoint of a
+    thread is loaded from disk. The number of threads is counted once when
+    the database is opened, then kept up to date by ``put``.
+    """
+
+    def __init__(
+        self,
+        path: str | PathLike,
+        *,
+        serde: SerializerProtocol | None = None,
+    ) -> None:
+        super().__init__(serde=serde)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        (self.thread_count,) = self.conn.execute(
+            "SELECT COUNT(DISTINCT thread_id) FROM checkpoints"
+        ).fetchone()
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        """Get a checkpoint tuple, the latest of the thread if no ID is given."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        with self.lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self.conn.execute(
+                    "SELECT * FROM checkpoints"
+                    " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self.conn.execute(
+                    "SELECT * FROM checkpoints"
+                    " WHERE thread_id = ? AND checkpoint_ns = ?"
+                    " ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            return self._load_tuple(row) if row else None
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        """List checkpoints from the newest to the oldest."""
+        clauses, params = [], []
+        if config:
+            configurable = config["configurable"]
+            clauses.append("thread_id = ?")
+            params.append(configurable["thread_id"])
+            if (checkpoint_ns := configurable.get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_checkpoint_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_checkpoint_id)
+        query = "SELECT * FROM checkpoints"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+        if limit is not None and not filter:
+            # Filtered on the metadata below, otherwise limited by SQLite
+            query += " LIMIT ?"
+            params.append(limit)
+
+        results = []
+        with self.lock:
+            # Rows are read one at a time, up to the limit
+            for row in self.conn.execute(query, params):
+                if limit is not None and len(results) >= limit:
+                    break
+                metadata = self.serde.loads_typed((row[6], row[7]))
+                if filter and not all(
+                    value == metadata.get(key) for key, value in filter.items()
+                ):
+                    continue
+                results.append(self._load_tuple(row))
+        yield from results
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Save a checkpoint with the values of its new channel versions."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        c = checkpoint.copy()
+        c.pop("pending_sends")  # type: ignore[misc]
+        values = c.pop("channel_values")  # type: ignore[misc]
+        blobs = [
+            (
+                thread_id,
+                checkpoint_ns,
+                channel,
+                version,
+                *(
+                    self.serde.dumps_typed(values[channel])
+                    if channel in values
+                    else ("empty", None)
+                ),
+            )
+            for channel, version in new_versions.items()
+        ]
+        with self.lock:
+            with self.conn:
+                # A checkpoint with a parent is never the first of its thread
+                new_thread = (
+                    not config["configurable"].get("checkpoint_id")
+                    and self.conn.execute(
+                        "SELECT 1 FROM checkpoints WHERE thread_id = ? LIMIT 1",
+                        (thread_id,),
+                    ).fetchone()
+                    is None
+                )
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blobs
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        thread_id,
+                        checkpoint_ns,
+                        checkpoint["id"],
+                        config["configurable"].get("checkpoint_id"),
+                        *self.serde.dumps_typed(c),
+                        *self.serde.dumps_typed(
+                            get_checkpoint_metadata(config, metadata)
+                        ),
+                    ),
+                )
+            if new_thread:
+                self.thread_count += 1
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Save the writes of a task, so a failed step resumes without it."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        upserts, inserts = [], []
+        for idx, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, idx)
+            row = (
+                thread_id,
+                checkpoint_ns,
+                checkpoint_id,
+                task_id,
+                idx,
+                channel,
+                *self.serde.dumps_typed(value),
+                task_path,
+            )
+            # Special writes (errors, interrupts...) replace previous ones
+            (upserts if idx < 0 else inserts).append(row)
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                upserts,
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                inserts,
+            )
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        """Asynchronous version of get_tuple."""
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """Asynchronous version of list."""
+        results = await asyncio.to_thread(
+            lambda: [*self.list(config, filter=filter, before=before, limit=limit)]
+        )
+        for item in results:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Asynchronous version of put."""
+        return await asyncio.to_thread(
+            self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Asynchronous version of put_writes."""
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    def get_next_version(self, current: str | None, channel: ChannelProtocol) -> str:
+        return get_next_sortable_version(current)
+
+    def close(self):
+        """Close the database."""
+        with self.lock:
+            self.conn.close()
+
+    def _load_tuple(self, row: tuple) -> CheckpointTuple:
+        """Build a checkpoint tuple from a checkpoints row."""
+        (
+            thread_id,
+            checkpoint_ns,
+            checkpoint_id,
+            parent_checkpoint_id,
+            checkpoint_type,
+            checkpoint_blob,
+            metadata_type,
+            metadata_blob,
+        ) = row
+        checkpoint = self.serde.loads_typed((checkpoint_type, checkpoint_blob))
+
+        channel_values = {}
+        for channel, version in checkpoint["channel_versions"].items():
+            blob = self.conn.execute(
+                "SELECT type, blob FROM blobs WHERE thread_id = ?"
+                " AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, version),
+            ).fetchone()
+            if blob and blob[0] != "empty":
+                channel_values[channel] = self.serde.loads_typed(blob)
+
+        pending_writes = [
+            (task_id, channel, self.serde.loads_typed((type_, value)))
+            for task_id, channel, type_, value in self.conn.execute(
+                "SELECT task_id, channel, type, value FROM writes WHERE thread_id = ?"
+                " AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            )
+        ]
+        pending_sends = []
+        if parent_checkpoint_id:
+            pending_sends = [
+                self.serde.loads_typed((type_, value))
+                for type_, value in self.conn.execute(
+                    "SELECT type, value FROM writes WHERE thread_id = ?"
+                    " AND checkpoint_ns = ? AND checkpoint_id = ? AND channel = ?"
+                    " ORDER BY task_path, task_id, idx",
+                    (thread_id, checkpoint_ns, parent_checkpoint_id, TASKS),
+                )
+            ]
+
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **checkpoint,
+                "channel_values": channel_values,
+                "pending_sends": pending_sends,
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata_blob)),
+            pending_writes=pending_writes,
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+        )
+
+
+class ShardedSaver(BaseCheckpointSaver[str]):
+    """Checkpoint saver partitioning the threads by gateway shard.
+
+    The checkpoints of a thread are saved by the saver of the shard receiving
+    the events of its guild, so the conversation state follows the shard
+    when the shards are reassigned to other processes. Savers are created on
+    first use with ``create_saver``, and listing the checkpoints of every
+    thread opens the savers of the ``shard_ids`` run by the process (all the
+    shards if None).
+
+    SQLite databases in WAL mode are not safe on network filesystems. The
+    database of a shard must be on local storage and opened by one process at
+    a time: a shard moves to another process with its database, after the
+    previous process has stopped.
+    """
+
+    def __init__(
+        self,
+        create_saver: Callable[[int], BaseCheckpointSaver],
+        shard_count: int,
+        shard_ids: list[int] | None = None,
+    ) -> None:
+        super().__init__()
+        self.create_saver = create_saver
+        self.shard_count = shard_count
+        self.shard_ids = shard_ids
+        self.savers: dict[int, BaseCheckpointSaver] = {}
+        self.lock = threading.Lock()
+
+    def get_shard_saver(self, shard_id: int) -> BaseCheckpointSaver:
+        """Get the saver of a shard, created on first use."""
+        with self.lock:
+            if shard_id not in self.savers:
+                self.savers[shard_id] = self.create_saver(shard_id)
+            return self.savers[shard_id]
+
+    def get_saver(self, config: RunnableConfig) -> BaseCheckpointSaver:
+        """Get the saver of the shard of the thread of a config."""
+        return self.get_shard_saver(
+            get_thread_shard_id(config["configurable"]["thread_id"], self.shard_count)
+        )
+
+    def get_savers(self, config: RunnableConfig | None) -> list[BaseCheckpointSaver]:
+        """Get the saver of the thread of a config, or the savers of the process."""
+        if config:
+            return [self.get_saver(config)]
+        shard_ids = self.shard_ids
+        if shard_ids is None:
+            shard_ids = range(self.shard_count)
+        return [self.get_shard_saver(shard_id) for shard_id in shard_ids]
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return self.get_saver(config).get_tuple(config)
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        """List the checkpoints of a thread, or of the threads of every shard."""
+        items = (
+            item
+            for saver in self.get_savers(config)
+            for item in saver.list(config, filter=filter, before=before)
+        )
+        yield from itertools.islice(items, limit)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self.get_saver(config).put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self.get_saver(config).put_writes(config, writes, task_id, task_path)
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return await self.get_saver(config).aget_tuple(config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """Asynchronous version of list."""
+        savers = await asyncio.to_thread(self.get_savers, config)
+        count = 0
+        for saver in savers:
+            async for item in saver.alist(config, filter=filter, before=before):
+                if limit is not None and count >= limit:
+                    return
+                count += 1
+                yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await self.get_saver(config).aput(
+            config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await self.get_saver(config).aput_writes(config, writes, task_id, task_path)
+
+    def get_next_version(self, current: str | None, channel: ChannelProtocol) -> str:
+        return get_next_sortable_version(current)
+
+    def close(self):
+        """Close the savers of the shards."""
+        with self.lock:
+            for saver in self.savers.values():
+                if close := getattr(saver, "close", None):
+                    close()
+            self.savers.clear()
+
+
+def get_thread_count(checkpointer: BaseCheckpointSaver) -> int | None:
+    """Count the threads of a checkpointer, None if it cannot count them."""
+    if isinstance(checkpointer, ShardedSaver):
+        # Savers are added by the graph runs while the metrics are collected
+        with checkpointer.lock:
+            savers = list(checkpointer.savers.values())
+        counts = [get_thread_count(saver) for saver in savers]
+        return None if None in counts else sum(counts)
+    if isinstance(checkpointer, SQLiteSaver):
+        return checkpointer.thread_count
+    if isinstance(checkpointer, InMemorySaver):
+        return len(checkpointer.storage)
+    return None
+
+
+def create_checkpointer() -> BaseCheckpointSaver:
+    """Create the checkpointer selected by the environment variables."""
+    match os.getenv("APEIRON_CHECKPOINTER", "memory"):
+        case "memory":
+            return InMemorySaver()
+        case "sqlite":
+            path = os.getenv("APEIRON_CHECKPOINT_PATH", "checkpoints.sqlite")
+            if "{shard_id}" not in path:
+                return SQLiteSaver(path)
+            # One database per shard, on the local storage of the process
+            # running the shard, never opened by two processes at once
+            shard_config = create_shard_config()
+            if shard_config.shard_count is None:
+                raise ValueError(
+                    "APEIRON_SHARD_COUNT is required by a checkpoint path per shard"
+                )
+            return ShardedSaver(
+                lambda shard_id: SQLiteSaver(path.format(shard_id=shard_id)),
+                shard_config.shard_count,
+                shard_config.shard_ids,
+            )
+        case checkpointer:
+            raise ValueError(f"Invalid checkpointer: {checkpointer}")
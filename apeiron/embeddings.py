@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from os import PathLike
+
+import numpy as np
+from langchain.embeddings import init_embeddings
+from langchain_core.embeddings import Embeddings
+
+from apeiron.tokenizers import get_mistral_tokenizer
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key BLOB PRIMARY KEY,
+    vector BLOB NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS embeddings_used_at ON embeddings (used_at);
+"""
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a text before hashing it for the embeddings cache."""
+    return unicodedata.normalize("NFC", text).strip()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings served from a local on-disk cache when possible.
+
+    Vectors are stored in a SQLite database keyed by a hash of the model name,
+    the kind of text (document or query) and the normalized text, so
+    identical texts are only sent to the wrapped embeddings once. The least
+    recently used entries are evicted once the cache holds more than
+    ``max_size`` vectors.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: str,
+        path: str | PathLike,
+        max_size: int = 100_000,
+    ):
+        self.embeddings = embeddings
+        self.model = model
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    @property
+    def hit_ratio(self) -> float:
+        """Ratio of texts served from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self._key(text) for text in texts]
+        vectors = self._get(keys)
+        missing = self._missing(texts, keys, vectors)
+        if missing:
+            embedded = self.embeddings.embed_documents(list(missing.values()))
+            self._put(vectors, missing, embedded)
+        return [vectors[key] for key in keys]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self._key(text) for text in texts]
+        vectors = await asyncio.to_thread(self._get, keys)
+        missing = self._missing(texts, keys, vectors)
+        if missing:
+            embedded = await self.embeddings.aembed_documents(list(missing.values()))
+            await asyncio.to_thread(self._put, vectors, missing, embedded)
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self._key(text, "query")
+        vectors = self._get([key])
+        if missing := self._missing([text], [key], vectors):
+            embedded = self.embeddings.embed_query(text)
+            self._put(vectors, missing, [embedded])
+        return vectors[key]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        key = self._key(text, "query")
+        vectors = await asyncio.to_thread(self._get, [key])
+        if missing := self._missing([text], [key], vectors):
+            embedded = await self.embeddings.aembed_query(text)
+            await asyncio.to_thread(self._put, vectors, missing, [embedded])
+        return vectors[key]
+
+    def close(self):
+        """Close the cache database."""
+        with self.lock:
+            self.conn.close()
+
+    def _key(self, text: str, kind: str = "document") -> bytes:
+        # Queries and documents may be embedded differently, e.g. with a prefix
+        data = f"{self.model}\0{kind}\0{normalize_text(text)}".encode()
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def _missing(
+        self,
+        texts: list[str],
+        keys: list[bytes],
+        vectors: dict[bytes, list[float]],
+    ) -> dict[bytes, str]:
+        """Get the texts to embed, once per key, and update the hit counters."""
+        missing = {}
+        for key, text in zip(keys, texts, strict=True):
+            if key in vectors or key in missing:
+                self.hits += 1
+            else:
+                self.misses += 1
+                missing[key] = text
+        return missing
+
+    def _get(self, keys: list[bytes]) -> dict[bytes, list[float]]:
+        """Load the cached vectors of the keys and mark them as used."""
+        unique = list(dict.fromkeys(keys))
+        vectors = {}
+        with self.lock, self.conn:
+            for i in range(0, len(unique), 500):
+                batch = unique[i : i + 500]
+                placeholders = ", ".join("?" * len(batch))
+                for key, vector in self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ):
+                    vectors[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+            if vectors:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE embeddings SET used_at = ? WHERE key = ?",
+                    [(now, key) for key in vectors],
+                )
+        return vectors
+
+    def _put(
+        self,
+        vectors: dict[bytes, list[float]],
+        missing: dict[bytes, str],
+        embedded: list[list[float]],
+    ):
+        """Store newly embedded vectors and evict the least recently used."""
+        now = time.time()
+        rows = []
+        for key, vector in zip(missing, embedded, strict=True):
+            # Return the stored precision so cached and fresh vectors agree
+            vector = np.asarray(vector, dtype=np.float32)
+            vectors[key] = vector.tolist()
+            rows.append((key, vector.tobytes(), now))
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, used_at)"
+                " VALUES (?, ?, ?)",
+                rows,
+            )
+            (size,) = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if size > self.max_size:
+                self.conn.execute(
+                    "DELETE FROM embeddings WHERE key IN"
+                    " (SELECT key FROM embeddings ORDER BY used_at LIMIT ?)",
+                    (size - self.max_size,),
+                )
+        logger.debug(
+            "Embedded %d texts (hits: %d, misses: %d)",
+            len(rows),
+            self.hits,
+            self.misses,
+        )
+
+
+def create_embeddings(model: str, **kwargs) -> Embeddings:
+    """Create an embeddings model, cached on disk unless disabled."""
+    if (
+        model.startswith("mistralai:")
+        or kwargs.get("provider") == "mistralai"
+        and "tokenizer" not in kwargs
+    ):
+        kwargs["tokenizer"] = get_mistral_tokenizer(model.removeprefix("mistralai:"))
+
+    embeddings = init_embeddings(model, **kwargs)
+    max_size = int(os.getenv("APEIRON_EMBEDDINGS_CACHE_SIZE", "100000"))
+    if max_size <= 0:
+        return embeddings
+    return CachedEmbeddings(
+        embeddings,
+        model,
+        os.getenv("APEIRON_EMBEDDINGS_CACHE_PATH", "embeddings.sqlite"),
+        max_size=max_size,
+    )
@@ -0,0 +1,253 @@
+import asyncio
+import base64
+import io
+import logging
+import os
+from collections import OrderedDict, deque
+from collections.abc import Iterable
+from dataclasses import dataclass
+from functools import cached_property
+from urllib.parse import urlsplit
+
+import aiohttp
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ImageCacheStats:
+    """Counters of the image cache."""
+
+    hits: int = 0
+    misses: int = 0
+    duplicates: int = 0
+    errors: int = 0
+    downloaded_bytes: int = 0
+    processed_bytes: int = 0
+
+
+@dataclass
+class ProcessedImage:
+    """Downscaled image with its perceptual hash."""
+
+    dhash: int
+    data: bytes
+    media_type: str
+
+    @cached_property
+    def url(self) -> str:
+        """Data URL of the image sent to the model."""
+        return f"data:{self.media_type};base64,{base64.b64encode(self.data).decode()}"
+
+
+def get_dhash(image: Image.Image, size: int = 8) -> int:
+    """Compute the difference hash of an image.
+
+    The image is reduced to ``size + 1`` by ``size`` grayscale pixels and each
+    bit tells whether a pixel is brighter than its right neighbor, so resized
+    or recompressed copies of an image get the same or a close hash.
+    """
+    pixels = list(
+        image.convert("L").resize((size + 1, size), Image.Resampling.BILINEAR).getdata()
+    )
+    dhash = 0
+    for row in range(size):
+        for col in range(size):
+            i = row * (size + 1) + col
+            dhash = dhash << 1 | (pixels[i] > pixels[i + 1])
+    return dhash
+
+
+def process_image(
+    data: bytes, max_size: int = 1024, quality: int = 85
+) -> ProcessedImage:
+    """Downscale an image to fit in a square of ``max_size`` pixels.
+
+    Images are encoded as JPEG, or as PNG when they have transparency.
+    """
+    image = Image.open(io.BytesIO(data))
+    # Let the JPEG decoder skip the resolution that is downscaled anyway
+    image.draft("RGB", (max_size, max_size))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+        image.save(output, format="PNG", optimize=True)
+        media_type = "image/png"
+    else:
+        image.convert("RGB").save(output, format="JPEG", quality=quality)
+        media_type = "image/jpeg"
+    return ProcessedImage(get_dhash(image), output.getvalue(), media_type)
+
+
+class ImageCache:
+    """Cache of the downscaled images of attachments sent to the model.
+
+    Attachments are downloaded once and downscaled to ``max_size`` pixels,
+    and the least recently used images are evicted once the cache holds more
+    than ``max_bytes``. The checkpointed messages keep the attachment URLs,
+    the images are only substituted in the prompt. The cache is shared by
+    every guild, so an image is only served for its own attachment. Images
+    within ``max_distance`` bits of the perceptual hash of one of the
+    ``max_history`` latest images of the same channel are sent to the model
+    once, the hashes of the ``max_channels`` latest channels are kept.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_distance: int = 4,
+        max_download_bytes: int = 20 * 1024 * 1024,
+        timeout: float = 10.0,
+        max_history: int = 8,
+        max_channels: int = 10_000,
+    ):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.max_distance = max_distance
+        self.max_download_bytes = max_download_bytes
+        self.timeout = timeout
+        self.max_history = max_history
+        self.max_channels = max_channels
+        self.stats = ImageCacheStats()
+        self._images: OrderedDict[str, ProcessedImage] = OrderedDict()
+        self._size = 0
+        self._hashes: OrderedDict[tuple[int | None, int], deque[int]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._session: aiohttp.ClientSession | None = None
+
+    async def get(self, url: str) -> ProcessedImage:
+        """Get the downscaled image of an attachment URL.
+
+        Raises:
+            aiohttp.ClientError: If the image cannot be downloaded
+            PIL.UnidentifiedImageError: If the image cannot be decoded
+        """
+        key = self._key(url)
+        if (image := self._images.get(key)) is not None:
+            self._images.move_to_end(key)
+            self.stats.hits += 1
+            return image
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats.misses += 1
+            task = asyncio.create_task(self._fetch(url))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return self._add(key, await asyncio.shield(task))
+
+    def peek(self, url: str) -> ProcessedImage | None:
+        """Get the cached image of an attachment URL without downloading it."""
+        return self._images.get(self._key(url))
+
+    async def get_duplicates(
+        self, urls: Iterable[str], channel: tuple[int | None, int]
+    ) -> set[str]:
+        """Get the attachment URLs of the images already sent to the model.
+
+        The images are downloaded and cached for the prompt along the way.
+
+        Args:
+            urls: Attachment URLs of the images
+            channel: Guild and channel IDs of the messages of the images
+
+        Returns:
+            URLs of the images within ``max_distance`` of a previous image of
+            the channel.
+        """
+        images = await self._gather(urls)
+        seen = self._hashes.get(channel)
+        if seen is None:
+            seen = self._hashes[channel] = deque(maxlen=self.max_history)
+            while len(self._hashes) > self.max_channels:
+                self._hashes.popitem(last=False)
+        self._hashes.move_to_end(channel)
+        duplicates = set()
+        for url, image in images.items():
+            if any(
+                (dhash ^ image.dhash).bit_count() <= self.max_distance for dhash in seen
+            ):
+                self.stats.duplicates += 1
+                duplicates.add(url)
+                continue
+            seen.append(image.dhash)
+        return duplicates
+
+    async def get_data_urls(self, urls: Iterable[str]) -> dict[str, str]:
+        """Get the data URLs of the downscaled images of attachment URLs.
+
+        Returns:
+            Data URL of each image, URLs of images that cannot be processed are
+            left out.
+        """
+        return {url: image.url for url, image in (await self._gather(urls)).items()}
+
+    async def _gather(self, urls: Iterable[str]) -> dict[str, ProcessedImage]:
+        """Get the images of attachment URLs, leaving out the failures."""
+        urls = list(dict.fromkeys(urls))
+        results = await asyncio.gather(*map(self.get, urls), return_exceptions=True)
+        images = {}
+        for url, result in zip(urls, results, strict=True):
+            if isinstance(result, Exception):
+                self.stats.errors += 1
+                logger.warning(f"Failed to process image {url}: {str(result)}")
+                continue
+            images[url] = result
+        return images
+
+    async def close(self):
+        """Close the HTTP session."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _fetch(self, url: str) -> ProcessedImage:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        async with self._session.get(url) as response:
+            response.raise_for_status()
+            if (response.content_length or 0) > self.max_download_bytes:
+                raise ValueError(f"Image too large: {response.content_length} bytes")
+            data = bytearray()
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                data += chunk
+                if len(data) > self.max_download_bytes:
+                    raise ValueError(
+                        f"Image larger than {self.max_download_bytes} bytes"
+                    )
+        self.stats.downloaded_bytes += len(data)
+        # Decoding and resizing are CPU bound, keep them off the event loop
+        return await asyncio.to_thread(process_image, bytes(data), self.max_size)
+
+    def _key(self, url: str) -> str:
+        # Signed CDN URLs change, the path identifies the attachment
+        return urlsplit(url)._replace(query="", fragment="").geturl()
+
+    def _add(self, key: str, image: ProcessedImage) -> ProcessedImage:
+        """Cache the processed image of an attachment."""
+        if (cached := self._images.get(key)) is not None:
+            # Awaited by several callers, cached by the first one
+            self._images.move_to_end(key)
+            return cached
+        self._images[key] = image
+        self._size += len(image.data)
+        self.stats.processed_bytes += len(image.data)
+        while self._size > self.max_bytes and len(self._images) > 1:
+            _, evicted = self._images.popitem(last=False)
+            self._size -= len(evicted.data)
+        return image
+
+
+def create_image_cache() -> ImageCache | None:
+    """Create the image cache if enabled by the environment."""
+    max_size = int(os.getenv("APEIRON_IMAGE_MAX_SIZE", "0"))
+    if not max_size:
+        return None
+    return ImageCache(
+        max_size=max_size,
+        max_bytes=int(os.getenv("APEIRON_IMAGE_CACHE_BYTES", str(64 * 1024 * 1024))),
+    )
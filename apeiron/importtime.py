@@ -0,0 +1,119 @@
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from importlib.abc import MetaPathFinder
+from importlib.machinery import ModuleSpec
+
+
+@dataclass(frozen=True)
+class ImportRecord:
+    """Time spent executing an imported module, in seconds."""
+
+    name: str
+    self_time: float
+    cumulative: float
+    depth: int
+
+
+class ImportTimer(MetaPathFinder):
+    """Meta path finder recording the execution time of imported modules.
+
+    Specs are resolved by the other finders of ``sys.meta_path``, and the
+    ``exec_module`` method of their loader is wrapped to time the module body.
+    Imports nested in the body of a module count toward its cumulative time
+    only, like with ``python -X importtime``.
+    """
+
+    def __init__(self):
+        self.records: list[ImportRecord] = []
+        self._local = threading.local()
+
+    def find_spec(self, fullname, path, target=None) -> ModuleSpec | None:
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                self._wrap_loader(spec)
+                return spec
+        return None
+
+    def _wrap_loader(self, spec: ModuleSpec):
+        loader = spec.loader
+        # Skip the class-level loaders of builtin and frozen modules
+        if (
+            loader is None
+            or isinstance(loader, type)
+            or "exec_module" in getattr(loader, "__dict__", {"exec_module": None})
+        ):
+            return
+        exec_module = loader.exec_module
+
+        def timed_exec_module(module):
+            stack = self._get_stack()
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                cumulative = time.perf_counter() - start
+                children = stack.pop()
+                if stack:
+                    stack[-1] += cumulative
+                self.records.append(
+                    ImportRecord(
+                        name=spec.name,
+                        self_time=cumulative - children,
+                        cumulative=cumulative,
+                        depth=len(stack),
+                    )
+                )
+
+        loader.exec_module = timed_exec_module
+
+    def _get_stack(self) -> list[float]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+
+_timer: ImportTimer | None = None
+
+
+def enable():
+    """Start recording the execution time of the modules imported from now on."""
+    global _timer
+    if _timer is None:
+        _timer = ImportTimer()
+        sys.meta_path.insert(0, _timer)
+
+
+def disable():
+    """Stop recording import times."""
+    global _timer
+    if _timer is not None:
+        sys.meta_path.remove(_timer)
+        _timer = None
+
+
+def format_report(limit: int = 30) -> str:
+    """Format the slowest recorded imports in the style of ``-X importtime``.
+
+    Args:
+        limit: Maximum number of imports to include
+
+    Returns:
+        Report with the self and cumulative times in microseconds
+    """
+    records = _timer.records if _timer else []
+    slowest = sorted(records, key=lambda r: r.cumulative, reverse=True)[:limit]
+    lines = ["import time: self [us] | cumulative | imported package"]
+    for record in slowest:
+        lines.append(
+            f"import time: {record.self_time * 1e6:9.0f} |"
+            f" {record.cumulative * 1e6:10.0f} | {'  ' * record.depth}{record.name}"
+        )
+    total = sum(r.self_time for r in records)
+    lines.append(f"import time: {len(records)} modules in {total:.3f}s")
+    return "\n".join(lines)
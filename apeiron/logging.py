@@ -1,7 +1,6 @@
 import logging
 import os
 
-import mlflow
 import uvicorn
 
 logger = logging.getLogger(__name__)
@@ -32,9 +31,21 @@ def create_logging_handlers():
             return []
 
 
-def init():
-    # Intrumentalise the langchain_core with mlflow
-    mlflow.langchain.autolog()
+def init_tracing():
+    match os.getenv("APEIRON_TRACING", "autolog"):
+        case "autolog":
+            # Imported on first use, mlflow takes seconds to import
+            import mlflow
+
+            # Intrumentalise the langchain_core with mlflow
+            mlflow.langchain.autolog()
+        case "sampled" | "off":
+            # Sampled traces are recorded by the tracer of the graph runs
+            pass
+        case tracing:
+            raise ValueError(f"Invalid tracing mode: {tracing}")
 
+
+def init():
     # Get log level from environment variable, default to INFO if not set
     logging.basicConfig(level=get_logging_level(), handlers=create_logging_handlers())
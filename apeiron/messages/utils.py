@@ -1,6 +1,8 @@
+import json
 import logging
+from collections.abc import Callable
 
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +20,7 @@ def trim_messages_images(
         List of filtered messages with limited image attachments
     """
     image_count = 0
-    slice_index = 0
+    slice_index = -1
 
     # Process messages in reverse order (newest to oldest)
     for i, message in enumerate(reversed(messages)):
@@ -35,3 +37,136 @@ def trim_messages_images(
 
     # Return messages from slice_index to the end
     return messages[slice_index + 1 :]
+
+
+def _is_image_url(content: str | dict) -> bool:
+    """Check if a content part of a message is an image URL."""
+    return isinstance(content, dict) and content.get("type") == "image_url"
+
+
+def get_image_urls(messages: list[BaseMessage]) -> list[str]:
+    """Get the URLs of the images of the messages, in order.
+
+    Args:
+        messages: List of messages to read the images of
+
+    Returns:
+        URLs of the image parts of the messages
+    """
+    return [
+        content["image_url"]
+        for message in messages
+        if isinstance(message.content, list)
+        for content in message.content
+        if _is_image_url(content)
+    ]
+
+
+def replace_image_urls(
+    messages: list[BaseMessage], image_urls: dict[str, str]
+) -> list[BaseMessage]:
+    """Replace the URLs of the images of the messages.
+
+    The messages are copied, so the messages of the graph state keep their
+    original URLs.
+
+    Args:
+        messages: List of messages to replace the images of
+        image_urls: New URL of the images by URL, images missing from it are
+            kept as is
+
+    Returns:
+        List of messages with the replaced image URLs
+    """
+    replaced = []
+    for message in messages:
+        if isinstance(message.content, list):
+            content = [
+                {**part, "image_url": image_urls[part["image_url"]]}
+                if _is_image_url(part) and part["image_url"] in image_urls
+                else part
+                for part in message.content
+            ]
+            if content != message.content:
+                message = message.model_copy(update={"content": content})
+        replaced.append(message)
+    return replaced
+
+
+def _get_message_texts(message: BaseMessage) -> list[str]:
+    """Get the text parts of a message sent to the model."""
+    if isinstance(message.content, str):
+        texts = [message.content]
+    else:
+        texts = [
+            content if isinstance(content, str) else content.get("text", "")
+            for content in message.content
+            if isinstance(content, str) or content.get("type") == "text"
+        ]
+    if isinstance(message, AIMessage) and message.tool_calls:
+        texts.append(json.dumps(message.tool_calls))
+    return texts
+
+
+def get_message_token_count(
+    message: BaseMessage, get_token_ids: Callable[[str], list[int]]
+) -> int:
+    """Get the number of text tokens of a message.
+
+    The count is computed once and cached in the response metadata of the
+    message, so it is persisted along with the message in the checkpoints.
+
+    Args:
+        message: Message to count the tokens of
+        get_token_ids: Function encoding a text into token IDs
+
+    Returns:
+        Number of text tokens of the message
+    """
+    token_count = message.response_metadata.get("token_count")
+    if token_count is None:
+        token_count = sum(
+            len(get_token_ids(text)) for text in _get_message_texts(message) if text
+        )
+        message.response_metadata["token_count"] = token_count
+    return token_count
+
+
+def trim_messages_tokens(
+    messages: list[BaseMessage],
+    max_tokens: int,
+    get_token_ids: Callable[[str], list[int]],
+) -> list[BaseMessage]:
+    """Filter chat history to keep only the latest messages within a token budget.
+
+    The kept history always starts at a human message so that tool results are
+    never separated from the tool calls they answer, and the latest human turn
+    is kept even if it exceeds the budget on its own.
+
+    Args:
+        messages: List of messages to filter
+        max_tokens: Maximum number of text tokens to keep
+        get_token_ids: Function encoding a text into token IDs
+
+    Returns:
+        List of the latest messages fitting in the token budget
+    """
+    token_count = 0
+    slice_index = len(messages)
+
+    # Process messages in reverse order (newest to oldest)
+    for i in range(len(messages) - 1, -1, -1):
+        token_count += get_message_token_count(messages[i], get_token_ids)
+        if token_count > max_tokens:
+            break
+        slice_index = i
+
+    # Start at the first human message within the budget
+    for i in range(slice_index, len(messages)):
+        if isinstance(messages[i], HumanMessage):
+            return messages[i:]
+    # Otherwise keep the latest human turn even if it exceeds the budget
+    for i in range(slice_index - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return messages[i:]
+    return messages[slice_index:]
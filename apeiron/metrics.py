@@ -0,0 +1,312 @@
+import logging
+import math
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from typing import Any, TypeVar
+
+from apeiron.sharding import get_shard_status
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+Sample = tuple[str, dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _format_sample(name: str, labels: dict[str, str], value: float) -> str:
+    if labels:
+        label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+        return f"{name}{{{label_text}}} {_format_value(value)}"
+    return f"{name} {_format_value(value)}"
+
+
+class Metric:
+    """Metric with a value per combination of label values."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        if labels.keys() != set(self.labelnames):
+            raise ValueError(
+                f"Invalid labels for {self.name}: {sorted(labels)},"
+                f" expected {sorted(self.labelnames)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple[str, ...]) -> dict[str, str]:
+        return dict(zip(self.labelnames, key, strict=True))
+
+    def samples(self) -> Iterator[Sample]:
+        """Get the samples of the metric."""
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, self._labels(key), value
+
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        """Increase the count of the given labels."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    """Value that can go up and down."""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        """Set the value of the given labels."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = (*sorted(buckets), math.inf)
+
+    def observe(self, value: float, **labels):
+        """Record an observed value for the given labels."""
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a block of code, in seconds."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def samples(self) -> Iterator[Sample]:
+        with self._lock:
+            values = [(key, (list(c), s)) for key, (c, s) in self._values.items()]
+        for key, (counts, total) in values:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts, strict=True):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    {**labels, "le": _format_value(bound)},
+                    cumulative,
+                )
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+MetricT = TypeVar("MetricT", bound=Metric)
+
+
+class Registry:
+    """Metrics exposed in the Prometheus text format.
+
+    Metrics updated by the application are registered once, and collectors
+    create metrics from the statistics of other components at scrape time.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._collectors: list[Callable[[], Iterable[Metric]]] = []
+
+    def register(self, metric: MetricT) -> MetricT:
+        """Register a metric, returning it."""
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Metric]]):
+        """Add a function creating metrics at scrape time."""
+        self._collectors.append(collector)
+
+    def collect(self) -> list[Metric]:
+        """Get the registered and collected metrics."""
+        metrics = list(self._metrics.values())
+        for collector in self._collectors:
+            try:
+                metrics.extend(collector())
+            except Exception as e:
+                logger.warning(f"Error collecting metrics: {str(e)}")
+        return metrics
+
+    def expose(self) -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.collect():
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(_format_sample(*sample) for sample in metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+EVENT_WAIT_SECONDS = REGISTRY.register(
+    Histogram(
+        "apeiron_event_wait_seconds",
+        "Time from receiving a message event to starting its graph run",
+    )
+)
+LLM_CALL_SECONDS = REGISTRY.register(
+    Histogram("apeiron_llm_call_seconds", "Duration of the LLM calls", ["model"])
+)
+TOOL_CALL_SECONDS = REGISTRY.register(
+    Histogram("apeiron_tool_call_seconds", "Duration of the tool calls", ["tool"])
+)
+TOOL_ERRORS = REGISTRY.register(
+    Counter("apeiron_tool_errors_total", "Number of failed tool calls", ["tool"])
+)
+SEND_SECONDS = REGISTRY.register(
+    Histogram("apeiron_send_seconds", "Duration of sending the responses", ["type"])
+)
+RESPONSES = REGISTRY.register(
+    Counter(
+        "apeiron_responses_total",
+        "Number of responses by type and by source: agent, cache or gate",
+        ["type", "source"],
+    )
+)
+
+
+def create_bot_collector(
+    bot: Any,
+    scheduler: Any,
+    rest_scheduler: Any,
+    caches: dict[str, Any],
+    get_thread_count: Callable[[], int | None],
+) -> Callable[[], list[Metric]]:
+    """Create a collector of the statistics of the bot components.
+
+    Args:
+        bot: Sharded Discord client, for the status of the shards
+        scheduler: Scheduler of the graph runs
+        rest_scheduler: Scheduler of the Discord REST requests
+        caches: Caches by name, with ``hits`` and ``misses`` counters on
+            themselves or on their ``stats`` attribute
+        get_thread_count: Function counting the checkpointed threads
+
+    Returns:
+        Collector to add to the registry
+    """
+
+    def collect() -> list[Metric]:
+        stats = scheduler.stats()
+        runs = Gauge("apeiron_runs", "Number of graph runs by state", ["state"])
+        runs.set(stats.running, state="running")
+        runs.set(stats.pending, state="pending")
+        threads = Gauge("apeiron_threads", "Number of threads with scheduled runs")
+        threads.set(stats.threads)
+
+        rest_stats = rest_scheduler.stats()
+        rest_requests = Gauge(
+            "apeiron_discord_requests",
+            "Number of pending Discord REST requests by priority",
+            ["priority"],
+        )
+        rest_wait = Gauge(
+            "apeiron_discord_request_wait_seconds",
+            "Average wait time of the recent Discord REST requests by priority",
+            ["priority"],
+        )
+        for priority, pending in rest_stats.pending.items():
+            rest_requests.set(pending, priority=priority)
+            rest_wait.set(rest_stats.wait_time_avg[priority], priority=priority)
+
+        hits = Counter("apeiron_cache_hits_total", "Number of cache hits", ["cache"])
+        misses = Counter(
+            "apeiron_cache_misses_total", "Number of cache misses", ["cache"]
+        )
+        for name, cache in caches.items():
+            cache_stats = getattr(cache, "stats", cache)
+            # Gateway hits and shared fetches of the Discord cache count as hits
+            hits.inc(
+                cache_stats.hits
+                + getattr(cache_stats, "gateway_hits", 0)
+                + getattr(cache_stats, "deduplicated", 0),
+                cache=name,
+            )
+            misses.inc(cache_stats.misses, cache=name)
+
+        metrics = [runs, threads, rest_requests, rest_wait, hits, misses]
+        if (thread_count := get_thread_count()) is not None:
+            checkpoint_threads = Gauge(
+                "apeiron_checkpoint_threads", "Number of checkpointed threads"
+            )
+            checkpoint_threads.set(thread_count)
+            metrics.append(checkpoint_threads)
+
+        latency = Gauge(
+            "apeiron_shard_latency_seconds", "Gateway latency by shard", ["shard"]
+        )
+        ready = Gauge(
+            "apeiron_shard_ready", "Whether the shards are connected", ["shard"]
+        )
+        for shard_id, status in get_shard_status(bot).items():
+            ready.set(int(status["ready"]), shard=shard_id)
+            if status["latency"] is not None:
+                latency.set(status["latency"], shard=shard_id)
+        metrics.extend([latency, ready])
+        return metrics
+
+    return collect
@@ -0,0 +1,209 @@
+import logging
+import os
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+from discord import Client
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Guild, channel and author IDs of a message
+Scope = tuple[int | None, int, int]
+
+
+@dataclass
+class ResponseCacheStats:
+    """Counters of the semantic response cache."""
+
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    saved_time: float = 0.0
+
+    @property
+    def hit_ratio(self) -> float:
+        """Ratio of lookups answered from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@dataclass
+class _ScopeEntries:
+    vectors: list[np.ndarray] = field(default_factory=list)
+    responses: list[tuple[float, float, Any]] = field(default_factory=list)
+    matrix: np.ndarray | None = None
+
+
+class ResponseCache:
+    """Cache of the agent responses of a channel, keyed by message embeddings.
+
+    A message gets the cached response of a previous message of the same
+    author in the same guild and channel when the cosine similarity of their
+    embeddings is at least ``threshold``, since responses often address or
+    depend on the asker. Responses expire after ``ttl`` seconds, and the
+    responses of a channel are dropped when its content changes: message
+    edits and deletions, pins and channel updates.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        client: Client | None = None,
+        threshold: float = 0.95,
+        ttl: float = 3600.0,
+        max_size: int = 256,
+    ):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+        self.stats = ResponseCacheStats()
+        # Entries by author, grouped by channel to invalidate them together
+        self._channels: defaultdict[
+            tuple[int | None, int], dict[int, _ScopeEntries]
+        ] = defaultdict(dict)
+        if client is not None:
+            self._add_listeners(client)
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Embed the text of a message as a unit vector."""
+        vector = np.asarray(await self.embeddings.aembed_query(text), np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def get(self, scope: Scope, vector: np.ndarray) -> Any | None:
+        """Get the cached response of the most similar message of a channel.
+
+        Args:
+            scope: Guild, channel and author IDs of the message
+            vector: Embedding of the message text created by ``embed``
+
+        Returns:
+            Cached response, None on a miss
+        """
+        guild_id, channel_id, author_id = scope
+        entries = self._channels.get((guild_id, channel_id), {}).get(author_id)
+        if entries is not None:
+            self._expire(scope, entries)
+        if not entries or not entries.vectors:
+            self.stats.misses += 1
+            return None
+        if entries.matrix is None:
+            entries.matrix = np.vstack(entries.vectors)
+        scores = entries.matrix @ vector
+        i = int(np.argmax(scores))
+        if scores[i] < self.threshold:
+            self.stats.misses += 1
+            return None
+        _, duration, response = entries.responses[i]
+        self.stats.hits += 1
+        self.stats.saved_time += duration
+        logger.info(
+            "Response cache hit in %s with similarity %.3f, saved %.3fs "
+            "(hit ratio %.2f, %.1fs saved in total)",
+            scope,
+            scores[i],
+            duration,
+            self.stats.hit_ratio,
+            self.stats.saved_time,
+        )
+        return response
+
+    def put(self, scope: Scope, vector: np.ndarray, response: Any, duration: float):
+        """Cache the response to a message.
+
+        Args:
+            scope: Guild, channel and author IDs of the message
+            vector: Embedding of the message text created by ``embed``
+            response: Response of the agent
+            duration: Time taken by the agent to respond, in seconds
+        """
+        guild_id, channel_id, author_id = scope
+        authors = self._channels[(guild_id, channel_id)]
+        entries = authors.setdefault(author_id, _ScopeEntries())
+        entries.vectors.append(vector)
+        entries.responses.append((time.monotonic(), duration, response))
+        if len(entries.vectors) > self.max_size:
+            del entries.vectors[0], entries.responses[0]
+        entries.matrix = None
+
+    def invalidate(self, channel: tuple[int | None, int]):
+        """Drop the cached responses of a channel, given its guild and ID."""
+        if self._channels.pop(channel, None) is not None:
+            self.stats.invalidations += 1
+
+    def _expire(self, scope: Scope, entries: _ScopeEntries):
+        """Drop the expired responses of a channel, oldest first."""
+        deadline = time.monotonic() - self.ttl
+        expired = 0
+        while (
+            expired < len(entries.responses)
+            and entries.responses[expired][0] < deadline
+        ):
+            expired += 1
+        if expired:
+            del entries.vectors[:expired], entries.responses[:expired]
+            entries.matrix = None
+        if not entries.vectors:
+            guild_id, channel_id, author_id = scope
+            authors = self._channels[(guild_id, channel_id)]
+            del authors[author_id]
+            if not authors:
+                del self._channels[(guild_id, channel_id)]
+
+    def _add_listeners(self, client: Client):
+        """Invalidate the responses of a channel when its content changes."""
+
+        def invalidate_channel(channel: Any):
+            guild = getattr(channel, "guild", None)
+            self.invalidate((guild.id if guild else None, channel.id))
+
+        async def on_raw_message_edit(payload):
+            # Skip the embeds added to new messages and the edits of the bot
+            author_id = payload.data.get("author", {}).get("id")
+            if payload.data.get("edited_timestamp") and author_id != str(
+                client.user.id
+            ):
+                self.invalidate((payload.guild_id, payload.channel_id))
+
+        async def on_raw_message_delete(payload):
+            self.invalidate((payload.guild_id, payload.channel_id))
+
+        async def on_raw_bulk_message_delete(payload):
+            self.invalidate((payload.guild_id, payload.channel_id))
+
+        async def on_guild_channel_pins_update(channel, last_pin):
+            invalidate_channel(channel)
+
+        async def on_guild_channel_update(before, after):
+            invalidate_channel(after)
+
+        async def on_guild_channel_delete(channel):
+            invalidate_channel(channel)
+
+        for listener in (
+            on_raw_message_edit,
+            on_raw_message_delete,
+            on_raw_bulk_message_delete,
+            on_guild_channel_pins_update,
+            on_guild_channel_update,
+            on_guild_channel_delete,
+        ):
+            client.add_listener(listener)
+
+
+def create_response_cache(
+    embeddings: Embeddings, client: Client | None = None
+) -> ResponseCache | None:
+    """Create the response cache if enabled by the environment."""
+    if not int(os.getenv("APEIRON_RESPONSE_CACHE", "0")):
+        return None
+    return ResponseCache(
+        embeddings,
+        client,
+        threshold=float(os.getenv("APEIRON_RESPONSE_CACHE_THRESHOLD", "0.95")),
+        ttl=float(os.getenv("APEIRON_RESPONSE_CACHE_TTL", "3600")),
+    )
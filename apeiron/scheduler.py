@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerFullError(Exception):
+    """Raised when the scheduler has reached its maximum number of pending jobs."""
+
+
+@dataclass(frozen=True)
+class SchedulerStats:
+    """Snapshot of the scheduler queues and wait times."""
+
+    pending: int
+    running: int
+    threads: int
+    completed: int
+    max_queue_depth: int
+    wait_time_avg: float
+    wait_time_max: float
+
+
+@dataclass
+class _Job:
+    fn: Callable[[], Awaitable[Any]]
+    future: asyncio.Future
+    enqueued_at: float
+
+
+class Scheduler:
+    """Run jobs in submission order per key with a global concurrency cap.
+
+    Jobs sharing a key (e.g. a conversation thread ID) never run concurrently,
+    while jobs of different keys run in parallel up to ``max_concurrency``.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        max_pending: int = 1000,
+        wait_time_window: int = 1024,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._queues: dict[Hashable, deque[_Job]] = {}
+        self._workers: dict[Hashable, asyncio.Task] = {}
+        self._wait_times: deque[float] = deque(maxlen=wait_time_window)
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+
+    def submit(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """Schedule a job to run after all previously submitted jobs of the key.
+
+        Args:
+            key: Ordering key, jobs with the same key run one at a time
+            fn: Coroutine function called without arguments to run the job
+
+        Returns:
+            Future resolved with the result of the job
+
+        Raises:
+            SchedulerFullError: If the maximum number of pending jobs is reached
+        """
+        if self._pending >= self.max_pending:
+            raise SchedulerFullError(
+                f"Scheduler is full ({self._pending} pending jobs)"
+            )
+        job = _Job(
+            fn=fn,
+            future=asyncio.get_running_loop().create_future(),
+            enqueued_at=time.monotonic(),
+        )
+        self._queues.setdefault(key, deque()).append(job)
+        self._pending += 1
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._drain(key))
+        return job.future
+
+    def stats(self) -> SchedulerStats:
+        """Get a snapshot of the scheduler statistics."""
+        wait_times = self._wait_times
+        return SchedulerStats(
+            pending=self._pending,
+            running=self._running,
+            threads=len(self._workers),
+            completed=self._completed,
+            max_queue_depth=max((len(q) for q in self._queues.values()), default=0),
+            wait_time_avg=sum(wait_times) / len(wait_times) if wait_times else 0.0,
+            wait_time_max=max(wait_times, default=0.0),
+        )
+
+    async def _drain(self, key: Hashable):
+        """Run the queued jobs of a key one after another."""
+        queue = self._queues[key]
+        try:
+            while queue:
+                async with self._semaphore:
+                    job = queue.popleft()
+                    self._pending -= 1
+                    if job.future.cancelled():
+                        continue
+                    wait_time = time.monotonic() - job.enqueued_at
+                    self._wait_times.append(wait_time)
+                    logger.debug(
+                        "Running job for %s after waiting %.3fs (%d queued)",
+                        key,
+                        wait_time,
+                        len(queue),
+                    )
+                    self._running += 1
+                    try:
+                        result = await job.fn()
+                    except Exception as e:
+                        if not job.future.done():
+                            job.future.set_exception(e)
+                    else:
+                        if not job.future.done():
+                            job.future.set_result(result)
+                    finally:
+                        self._running -= 1
+                        self._completed += 1
+        finally:
+            del self._queues[key]
+            del self._workers[key]
+
+
+class Coalescer:
+    """Fold items arriving in quick succession for a key into a single job.
+
+    Items are buffered per key until no new item arrived for ``window``
+    seconds (or ``max_delay`` seconds passed since the first one), then the
+    whole batch is submitted to the scheduler as one job. Items arriving while
+    that job is still queued behind a running job of the same key are folded
+    into it instead of creating another job.
+    """
+
+    def __init__(
+        self,
+        scheduler: Scheduler,
+        handler: Callable[[list[Any]], Awaitable[Any]],
+        window: float = 0.5,
+        max_delay: float = 5.0,
+    ):
+        self.scheduler = scheduler
+        self.handler = handler
+        self.window = window
+        self.max_delay = max_delay
+        self._batches: dict[Hashable, list[Any]] = {}
+        self._first_seen: dict[Hashable, float] = {}
+        self._timers: dict[Hashable, asyncio.Task] = {}
+        self._scheduled: set[Hashable] = set()
+
+    def add(self, key: Hashable, item: Any):
+        """Add an item to the next batch of the key.
+
+        Args:
+            key: Ordering key, batches with the same key run one at a time
+            item: Item to pass to the handler as part of the batch
+        """
+        self._batches.setdefault(key, []).append(item)
+        self._first_seen.setdefault(key, time.monotonic())
+        if key in self._scheduled:
+            # A queued job will pick the item up when it starts
+            return
+        if timer := self._timers.get(key):
+            timer.cancel()
+        self._timers[key] = asyncio.create_task(self._flush_later(key))
+
+    async def _flush_later(self, key: Hashable):
+        """Submit the batch of a key once its debounce window has elapsed."""
+        deadline = self._first_seen[key] + self.max_delay
+        await asyncio.sleep(max(0.0, min(self.window, deadline - time.monotonic())))
+        del self._timers[key]
+        try:
+            future = self.scheduler.submit(key, lambda: self._run(key))
+        except SchedulerFullError as e:
+            dropped = self._batches.pop(key, [])
+            self._first_seen.pop(key, None)
+            logger.warning(f"Dropping {len(dropped)} items for {key}: {str(e)}")
+            return
+        self._scheduled.add(key)
+        future.add_done_callback(self._log_failure)
+
+    async def _run(self, key: Hashable) -> Any:
+        """Run the handler on everything buffered for the key so far."""
+        self._scheduled.discard(key)
+        self._first_seen.pop(key, None)
+        batch = self._batches.pop(key, [])
+        if not batch:
+            return None
+        if len(batch) > 1:
+            logger.debug("Coalesced %d items for %s", len(batch), key)
+        return await self.handler(batch)
+
+    @staticmethod
+    def _log_failure(future: asyncio.Future):
+        if not future.cancelled() and (e := future.exception()):
+            logger.error(f"Error handling batch: {str(e)}")
@@ -0,0 +1,123 @@
+import math
+import os
+import re
+from dataclasses import dataclass
+from typing import Any
+
+PRIVATE_GUILD = "__private__"
+
+
+@dataclass(frozen=True)
+class ShardConfig:
+    """Gateway shards run by the process.
+
+    ``shard_count`` is the total number of shards of the bot, chosen by
+    Discord if None. ``shard_ids`` are the shards run by the process, all of
+    them if None.
+    """
+
+    shard_count: int | None = None
+    shard_ids: list[int] | None = None
+
+
+def parse_shard_ids(value: str) -> list[int]:
+    """Parse a list of shard IDs and ranges, such as ``0,2,4-7``."""
+    shard_ids = []
+    for part in value.split(","):
+        if not (part := part.strip()):
+            continue
+        start, _, end = part.partition("-")
+        shard_ids.extend(range(int(start), int(end or start) + 1))
+    return sorted(set(shard_ids))
+
+
+def get_process_index() -> int:
+    """Get the index of the process among the processes running the bot.
+
+    Read from ``APEIRON_SHARD_PROCESS_INDEX``, or from the ordinal suffix of
+    the host name of the pods of a StatefulSet, e.g. ``apeiron-2``.
+    """
+    if index := os.getenv("APEIRON_SHARD_PROCESS_INDEX"):
+        return int(index)
+    hostname = os.getenv("HOSTNAME", "")
+    if match := re.search(r"-(\d+)$", hostname):
+        return int(match.group(1))
+    raise ValueError(
+        "APEIRON_SHARD_PROCESS_INDEX is not set and the host name "
+        f"{hostname!r} has no ordinal suffix"
+    )
+
+
+def create_shard_config() -> ShardConfig:
+    """Create the shard configuration from the environment variables.
+
+    ``APEIRON_SHARD_COUNT`` sets the total number of shards. The shards of
+    the process are either listed by ``APEIRON_SHARD_IDS``, or assigned round
+    robin among ``APEIRON_SHARD_PROCESSES`` processes by the process index.
+    """
+    shard_count = int(os.getenv("APEIRON_SHARD_COUNT", "0")) or None
+    ids = os.getenv("APEIRON_SHARD_IDS")
+    processes = int(os.getenv("APEIRON_SHARD_PROCESSES", "0"))
+    if shard_count is None:
+        if ids or processes:
+            raise ValueError("APEIRON_SHARD_COUNT is required to assign shards")
+        return ShardConfig()
+    if ids:
+        shard_ids = parse_shard_ids(ids)
+    elif processes:
+        index = get_process_index()
+        if not 0 <= index < processes:
+            raise ValueError(f"Invalid process index {index} of {processes}")
+        shard_ids = list(range(index, shard_count, processes))
+    else:
+        return ShardConfig(shard_count)
+    if not shard_ids or not all(0 <= i < shard_count for i in shard_ids):
+        raise ValueError(f"Invalid shard IDs {shard_ids} of {shard_count} shards")
+    return ShardConfig(shard_count, shard_ids)
+
+
+def get_shard_id(guild_id: int | None, shard_count: int) -> int:
+    """Get the shard receiving the events of a guild.
+
+    Direct messages are received by the first shard.
+    """
+    if guild_id is None:
+        return 0
+    return (guild_id >> 22) % shard_count
+
+
+def get_thread_shard_id(thread_id: str, shard_count: int) -> int:
+    """Get the shard receiving the events of a conversation thread."""
+    match thread_id.split("/"):
+        case ["guild", guild_id, *_] if guild_id != PRIVATE_GUILD:
+            return get_shard_id(int(guild_id), shard_count)
+        case _:
+            return get_shard_id(None, shard_count)
+
+
+def get_shard_status(bot: Any) -> dict[int, dict[str, Any]]:
+    """Get the status of the shards run by a sharded bot.
+
+    Returns:
+        Whether each shard is connected, with its latency in seconds when
+        known and whether it is rate limited
+    """
+    shards = bot.shards
+    if bot.shard_ids is not None:
+        shard_ids = bot.shard_ids
+    elif bot.shard_count:
+        shard_ids = range(bot.shard_count)
+    else:
+        shard_ids = sorted(shards)
+    status = {}
+    for shard_id in shard_ids:
+        shard = shards.get(shard_id)
+        if shard is None or shard.is_closed():
+            status[shard_id] = {"ready": False, "latency": None, "ratelimited": False}
+            continue
+        status[shard_id] = {
+            "ready": True,
+            "latency": shard.latency if math.isfinite(shard.latency) else None,
+            "ratelimited": shard.is_ws_ratelimited(),
+        }
+    return status
@@ -1,29 +1,31 @@
-from functools import cache
+import os
 
-from langchain.embeddings import init_embeddings
+from langchain_core.embeddings import Embeddings
+from langgraph.store.base import BaseStore
 from langgraph.store.memory import InMemoryStore
-from mistral_common.tokens.tokenizers.mistral import MistralTokenizer
 
+from apeiron.embeddings import create_embeddings
+from apeiron.stores.mmap import MmapStore
 
-@cache
-def get_mistral_tokenizer(model_name: str) -> MistralTokenizer:
-    """Get the tokenizer for a given model."""
-    return MistralTokenizer.from_model(model_name, strict=True)
 
-
-def create_store(model: str, **kwargs) -> InMemoryStore:
-    """Create a memory store."""
-    if (
-        model.startswith("mistralai:")
-        or kwargs.get("provider") == "mistralai"
-        and "tokenizer" not in kwargs
-    ):
-        kwargs["tokenizer"] = get_mistral_tokenizer(model.removeprefix("mistralai:"))
-
-    return InMemoryStore(
-        index={
-            "dims": 1536,
-            "embed": init_embeddings(model, **kwargs),
-            "fields": ["text"],
-        }
-    )
+def create_store(
+    model: str, embeddings: Embeddings | None = None, **kwargs
+) -> BaseStore:
+    """Create a memory store, embedding with the given embeddings if any."""
+    index = {
+        "dims": 1536,
+        "embed": embeddings or create_embeddings(model, **kwargs),
+        "fields": ["text"],
+    }
+    match os.getenv("APEIRON_STORE", "memory"):
+        case "memory":
+            return InMemoryStore(index=index)
+        case "mmap":
+            nprobe = int(os.getenv("APEIRON_STORE_NPROBE", "16"))
+            return MmapStore(
+                os.getenv("APEIRON_STORE_PATH", "store"),
+                index=index,
+                nprobe=nprobe or None,
+            )
+        case store:
+            raise ValueError(f"Invalid store: {store}")
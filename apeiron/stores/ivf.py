@@ -0,0 +1,154 @@
+import logging
+import math
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def kmeans(
+    vectors: np.ndarray,
+    n_clusters: int,
+    iterations: int = 10,
+    seed: int = 0,
+) -> np.ndarray:
+    """Cluster L2-normalized vectors with spherical k-means.
+
+    Args:
+        vectors: Matrix of normalized vectors, one per row
+        n_clusters: Number of clusters
+        iterations: Number of assignment and update rounds
+        seed: Seed of the initial centroid sampling
+
+    Returns:
+        Matrix of normalized centroids, one per row
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # Keep the previous centroid of empty clusters
+        empty = norms[:, 0] == 0
+        centroids[~empty] = sums[~empty] / norms[~empty]
+    return centroids
+
+
+class IVFIndex:
+    """Inverted file index of rows of a shared vector matrix.
+
+    Rows are partitioned into ``n_lists`` inverted lists by their nearest
+    centroid. Searches only score the rows of the ``nprobe`` lists whose
+    centroids are the most similar to the query, trading recall for latency.
+    The index only keeps row numbers, so it stays valid when the matrix is
+    remapped, and rows can be added and removed without retraining.
+    """
+
+    def __init__(self, centroids: np.ndarray):
+        self.centroids = centroids
+        self.trained_size = 0
+        self._lists: list[list[int]] = [[] for _ in range(len(centroids))]
+        self._positions: dict[int, tuple[int, int]] = {}
+        # Array copies of the lists, dropped when a list changes
+        self._arrays: list[np.ndarray | None] = [None] * len(centroids)
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        rows: np.ndarray,
+        n_lists: int | None = None,
+        sample_size: int = 64,
+        iterations: int = 10,
+        seed: int = 0,
+        chunk_size: int = 65536,
+    ) -> "IVFIndex":
+        """Train an index on rows of a vector matrix and add them to it.
+
+        Args:
+            vectors: Matrix of normalized vectors
+            rows: Rows of the matrix to index
+            n_lists: Number of inverted lists, defaults to the square root of
+                the number of rows
+            sample_size: Number of training vectors sampled per list
+            iterations: Number of k-means iterations
+            seed: Seed of the training sampling
+            chunk_size: Number of rows assigned to lists at once
+
+        Returns:
+            Index containing all the given rows
+        """
+        if n_lists is None:
+            n_lists = max(1, round(math.sqrt(len(rows))))
+        n_lists = min(n_lists, len(rows))
+        rng = np.random.default_rng(seed)
+        sample = rows
+        if len(rows) > n_lists * sample_size:
+            sample = np.sort(rng.choice(rows, n_lists * sample_size, replace=False))
+        index = cls(kmeans(np.asarray(vectors[sample]), n_lists, iterations, seed))
+        for start in range(0, len(rows), chunk_size):
+            batch = rows[start : start + chunk_size]
+            index.add(batch, np.asarray(vectors[batch]))
+        index.trained_size = len(rows)
+        logger.debug("Built index of %d rows in %d lists", len(rows), n_lists)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray):
+        """Add rows to the lists of their nearest centroids."""
+        assignments = np.argmax(vectors @ self.centroids.T, axis=1)
+        for row, list_id in zip(rows.tolist(), assignments.tolist(), strict=True):
+            if row in self._positions:
+                self.remove([row])
+            inverted_list = self._lists[list_id]
+            self._positions[row] = (list_id, len(inverted_list))
+            inverted_list.append(row)
+            self._arrays[list_id] = None
+
+    def remove(self, rows: list[int]):
+        """Remove rows from the index, ignoring unknown rows."""
+        for row in rows:
+            position = self._positions.pop(row, None)
+            if position is None:
+                continue
+            list_id, i = position
+            inverted_list = self._lists[list_id]
+            self._arrays[list_id] = None
+            last = inverted_list.pop()
+            if last != row:
+                inverted_list[i] = last
+                self._positions[last] = (list_id, i)
+
+    def search(
+        self, vectors: np.ndarray, query: np.ndarray, nprobe: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Score the rows of the lists nearest to a normalized query.
+
+        Args:
+            vectors: Matrix of normalized vectors the rows belong to
+            query: Normalized query vector
+            nprobe: Number of inverted lists to scan
+
+        Returns:
+            Scanned rows and their cosine similarity with the query
+        """
+        nprobe = min(nprobe, len(self._lists))
+        similarities = self.centroids @ query
+        probes = np.argpartition(-similarities, nprobe - 1)[:nprobe]
+        rows = np.concatenate([self._get_array(list_id) for list_id in probes])
+        if not len(rows):
+            return rows, np.empty(0, dtype=np.float32)
+        # Gather rows in file order to read the memory map sequentially
+        rows.sort()
+        return rows, np.asarray(vectors[rows]) @ query
+
+    def _get_array(self, list_id: int) -> np.ndarray:
+        array = self._arrays[list_id]
+        if array is None:
+            array = np.array(self._lists[list_id], dtype=np.int64)
+            self._arrays[list_id] = array
+        return array
@@ -0,0 +1,516 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import UTC, datetime
+from os import PathLike
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from langgraph.store.base import (
+    BaseStore,
+    GetOp,
+    IndexConfig,
+    Item,
+    ListNamespacesOp,
+    MatchCondition,
+    Op,
+    PutOp,
+    Result,
+    SearchItem,
+    SearchOp,
+    ensure_embeddings,
+    get_text_at_path,
+    tokenize_path,
+)
+
+from apeiron.stores.ivf import IVFIndex
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE TABLE IF NOT EXISTS vectors (
+    row INTEGER PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    path TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS vectors_item ON vectors (namespace, key);
+"""
+
+
+def _has_prefix(namespace: str, prefix: str) -> bool:
+    """Check if a joined namespace starts with a joined namespace prefix."""
+    return not prefix or namespace == prefix or namespace.startswith(prefix + ".")
+
+
+def _does_match(condition: MatchCondition, namespace: tuple[str, ...]) -> bool:
+    """Check if a namespace matches a prefix or suffix condition."""
+    if len(namespace) < len(condition.path):
+        return False
+    labels = namespace if condition.match_type == "prefix" else namespace[::-1]
+    path = condition.path if condition.match_type == "prefix" else condition.path[::-1]
+    return all(p == "*" or p == label for label, p in zip(labels, path, strict=False))
+
+
+def _matches_filter(value: Any, filter: Any) -> bool:
+    """Check if a value matches a filter of nested expected values."""
+    if isinstance(filter, dict):
+        return isinstance(value, dict) and all(
+            _matches_filter(value.get(k), v) for k, v in filter.items()
+        )
+    return value == filter
+
+
+class MmapStore(BaseStore):
+    """Persistent store keeping vectors in a memory-mapped float32 matrix.
+
+    Items and the mapping of matrix rows to items live in a side SQLite
+    database. Vectors are L2-normalized and written to a memory-mapped file,
+    so the store survives restarts without re-embedding, and searches compute
+    the cosine similarity of every vector with NumPy in fixed-size chunks to
+    keep the resident memory flat as the store grows.
+
+    Namespaces holding at least ``min_index_size`` vectors are searched
+    through an IVF index built on their first search instead, scanning only
+    the ``nprobe`` inverted lists nearest to the query. Raising ``nprobe``
+    improves the recall at the cost of latency, and ``None`` disables the
+    indexes for exact searches.
+    """
+
+    def __init__(
+        self,
+        path: str | PathLike,
+        *,
+        index: IndexConfig | None = None,
+        chunk_size: int = 65536,
+        nprobe: int | None = 16,
+        min_index_size: int = 4096,
+    ) -> None:
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+        self.nprobe = nprobe
+        self.min_index_size = min_index_size
+        self.conn = sqlite3.connect(self.path / "items.sqlite", check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+        self.index_config = None
+        self.embeddings = None
+        if index:
+            self.index_config = index.copy()
+            self.embeddings = ensure_embeddings(self.index_config.get("embed"))
+            self.index_config["__tokenized_fields"] = [
+                (p, tokenize_path(p)) if p != "$" else (p, p)
+                for p in (self.index_config.get("fields") or ["$"])
+            ]
+            self._open_vectors(self.index_config["dims"])
+
+    def batch(self, ops: Iterable[Op]) -> list[Result]:
+        ops = list(ops)
+        queries = {}
+        if self.embeddings:
+            queries = {
+                op.query: self.embeddings.embed_query(op.query)
+                for op in ops
+                if isinstance(op, SearchOp) and op.query
+            }
+        put_ops = self._get_put_ops(ops)
+        to_embed = self._extract_texts(put_ops)
+        embeddings = self.embeddings.embed_documents(list(to_embed)) if to_embed else []
+        with self.lock:
+            return self._execute(ops, queries, put_ops, to_embed, embeddings)
+
+    async def abatch(self, ops: Iterable[Op]) -> list[Result]:
+        ops = list(ops)
+        queries = {}
+        if self.embeddings:
+            texts = list(
+                {op.query for op in ops if isinstance(op, SearchOp) and op.query}
+            )
+            vectors = await asyncio.gather(
+                *(self.embeddings.aembed_query(text) for text in texts)
+            )
+            queries = dict(zip(texts, vectors, strict=True))
+        put_ops = self._get_put_ops(ops)
+        to_embed = self._extract_texts(put_ops)
+        embeddings = (
+            await self.embeddings.aembed_documents(list(to_embed)) if to_embed else []
+        )
+
+        def execute():
+            with self.lock:
+                return self._execute(ops, queries, put_ops, to_embed, embeddings)
+
+        return await asyncio.to_thread(execute)
+
+    def close(self):
+        """Flush the vectors and close the database."""
+        with self.lock:
+            if self.index_config:
+                self._vectors.flush()
+            self.conn.close()
+
+    # Operations
+
+    def _execute(
+        self,
+        ops: list[Op],
+        queries: dict[str, list[float]],
+        put_ops: dict[tuple[tuple[str, ...], str], PutOp],
+        to_embed: dict[str, list[tuple[tuple[str, ...], str, str]]],
+        embeddings: list[list[float]],
+    ) -> list[Result]:
+        results: list[Result] = []
+        for op in ops:
+            if isinstance(op, GetOp):
+                results.append(self._get(op))
+            elif isinstance(op, SearchOp):
+                results.append(self._search(op, queries.get(op.query)))
+            elif isinstance(op, ListNamespacesOp):
+                results.append(self._list_namespaces(op))
+            elif isinstance(op, PutOp):
+                results.append(None)
+            else:
+                raise ValueError(f"Unknown operation type: {type(op)}")
+        if put_ops:
+            with self.conn:
+                self._apply_put_ops(put_ops, to_embed, embeddings)
+            if self.index_config:
+                self._vectors.flush()
+        return results
+
+    def _get(self, op: GetOp) -> Item | None:
+        row = self.conn.execute(
+            "SELECT namespace, key, value, created_at, updated_at FROM items"
+            " WHERE namespace = ? AND key = ?",
+            (".".join(op.namespace), op.key),
+        ).fetchone()
+        return self._to_item(row) if row else None
+
+    def _search(self, op: SearchOp, query: list[float] | None) -> list[SearchItem]:
+        prefix = ".".join(op.namespace_prefix)
+        if query is None or not self.index_config:
+            results = []
+            for row in self.conn.execute(
+                "SELECT namespace, key, value, created_at, updated_at FROM items"
+                " WHERE ? = '' OR namespace = ? OR substr(namespace, 1, ?) = ?"
+                " ORDER BY namespace, key",
+                (prefix, prefix, len(prefix) + 1, prefix + "."),
+            ):
+                item = self._to_item(row)
+                if op.filter and not _matches_filter(item.value, op.filter):
+                    continue
+                results.append(item)
+                if len(results) >= op.offset + op.limit:
+                    break
+            return [self._to_search_item(item) for item in results[op.offset :]]
+
+        rows, scores = self._score(np.asarray(query, dtype=np.float32), prefix)
+        needed = op.offset + op.limit
+        k = min(len(rows), needed * 2)
+        while True:
+            if k < len(rows):
+                top = np.argpartition(-scores, k - 1)[:k]
+            else:
+                top = np.arange(len(rows))
+            top = top[np.argsort(-scores[top], kind="stable")]
+            results = self._collect(rows[top], scores[top], op)
+            if len(results) >= needed or k >= len(rows):
+                return results[op.offset : needed]
+            # Filtered out or duplicated items, widen the candidates
+            k = min(len(rows), k * 4)
+
+    def _list_namespaces(self, op: ListNamespacesOp) -> list[tuple[str, ...]]:
+        namespaces = [
+            tuple(namespace.split("."))
+            for (namespace,) in self.conn.execute(
+                "SELECT DISTINCT namespace FROM items"
+            )
+        ]
+        if op.match_conditions:
+            namespaces = [
+                namespace
+                for namespace in namespaces
+                if all(_does_match(c, namespace) for c in op.match_conditions)
+            ]
+        if op.max_depth is not None:
+            namespaces = sorted({namespace[: op.max_depth] for namespace in namespaces})
+        else:
+            namespaces = sorted(namespaces)
+        return namespaces[op.offset : op.offset + op.limit]
+
+    def _apply_put_ops(
+        self,
+        put_ops: dict[tuple[tuple[str, ...], str], PutOp],
+        to_embed: dict[str, list[tuple[tuple[str, ...], str, str]]],
+        embeddings: list[list[float]],
+    ):
+        now = datetime.now(UTC).isoformat()
+        for (namespace, key), op in put_ops.items():
+            joined = ".".join(namespace)
+            if self.index_config:
+                self._delete_vectors(joined, key)
+            if op.value is None:
+                self.conn.execute(
+                    "DELETE FROM items WHERE namespace = ? AND key = ?", (joined, key)
+                )
+                continue
+            self.conn.execute(
+                "INSERT INTO items VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (namespace, key) DO UPDATE"
+                " SET value = excluded.value, updated_at = excluded.updated_at",
+                (joined, key, json.dumps(op.value), now, now),
+            )
+        for embedding, indices in zip(embeddings, to_embed.values(), strict=True):
+            vector = np.asarray(embedding, dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+            for namespace, key, path in indices:
+                self._insert_vector(".".join(namespace), key, path, vector)
+
+    # Helpers
+
+    def _get_put_ops(self, ops: list[Op]) -> dict[tuple[tuple[str, ...], str], PutOp]:
+        """Get the last put operation of each item."""
+        return {(op.namespace, op.key): op for op in ops if isinstance(op, PutOp)}
+
+    def _extract_texts(
+        self, put_ops: dict[tuple[tuple[str, ...], str], PutOp]
+    ) -> dict[str, list[tuple[tuple[str, ...], str, str]]]:
+        """Get the texts to embed with the item fields they belong to."""
+        to_embed = defaultdict(list)
+        if not self.index_config or not self.embeddings:
+            return to_embed
+        for op in put_ops.values():
+            if op.value is None or op.index is False:
+                continue
+            if op.index is None:
+                paths = self.index_config["__tokenized_fields"]
+            else:
+                paths = [(ix, tokenize_path(ix)) for ix in op.index]
+            for path, field in paths:
+                texts = get_text_at_path(op.value, field)
+                if len(texts) == 1:
+                    to_embed[texts[0]].append((op.namespace, op.key, path))
+                    continue
+                for i, text in enumerate(texts):
+                    to_embed[text].append((op.namespace, op.key, f"{path}.{i}"))
+        return to_embed
+
+    def _collect(
+        self, rows: np.ndarray, scores: np.ndarray, op: SearchOp
+    ) -> list[SearchItem]:
+        """Get the items of ranked vector rows, keeping the best score per item."""
+        row_scores = dict(zip(rows.tolist(), scores.tolist(), strict=True))
+        owners = {}
+        # Stay below the SQLite limit of variables per statement
+        for batch in np.array_split(rows, len(rows) // 500 + 1):
+            placeholders = ", ".join("?" * len(batch))
+            for row, namespace, key in self.conn.execute(
+                "SELECT row, namespace, key FROM vectors"
+                f" WHERE row IN ({placeholders})",
+                batch.tolist(),
+            ):
+                owners[row] = (namespace, key)
+        results, seen = [], set()
+        for row, score in row_scores.items():
+            owner = owners.get(row)
+            if owner is None or owner in seen:
+                continue
+            seen.add(owner)
+            item_row = self.conn.execute(
+                "SELECT namespace, key, value, created_at, updated_at FROM items"
+                " WHERE namespace = ? AND key = ?",
+                owner,
+            ).fetchone()
+            if item_row is None:
+                continue
+            item = self._to_item(item_row)
+            if op.filter and not _matches_filter(item.value, op.filter):
+                continue
+            results.append(self._to_search_item(item, score))
+        return results
+
+    def _to_item(self, row: tuple) -> Item:
+        namespace, key, value, created_at, updated_at = row
+        return Item(
+            namespace=tuple(namespace.split(".")),
+            key=key,
+            value=json.loads(value),
+            created_at=datetime.fromisoformat(created_at),
+            updated_at=datetime.fromisoformat(updated_at),
+        )
+
+    @staticmethod
+    def _to_search_item(item: Item, score: float | None = None) -> SearchItem:
+        return SearchItem(
+            namespace=item.namespace,
+            key=item.key,
+            value=item.value,
+            created_at=item.created_at,
+            updated_at=item.updated_at,
+            score=score,
+        )
+
+    # Vectors
+
+    def _open_vectors(self, dims: int):
+        """Open the vector matrix and rebuild the row bookkeeping."""
+        self.dims = dims
+        self._vectors_path = self.path / "vectors.f32"
+        if not self._vectors_path.exists():
+            self._vectors_path.touch()
+        row_size = dims * np.dtype(np.float32).itemsize
+        capacity = max(self._vectors_path.stat().st_size // row_size, 1024)
+        self._namespace_ids: dict[str, int] = {}
+        self._namespace_sizes: dict[int, int] = defaultdict(int)
+        self._indexes: dict[int, IVFIndex] = {}
+        self._row_namespaces = np.zeros(capacity, dtype=np.int32)
+        self._valid = np.zeros(capacity, dtype=bool)
+        self._size = 0
+        for row, namespace in self.conn.execute("SELECT row, namespace FROM vectors"):
+            if row >= capacity:
+                raise ValueError(f"Vector row {row} missing from {self._vectors_path}")
+            namespace_id = self._get_namespace_id(namespace)
+            self._row_namespaces[row] = namespace_id
+            self._namespace_sizes[namespace_id] += 1
+            self._valid[row] = True
+            self._size = max(self._size, row + 1)
+        self._free_rows = np.flatnonzero(~self._valid[: self._size]).tolist()
+        self._map_vectors(capacity)
+
+    def _map_vectors(self, capacity: int):
+        """Memory-map the vector file, growing it to the given capacity."""
+        row_size = self.dims * np.dtype(np.float32).itemsize
+        with open(self._vectors_path, "r+b") as f:
+            f.truncate(capacity * row_size)
+        self._capacity = capacity
+        self._vectors = np.memmap(
+            self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dims)
+        )
+
+    def _get_namespace_id(self, namespace: str) -> int:
+        return self._namespace_ids.setdefault(namespace, len(self._namespace_ids))
+
+    def _insert_vector(self, namespace: str, key: str, path: str, vector: np.ndarray):
+        if self._free_rows:
+            row = self._free_rows.pop()
+        else:
+            if self._size == self._capacity:
+                self._grow(self._capacity * 2)
+            row = self._size
+            self._size += 1
+        self._vectors[row] = vector
+        namespace_id = self._get_namespace_id(namespace)
+        self._row_namespaces[row] = namespace_id
+        self._namespace_sizes[namespace_id] += 1
+        self._valid[row] = True
+        if index := self._indexes.get(namespace_id):
+            index.add(np.array([row]), vector[None])
+        self.conn.execute(
+            "INSERT OR REPLACE INTO vectors VALUES (?, ?, ?, ?)",
+            (row, namespace, key, path),
+        )
+
+    def _delete_vectors(self, namespace: str, key: str):
+        rows = [
+            row
+            for (row,) in self.conn.execute(
+                "SELECT row FROM vectors WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            )
+        ]
+        if not rows:
+            return
+        self.conn.execute(
+            "DELETE FROM vectors WHERE namespace = ? AND key = ?", (namespace, key)
+        )
+        self._valid[rows] = False
+        self._free_rows.extend(rows)
+        namespace_id = self._namespace_ids[namespace]
+        self._namespace_sizes[namespace_id] -= len(rows)
+        if index := self._indexes.get(namespace_id):
+            index.remove(rows)
+
+    def _grow(self, capacity: int):
+        self._vectors.flush()
+        del self._vectors
+        extra = capacity - self._capacity
+        self._row_namespaces = np.concatenate(
+            [self._row_namespaces, np.zeros(extra, dtype=np.int32)]
+        )
+        self._valid = np.concatenate([self._valid, np.zeros(extra, dtype=bool)])
+        self._map_vectors(capacity)
+
+    def _score(self, query: np.ndarray, prefix: str) -> tuple[np.ndarray, np.ndarray]:
+        """Compute the cosine similarity of the query with the candidate rows.
+
+        Indexed namespaces only contribute the rows of their probed lists, the
+        other namespaces are scanned exhaustively.
+        """
+        query /= np.linalg.norm(query) or 1.0
+        results, scanned = [], []
+        for namespace, namespace_id in self._namespace_ids.items():
+            if not _has_prefix(namespace, prefix):
+                continue
+            if index := self._get_index(namespace_id):
+                results.append(index.search(self._vectors, query, self.nprobe))
+            else:
+                scanned.append(namespace_id)
+        if scanned:
+            results.append(self._scan(query, np.array(scanned, dtype=np.int32)))
+        if not results:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows, scores = zip(*results, strict=True)
+        return np.concatenate(rows), np.concatenate(scores)
+
+    def _scan(
+        self, query: np.ndarray, namespace_ids: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Score every vector of the namespaces in fixed-size chunks."""
+        rows, scores = [], []
+        for start in range(0, self._size, self.chunk_size):
+            end = min(start + self.chunk_size, self._size)
+            mask = self._valid[start:end] & np.isin(
+                self._row_namespaces[start:end], namespace_ids
+            )
+            if mask.any():
+                chunk_rows = np.flatnonzero(mask)
+                rows.append(chunk_rows + start)
+                scores.append(self._vectors[start:end][chunk_rows] @ query)
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return np.concatenate(rows), np.concatenate(scores)
+
+    def _get_index(self, namespace_id: int) -> IVFIndex | None:
+        """Get the index of a namespace, (re)building it once large enough."""
+        size = self._namespace_sizes[namespace_id]
+        if self.nprobe is None or size < self.min_index_size:
+            self._indexes.pop(namespace_id, None)
+            return None
+        index = self._indexes.get(namespace_id)
+        # Retrain once the namespace outgrew the lists it was trained for
+        if index is None or size > index.trained_size * 4:
+            rows = np.flatnonzero(
+                self._valid[: self._size]
+                & (self._row_namespaces[: self._size] == namespace_id)
+            )
+            index = IVFIndex.build(self._vectors, rows, chunk_size=self.chunk_size)
+            self._indexes[namespace_id] = index
+        return index
@@ -0,0 +1,68 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable
+from functools import cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from mistral_common.tokens.tokenizers.mistral import MistralTokenizer
+
+
+@cache
+def get_mistral_tokenizer(model_name: str) -> "MistralTokenizer":
+    """Get the tokenizer for a given model."""
+    # Imported on first use, mistral_common pulls in transformers
+    from mistral_common.tokens.tokenizers.mistral import MistralTokenizer
+
+    return MistralTokenizer.from_model(model_name, strict=True)
+
+
+class TokenCounter:
+    """Memoized text encoding for a MistralAI model.
+
+    Token IDs are kept in a bounded LRU keyed by a hash of the text, so static
+    texts such as system prompts, few-shot examples and tool schemas are only
+    encoded once.
+    """
+
+    def __init__(self, model_name: str, max_size: int = 4096):
+        self.tokenizer = get_mistral_tokenizer(model_name).instruct_tokenizer.tokenizer
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[bytes, tuple[int, ...]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def encode(self, text: str) -> list[int]:
+        """Encode a text into token IDs."""
+        return list(self._encode(text))
+
+    def encode_batch(self, texts: Iterable[str]) -> list[list[int]]:
+        """Encode several texts into token IDs."""
+        return [list(self._encode(text)) for text in texts]
+
+    def count(self, text: str) -> int:
+        """Count the tokens of a text."""
+        return len(self._encode(text))
+
+    def _encode(self, text: str) -> tuple[int, ...]:
+        key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        with self._lock:
+            if (token_ids := self._cache.get(key)) is not None:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return token_ids
+            self.misses += 1
+        token_ids = tuple(self.tokenizer.encode(text, bos=False, eos=False))
+        with self._lock:
+            self._cache[key] = token_ids
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+        return token_ids
+
+
+@cache
+def get_token_counter(model_name: str) -> TokenCounter:
+    """Get the shared token counter for a given model."""
+    return TokenCounter(model_name)
@@ -3,15 +3,22 @@ from typing import Any
 from langchain_core.tools.base import BaseTool, BaseToolkit
 
 from apeiron.tools.discord.add_reaction import create_add_reaction_tool
+from apeiron.tools.discord.cache import get_discord_cache
+from apeiron.tools.discord.directory import get_discord_directory
 from apeiron.tools.discord.get_channel import create_get_channel_tool
+from apeiron.tools.discord.get_channels import create_get_channels_tool
 from apeiron.tools.discord.get_emoji import create_get_emoji_tool
+from apeiron.tools.discord.get_emojis import create_get_emojis_tool
 from apeiron.tools.discord.get_guild import create_get_guild_tool
 from apeiron.tools.discord.get_message import create_get_message_tool
+from apeiron.tools.discord.get_messages import create_get_messages_tool
 from apeiron.tools.discord.get_user import create_get_user_tool
+from apeiron.tools.discord.get_users import create_get_users_tool
 from apeiron.tools.discord.list_channels import create_list_channels_tool
 from apeiron.tools.discord.list_emojis import create_list_emojis_tool
 from apeiron.tools.discord.list_members import create_list_members_tool
 from apeiron.tools.discord.list_messages import create_list_messages_tool
+from apeiron.tools.discord.resolve import create_resolve_tool
 from apeiron.tools.discord.search_members import create_search_members_tool
 from apeiron.tools.discord.send_message import create_send_message_tool
 
@@ -20,6 +27,9 @@ class DiscordToolkit(BaseToolkit):
     """Toolkit for Discord operations."""
 
     client: Any = None  #: :meta private:
+    cache: Any = None  #: :meta private:
+    directory: Any = None  #: :meta private:
+    get_token_ids: Any = None  #: :meta private:
 
     def get_tools(self) -> list[BaseTool]:
         """Get the tools in the toolkit.
@@ -27,17 +37,27 @@ class DiscordToolkit(BaseToolkit):
         Returns:
             List of Discord tools.
         """
+        # Share a single entity cache per client between all the tools
+        if self.cache is None:
+            self.cache = get_discord_cache(self.client)
+        if self.directory is None:
+            self.directory = get_discord_directory(self.client)
         return [
-            create_add_reaction_tool(self.client),
-            create_get_channel_tool(self.client),
-            create_get_emoji_tool(self.client),
-            create_get_guild_tool(self.client),
-            create_get_message_tool(self.client),
-            create_get_user_tool(self.client),
-            create_list_channels_tool(self.client),
-            create_list_emojis_tool(self.client),
-            create_list_members_tool(self.client),
-            create_list_messages_tool(self.client),
-            create_search_members_tool(self.client),
-            create_send_message_tool(self.client),
+            create_add_reaction_tool(self.client, self.cache),
+            create_get_channel_tool(self.client, self.cache),
+            create_get_channels_tool(self.client, self.cache),
+            create_get_emoji_tool(self.client, self.cache),
+            create_get_emojis_tool(self.client, self.cache),
+            create_get_guild_tool(self.client, self.cache),
+            create_get_message_tool(self.client, self.cache),
+            create_get_messages_tool(self.client, self.cache),
+            create_get_user_tool(self.client, self.cache),
+            create_get_users_tool(self.client, self.cache),
+            create_list_channels_tool(self.client, self.cache),
+            create_list_emojis_tool(self.client, self.cache),
+            create_list_members_tool(self.client, self.cache),
+            create_list_messages_tool(self.client, self.cache, self.get_token_ids),
+            create_resolve_tool(self.client, self.cache, self.directory),
+            create_search_members_tool(self.client, self.cache),
+            create_send_message_tool(self.client, self.cache),
         ]
@@ -5,6 +5,8 @@ from langchain_core.tools import tool
 from langchain_core.tools.base import ToolException
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.cache import DiscordCache, get_discord_cache
+
 
 class AddReactionInput(BaseModel):
     """Arguments for adding reactions to Discord messages."""
@@ -18,8 +20,10 @@ class AddReactionInput(BaseModel):
     )
 
 
-def create_add_reaction_tool(client: Client):
+def create_add_reaction_tool(client: Client, cache: DiscordCache | None = None):
     """Create a tool for adding reactions to Discord messages."""
+    if cache is None:
+        cache = get_discord_cache(client)
 
     @tool(args_schema=AddReactionInput)
     async def add_reaction(
@@ -47,8 +51,9 @@ def create_add_reaction_tool(client: Client):
         if channel_id is None and config:
             channel_id = config.get("configurable").get("channel_id")
         try:
-            channel = await client.fetch_channel(channel_id)
-            message = await channel.fetch_message(message_id)
+            channel = await cache.get_channel(channel_id)
+            # Reacting only needs the message ID, skip fetching the message
+            message = channel.get_partial_message(message_id)
             await message.add_reaction(emoji)
             return f"Reaction {emoji} added successfully to message {message_id}"
         except (Forbidden, NotFound) as e:
@@ -0,0 +1,37 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Iterable
+from typing import Any
+
+from discord.errors import HTTPException
+from langchain_core.tools.base import ToolException
+
+# Maximum number of IDs of a batch tool call
+MAX_BATCH_SIZE = 50
+
+
+async def gather_items(
+    ids: Iterable[int],
+    fetch: Callable[[int], Awaitable[dict]],
+    max_concurrency: int = 8,
+) -> list[dict]:
+    """Fetch items concurrently, reporting the failures per item.
+
+    Args:
+        ids: IDs of the items to fetch, duplicates are fetched once
+        fetch: Coroutine function fetching an item as a dictionary
+        max_concurrency: Maximum number of items fetched at the same time
+
+    Returns:
+        Items in the order of their IDs, with ``{"id", "error"}`` in place of
+        the items that could not be fetched
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch_item(id: int) -> dict[str, Any]:
+        async with semaphore:
+            try:
+                return await fetch(id)
+            except (HTTPException, ToolException) as e:
+                return {"id": str(id), "error": str(e)}
+
+    return await asyncio.gather(*map(fetch_item, dict.fromkeys(ids)))
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import time
+import weakref
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass
+from typing import Any
+
+from discord import Client
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheStats:
+    """Counters of the Discord entity cache."""
+
+    gateway_hits: int = 0
+    hits: int = 0
+    misses: int = 0
+    deduplicated: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        """Ratio of lookups served without a new REST request."""
+        served = self.gateway_hits + self.hits + self.deduplicated
+        total = served + self.misses
+        return served / total if total else 0.0
+
+
+class DiscordCache:
+    """Cache of Discord entities shared by the Discord tools.
+
+    Lookups read the gateway cache of the client first and fall back to a REST
+    fetch on a miss. Fetched entities are kept for ``ttl`` seconds, invalidated
+    on gateway update and delete events, and concurrent fetches of the same
+    entity share a single request.
+    """
+
+    def __init__(self, client: Client, ttl: float = 300.0, max_size: int = 4096):
+        self.client = client
+        self.ttl = ttl
+        self.max_size = max_size
+        self.stats = CacheStats()
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        if client is not None:
+            self._add_listeners(client)
+
+    async def get_channel(self, channel_id: int) -> Any:
+        """Get a channel from the gateway cache or the REST API."""
+        return await self._get(
+            ("channel", channel_id),
+            lambda: self.client.get_channel(channel_id),
+            lambda: self.client.fetch_channel(channel_id),
+        )
+
+    async def get_guild(self, guild_id: int) -> Any:
+        """Get a guild from the gateway cache or the REST API."""
+        return await self._get(
+            ("guild", guild_id),
+            lambda: self.client.get_guild(guild_id),
+            lambda: self.client.fetch_guild(guild_id),
+        )
+
+    async def get_user(self, user_id: int) -> Any:
+        """Get a user from the gateway cache or the REST API."""
+        return await self._get(
+            ("user", user_id),
+            lambda: self.client.get_user(user_id),
+            lambda: self.client.fetch_user(user_id),
+        )
+
+    async def get_message(self, channel_id: int, message_id: int) -> Any:
+        """Get a message from the gateway cache or the REST API."""
+
+        async def fetch_message():
+            channel = await self.get_channel(channel_id)
+            return await channel.fetch_message(message_id)
+
+        return await self._get(
+            ("message", message_id),
+            lambda: self.client.get_message(message_id),
+            fetch_message,
+        )
+
+    async def get_emoji(self, guild_id: int, emoji_id: int) -> Any:
+        """Get a guild emoji from the gateway cache or the REST API."""
+
+        async def fetch_emoji():
+            guild = await self.get_guild(guild_id)
+            return await guild.fetch_emoji(emoji_id)
+
+        return await self._get(
+            ("emoji", emoji_id),
+            lambda: self.client.get_emoji(emoji_id),
+            fetch_emoji,
+        )
+
+    def invalidate(self, kind: str, entity_id: int):
+        """Drop an entity from the cache."""
+        key = (kind, entity_id)
+        if self._entries.pop(key, None) is not None:
+            self.stats.invalidations += 1
+        # Results of fetches started before the invalidation are not kept
+        self._inflight.pop(key, None)
+
+    async def _get(
+        self,
+        key: Hashable,
+        get: Callable[[], Any],
+        fetch: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """Resolve an entity from the gateway, the cache or a (shared) fetch."""
+        if (entity := get()) is not None:
+            self.stats.gateway_hits += 1
+            return entity
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, entity = entry
+            if expires_at > time.monotonic():
+                self.stats.hits += 1
+                self._entries.move_to_end(key)
+                return entity
+            del self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats.deduplicated += 1
+        else:
+            self.stats.misses += 1
+            task = asyncio.ensure_future(fetch())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._on_fetched(key, t))
+        return await asyncio.shield(task)
+
+    def _on_fetched(self, key: Hashable, task: asyncio.Task):
+        """Store the result of a finished fetch."""
+        if self._inflight.get(key) is not task:
+            return
+        del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, task.result())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _add_listeners(self, client: Client):
+        """Invalidate cached entities on gateway update and delete events."""
+
+        async def on_guild_channel_update(before, after):
+            self.invalidate("channel", after.id)
+
+        async def on_guild_channel_delete(channel):
+            self.invalidate("channel", channel.id)
+
+        async def on_thread_update(before, after):
+            self.invalidate("channel", after.id)
+
+        async def on_raw_thread_delete(payload):
+            self.invalidate("channel", payload.thread_id)
+
+        async def on_guild_update(before, after):
+            self.invalidate("guild", after.id)
+
+        async def on_guild_remove(guild):
+            self.invalidate("guild", guild.id)
+
+        async def on_guild_emojis_update(guild, before, after):
+            self.invalidate("guild", guild.id)
+            for emoji in before:
+                self.invalidate("emoji", emoji.id)
+
+        async def on_user_update(before, after):
+            self.invalidate("user", after.id)
+
+        async def on_raw_message_edit(payload):
+            self.invalidate("message", payload.message_id)
+
+        async def on_raw_message_delete(payload):
+            self.invalidate("message", payload.message_id)
+
+        for listener in (
+            on_guild_channel_update,
+            on_guild_channel_delete,
+            on_thread_update,
+            on_raw_thread_delete,
+            on_guild_update,
+            on_guild_remove,
+            on_guild_emojis_update,
+            on_user_update,
+            on_raw_message_edit,
+            on_raw_message_delete,
+        ):
+            client.add_listener(listener)
+
+
+_caches: "weakref.WeakKeyDictionary[Client, DiscordCache]" = weakref.WeakKeyDictionary()
+
+
+def get_discord_cache(client: Client) -> DiscordCache:
+    """Get the entity cache of a client, created once per client.
+
+    Every cache registers invalidation listeners on its client, so the tools
+    of a client share a single cache instead of creating their own.
+    """
+    if client is None:
+        return DiscordCache(client)
+    cache = _caches.get(client)
+    if cache is None:
+        cache = _caches[client] = DiscordCache(client)
+    return cache
@@ -0,0 +1,314 @@
+import bisect
+import logging
+import weakref
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Any, Literal
+
+from discord import Client
+
+logger = logging.getLogger(__name__)
+
+EntryType = Literal["member", "emoji", "channel"]
+
+
+@dataclass(frozen=True)
+class DirectoryEntry:
+    """Named entity of a guild directory."""
+
+    type: EntryType
+    id: int
+    name: str
+    mention: str
+    names: tuple[str, ...]
+
+
+def normalize_name(name: str) -> str:
+    """Normalize a name for lookups, ignoring case and mention markup."""
+    return name.strip().strip("@#:<>").casefold()
+
+
+def _get_ngrams(name: str, n: int = 3) -> set[str]:
+    padded = f" {name} "
+    return {padded[i : i + n] for i in range(max(1, len(padded) - n + 1))}
+
+
+def _get_similarity(query_ngrams: set[str], name: str) -> float:
+    """Compute the Dice coefficient of the trigrams of a query and a name."""
+    name_ngrams = _get_ngrams(name)
+    shared = len(query_ngrams & name_ngrams)
+    return 2 * shared / (len(query_ngrams) + len(name_ngrams))
+
+
+def member_to_entry(member: Any) -> DirectoryEntry:
+    """Create the directory entry of a member, with all its names."""
+    names = {member.name, member.display_name}
+    if getattr(member, "nick", None):
+        names.add(member.nick)
+    if getattr(member, "global_name", None):
+        names.add(member.global_name)
+    return DirectoryEntry(
+        type="member",
+        id=member.id,
+        name=member.display_name,
+        mention=f"<@{member.id}>",
+        names=tuple(names),
+    )
+
+
+def emoji_to_entry(emoji: Any) -> DirectoryEntry:
+    """Create the directory entry of a custom emoji."""
+    prefix = "a" if emoji.animated else ""
+    return DirectoryEntry(
+        type="emoji",
+        id=emoji.id,
+        name=emoji.name,
+        mention=f"<{prefix}:{emoji.name}:{emoji.id}>",
+        names=(emoji.name,),
+    )
+
+
+def channel_to_entry(channel: Any) -> DirectoryEntry:
+    """Create the directory entry of a channel."""
+    return DirectoryEntry(
+        type="channel",
+        id=channel.id,
+        name=channel.name,
+        mention=f"<#{channel.id}>",
+        names=(channel.name,),
+    )
+
+
+class GuildDirectory:
+    """Name index of the members, emojis and channels of a guild.
+
+    Normalized names are kept sorted for prefix lookups with bisect, and a
+    trigram index serves substring and fuzzy lookups without scanning every
+    entry.
+    """
+
+    def __init__(self):
+        self.complete = False
+        self._entries: dict[tuple[str, int], DirectoryEntry] = {}
+        self._names: list[tuple[str, str, int]] = []
+        self._ngrams: defaultdict[str, set[tuple[str, int]]] = defaultdict(set)
+
+    @classmethod
+    def from_guild(cls, guild: Any) -> "GuildDirectory":
+        """Index the members, emojis and channels cached for a guild."""
+        directory = cls()
+        entries = [
+            *map(member_to_entry, guild.members),
+            *map(emoji_to_entry, guild.emojis),
+            *map(channel_to_entry, guild.channels),
+        ]
+        for entry in entries:
+            directory._index(entry, sort=False)
+        # Sort the names once instead of inserting them one by one
+        directory._names.sort()
+        directory.complete = guild.chunked
+        return directory
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, entry: DirectoryEntry):
+        """Add an entry, replacing the previous entry of the same entity."""
+        self.remove(entry.type, entry.id)
+        self._index(entry)
+
+    def remove(self, type: EntryType, id: int):
+        """Remove the entry of an entity if present."""
+        entry = self._entries.pop((type, id), None)
+        if entry is None:
+            return
+        for name in {normalize_name(name) for name in entry.names}:
+            i = bisect.bisect_left(self._names, (name, type, id))
+            if i < len(self._names) and self._names[i] == (name, type, id):
+                del self._names[i]
+            for ngram in _get_ngrams(name):
+                keys = self._ngrams[ngram]
+                keys.discard((type, id))
+                if not keys:
+                    del self._ngrams[ngram]
+
+    def remove_type(self, type: EntryType):
+        """Remove every entry of a type."""
+        for entry_type, id in list(self._entries):
+            if entry_type == type:
+                self.remove(entry_type, id)
+
+    def _index(self, entry: DirectoryEntry, sort: bool = True):
+        key = (entry.type, entry.id)
+        self._entries[key] = entry
+        for name in {normalize_name(name) for name in entry.names}:
+            if sort:
+                bisect.insort(self._names, (name, *key))
+            else:
+                self._names.append((name, *key))
+            for ngram in _get_ngrams(name):
+                self._ngrams[ngram].add(key)
+
+    def search(
+        self,
+        query: str,
+        types: list[EntryType] | None = None,
+        limit: int = 5,
+        fuzzy: bool = True,
+        min_score: float = 0.3,
+        max_postings: int = 2000,
+    ) -> list[tuple[DirectoryEntry, float]]:
+        """Find the entries with a name matching a query.
+
+        Exact matches score 1.0 and prefix matches 0.9. With ``fuzzy``, other
+        names sharing trigrams with the query score their Dice coefficient
+        scaled to at most 0.8.
+
+        Args:
+            query: Name to look up
+            types: Types of entries to look up, all types if None
+            limit: Maximum number of entries to return
+            fuzzy: Whether to look up approximate matches
+            min_score: Minimum score of approximate matches
+            max_postings: Number of entries above which a trigram is skipped
+                when rarer trigrams of the query already matched
+
+        Returns:
+            Entries with their score, best first
+        """
+        query = normalize_name(query)
+        if not query:
+            return []
+        scores: dict[tuple[str, int], float] = {}
+
+        def add_score(key: tuple[str, int], score: float):
+            if (types is None or key[0] in types) and score > scores.get(key, 0.0):
+                scores[key] = score
+
+        i = bisect.bisect_left(self._names, (query,))
+        for name, type, id in self._names[i : i + max(limit, 100)]:
+            if not name.startswith(query):
+                break
+            add_score((type, id), 1.0 if name == query else 0.9)
+
+        if fuzzy and len(scores) < limit:
+            query_ngrams = _get_ngrams(query)
+            postings = sorted(
+                (self._ngrams.get(ngram, set()) for ngram in query_ngrams), key=len
+            )
+            shared = Counter()
+            for keys in postings:
+                # Skip the most common trigrams once rarer ones found candidates
+                if shared and len(keys) > max_postings:
+                    break
+                shared.update(keys)
+            # Only score the names sharing the most trigrams with the query
+            for key, _ in shared.most_common(limit * 20):
+                if key in scores:
+                    continue
+                score = max(
+                    _get_similarity(query_ngrams, normalize_name(name))
+                    for name in self._entries[key].names
+                )
+                if score >= min_score:
+                    add_score(key, 0.8 * score)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [(self._entries[key], score) for key, score in ranked[:limit]]
+
+
+class DiscordDirectory:
+    """Guild directories built from the gateway cache on first use.
+
+    Directories are kept current from the member, emoji and channel gateway
+    events, and rebuilt once the member list of a guild finished chunking.
+    """
+
+    def __init__(self, client: Client):
+        self.client = client
+        self._guilds: dict[int, GuildDirectory] = {}
+        if client is not None:
+            self._add_listeners(client)
+
+    def get(self, guild: Any) -> GuildDirectory:
+        """Get the directory of a guild, building it if needed."""
+        directory = self._guilds.get(guild.id)
+        if directory is None or not directory.complete and guild.chunked:
+            directory = GuildDirectory.from_guild(guild)
+            self._guilds[guild.id] = directory
+            logger.debug("Indexed %d names of guild %s", len(directory), guild.id)
+        return directory
+
+    def _add_listeners(self, client: Client):
+        """Update the built directories from gateway events."""
+
+        def get_directory(guild: Any) -> GuildDirectory | None:
+            return self._guilds.get(guild.id) if guild else None
+
+        async def on_member_join(member):
+            if directory := get_directory(member.guild):
+                directory.add(member_to_entry(member))
+
+        async def on_member_update(before, after):
+            if directory := get_directory(after.guild):
+                directory.add(member_to_entry(after))
+
+        async def on_member_remove(member):
+            if directory := get_directory(member.guild):
+                directory.remove("member", member.id)
+
+        async def on_user_update(before, after):
+            for guild in after.mutual_guilds:
+                directory = get_directory(guild)
+                member = guild.get_member(after.id)
+                if directory and member:
+                    directory.add(member_to_entry(member))
+
+        async def on_guild_emojis_update(guild, before, after):
+            if directory := get_directory(guild):
+                directory.remove_type("emoji")
+                for emoji in after:
+                    directory.add(emoji_to_entry(emoji))
+
+        async def on_guild_channel_create(channel):
+            if directory := get_directory(channel.guild):
+                directory.add(channel_to_entry(channel))
+
+        async def on_guild_channel_update(before, after):
+            if directory := get_directory(after.guild):
+                directory.add(channel_to_entry(after))
+
+        async def on_guild_channel_delete(channel):
+            if directory := get_directory(channel.guild):
+                directory.remove("channel", channel.id)
+
+        async def on_guild_remove(guild):
+            self._guilds.pop(guild.id, None)
+
+        for listener in (
+            on_member_join,
+            on_member_update,
+            on_member_remove,
+            on_user_update,
+            on_guild_emojis_update,
+            on_guild_channel_create,
+            on_guild_channel_update,
+            on_guild_channel_delete,
+            on_guild_remove,
+        ):
+            client.add_listener(listener)
+
+
+_directories: "weakref.WeakKeyDictionary[Client, DiscordDirectory]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_discord_directory(client: Client) -> DiscordDirectory:
+    """Get the name directory of a client, created once per client."""
+    if client is None:
+        return DiscordDirectory(client)
+    directory = _directories.get(client)
+    if directory is None:
+        directory = _directories[client] = DiscordDirectory(client)
+    return directory
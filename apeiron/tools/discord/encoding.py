@@ -0,0 +1,153 @@
+import json
+import os
+from collections.abc import Sequence
+from datetime import datetime
+
+import orjson
+from langchain_core.messages import BaseMessage
+
+
+class EventEncoder:
+    """Encode Discord message events as the JSON sent to the model."""
+
+    # Whether the encoding depends on the previous messages of the thread
+    uses_history = False
+
+    def encode(
+        self, thread_id: str, payload: dict, history: Sequence[BaseMessage] = ()
+    ) -> str:
+        """Encode a message event.
+
+        Args:
+            thread_id: ID of the conversation thread of the message
+            payload: Message data created by ``get_message.to_dict``
+            history: Previous messages of the thread, oldest first
+
+        Returns:
+            Text of the event
+        """
+        return json.dumps({"type": "on_message_event", "payload": payload})
+
+
+def _drop_empty(data: dict) -> dict:
+    """Drop the null, false and empty fields of a dictionary."""
+    return {k: v for k, v in data.items() if v or v == 0 and not isinstance(v, bool)}
+
+
+def _get_event(message: BaseMessage) -> dict | None:
+    """Get the compact event of a message of the thread, if it is one."""
+    if isinstance(message.content, str):
+        text = message.content
+    else:
+        text = next(
+            (
+                content.get("text", "")
+                for content in message.content
+                if isinstance(content, dict) and content.get("type") == "text"
+            ),
+            "",
+        )
+    if not text.startswith("{"):
+        return None
+    try:
+        event = orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return None
+    return event if isinstance(event, dict) and "author" in event else None
+
+
+def _format_timestamp(timestamp: str | None) -> str | None:
+    """Shorten a timestamp to the second, without the UTC offset."""
+    if not timestamp:
+        return None
+    return datetime.fromisoformat(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class CompactEventEncoder(EventEncoder):
+    """Encode message events with as few tokens as possible.
+
+    Empty fields, avatar URLs and sub-second timestamps are dropped, and the
+    author and channel blocks are referenced by ID when they are in one of
+    the latest ``refresh_every`` messages of the thread history, so the model
+    has seen them in the checkpointed thread even after a restart or a
+    failed run.
+    """
+
+    uses_history = True
+
+    def __init__(self, refresh_every: int = 20):
+        self.refresh_every = refresh_every
+
+    def encode(
+        self, thread_id: str, payload: dict, history: Sequence[BaseMessage] = ()
+    ) -> str:
+        authors, channel = set(), None
+        # Newest first, the latest channel block is the current one
+        for message in reversed(history[-self.refresh_every :]):
+            if (previous := _get_event(message)) is None:
+                continue
+            if isinstance(previous["author"], dict):
+                authors.add(previous["author"].get("id"))
+            if channel is None and "channel" in previous:
+                channel = (previous["channel"], previous.get("guild"))
+
+        author = payload["author"]
+        if author["id"] not in authors:
+            author = _drop_empty(
+                {
+                    "id": author["id"],
+                    "name": author["name"],
+                    "nick": author["display_name"]
+                    if author["display_name"] != author["name"]
+                    else None,
+                    "bot": author["bot"],
+                }
+            )
+        else:
+            author = author["id"]
+
+        event = {
+            "id": payload["id"],
+            "author": author,
+            "time": _format_timestamp(payload["timestamp"]),
+            "edited": _format_timestamp(payload.get("edited_timestamp")),
+            "content": payload["content"],
+            "files": [
+                _drop_empty(
+                    {
+                        "name": attachment["filename"],
+                        "type": attachment["content_type"],
+                        "url": attachment["url"],
+                    }
+                )
+                for attachment in payload.get("attachments", [])
+            ],
+        }
+
+        if channel != (payload["channel_id"], payload.get("guild_id")):
+            event["channel"] = payload["channel_id"]
+            event["guild"] = payload.get("guild_id")
+
+        if reference := payload.get("reference"):
+            event["reply_to"] = _drop_empty(
+                {
+                    "id": reference["id"],
+                    "author": reference["author"],
+                    "content": reference["content"],
+                }
+            )
+
+        return orjson.dumps(_drop_empty(event)).decode()
+
+
+def create_event_encoder() -> EventEncoder:
+    """Create the event encoder selected by the environment."""
+    match os.getenv("APEIRON_EVENT_ENCODING", "json"):
+        case "json":
+            return EventEncoder()
+        case "compact":
+            return CompactEventEncoder(
+                refresh_every=int(os.getenv("APEIRON_EVENT_REFRESH_EVERY", "20"))
+            )
+        case encoding:
+            raise ValueError(f"Invalid event encoding: {encoding}")
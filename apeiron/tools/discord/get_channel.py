@@ -5,6 +5,7 @@ from langchain_core.tools import tool
 from langchain_core.tools.base import ToolException
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.cache import DiscordCache, get_discord_cache
 from apeiron.tools.discord.list_channels import to_dict
 
 
@@ -16,8 +17,10 @@ class GetChannelInput(BaseModel):
     )
 
 
-def create_get_channel_tool(client: Client):
+def create_get_channel_tool(client: Client, cache: DiscordCache | None = None):
     """Create a tool for retrieving a specific Discord channel."""
+    if cache is None:
+        cache = get_discord_cache(client)
 
     @tool(args_schema=GetChannelInput)
     async def get_channel(
@@ -39,7 +42,7 @@ def create_get_channel_tool(client: Client):
         if channel_id is None and config:
             channel_id = config.get("configurable").get("channel_id")
         try:
-            channel = await client.fetch_channel(channel_id)
+            channel = await cache.get_channel(channel_id)
             if not isinstance(channel, TextChannel):
                 raise ToolException(
                     f"Channel {channel_id} not found or not a text channel"
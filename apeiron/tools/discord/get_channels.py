@@ -0,0 +1,52 @@
+from discord import Client, TextChannel
+from discord.errors import Forbidden, NotFound
+from langchain_core.tools import tool
+from langchain_core.tools.base import ToolException
+from pydantic import BaseModel, Field
+
+from apeiron.tools.discord.batch import MAX_BATCH_SIZE, gather_items
+from apeiron.tools.discord.cache import DiscordCache, get_discord_cache
+from apeiron.tools.discord.list_channels import to_dict
+
+
+class GetChannelsInput(BaseModel):
+    """Arguments for retrieving several Discord channels."""
+
+    channel_ids: list[int] = Field(
+        description="The IDs of the channels to retrieve", max_length=MAX_BATCH_SIZE
+    )
+
+
+def create_get_channels_tool(
+    client: Client, cache: DiscordCache | None = None, max_concurrency: int = 8
+):
+    """Create a tool for retrieving several Discord channels at once."""
+    if cache is None:
+        cache = get_discord_cache(client)
+
+    @tool(args_schema=GetChannelsInput)
+    async def get_channels(channel_ids: list[int]) -> list[dict]:
+        """Get the information of several channels at once.
+
+        Args:
+            channel_ids: The IDs of the channels to retrieve.
+
+        Returns:
+            The channel information, or the error of each channel that could
+            not be retrieved.
+        """
+
+        async def fetch(channel_id: int) -> dict:
+            try:
+                channel = await cache.get_channel(channel_id)
+            except (Forbidden, NotFound) as e:
+                raise ToolException(f"Failed to get channel: {str(e)}") from e
+            if not isinstance(channel, TextChannel):
+                raise ToolException(
+                    f"Channel {channel_id} not found or not a text channel"
+                )
+            return to_dict(channel)
+
+        return await gather_items(channel_ids, fetch, max_concurrency)
+
+    return get_channels
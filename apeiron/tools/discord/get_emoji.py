@@ -5,6 +5,8 @@ from langchain_core.tools import tool
 from langchain_core.tools.base import ToolException
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.cache import DiscordCache, get_discord_cache
+
 
 def to_dict(emoji: Emoji) -> dict:
     """Convert emoji to dictionary representation."""
@@ -30,8 +32,10 @@ class GetEmojiInput(BaseModel):
     )
 
 
-def create_get_emoji_tool(client: Client):
+def create_get_emoji_tool(client: Client, cache: DiscordCache | None = None):
     """Create a tool for retrieving a specific Discord emoji."""
+    if cache is None:
+        cache = get_discord_cache(client)
 
     @tool(args_schema=GetEmojiInput)
     async def get_emoji(
@@ -52,8 +56,7 @@ def create_get_emoji_tool(client: Client):
         if guild_id is None and config:
             guild_id = config.get("configurable").get("guild_id")
         try:
-            guild = await client.fetch_guild(guild_id)
-            emoji = await guild.fetch_emoji(emoji_id)
+            emoji = await cache.get_emoji(guild_id, emoji_id)
             return to_dict(emoji)
         except (Forbidden, NotFound) as e:
             raise ToolException(f"Failed to get emoji: {str(e)}") from e
@@ -0,0 +1,59 @@
+from discord import Client
+from discord.errors import Forbidden, NotFound
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import tool
+from langchain_core.tools.base import ToolException
+from pydantic import BaseModel, Field
+
+from apeiron.tools.discord.batch import MAX_BATCH_SIZE, gather_items
+from apeiron.tools.discord.cache import DiscordCache, get_discord_cache
+from apeiron.tools.discord.get_emoji import to_dict
+
+
+class GetEmojisInput(BaseModel):
+    """Arguments for retrieving several Discord emojis."""
+
+    emoji_ids: list[int] = Field(
+        description="The IDs of the emojis to retrieve", max_length=MAX_BATCH_SIZE
+    )
+    guild_id: int | None = Field(
+        None, description="The ID of the guild containing the emojis"
+    )
+
+
+def create_get_emojis_tool(
+    client: Client, cache: DiscordCache | None = None, max_concurrency: int = 8
+):
+    """Create a tool for retrieving several Discord emojis at once."""
+    if cache is None:
+        cache = get_discord_cache(client)
+
+    @tool(args_schema=GetEmojisInput)
+    async def get_emojis(
+        emoji_ids: list[int],
+        guild_id: int | None = None,
+        config: RunnableConfig | None = None,
+    ) -> list[dict]:
+        """Get several emojis of a guild at once.
+
+        Args:
+            emoji_ids: The IDs of the emojis to retrieve.
+            guild_id: The ID of the guild containing the emojis.
+            config: Optional RunnableConfig object.
+
+        Returns:
+            Dictionary representations of the emojis, or the error of each
+            emoji that could not be retrieved.
+        """
+        if guild_id is None and config:
+            guild_id = config.get("configurable").get("guild_id")
+
+        async def fetch(emoji_id: int) -> dict:
+            try:
+                return to_dict(await cache.get_emoji(guild_id, emoji_id))
+            except (Forbidden, NotFound) as e:
+                raise ToolException(f"Failed to get emoji: {str(e)}") from e
+
+        return await gather_items(emoji_ids, fetch, max_concurrency)
+
+    return get_emojis
@@ -5,6 +5,8 @@ from langchain_core.tools import tool
 from langchain_core.tools.base import ToolException
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.cache import DiscordCache, get_discord_cache
+
 
 def role_to_dict(role: Role) -> dict:
     """Convert role to dictionary representation."""
@@ -46,8 +48,10 @@ class GetGuildInput(BaseModel):
     )
 
 
-def create_get_guild_tool(client: Client):
+def create_get_guild_tool(client: Client, cache: DiscordCache | None = None):
     """Create a tool for retrieving Discord guild information."""
+    if cache is None:
+        cache = get_discord_cache(client)
 
     @tool(args_schema=GetGuildInput)
     async def get_guild(
@@ -66,7 +70,7 @@ def create_get_guild_tool(client: Client):
         if guild_id is None and config:
             guild_id = config.get("configurable").get("guild_id")
         try:
-            guild = await client.fetch_guild(int(guild_id))
+            guild = await cache.get_guild(int(guild_id))
             return to_dict(guild)
         except (Forbidden, NotFound) as e:
             raise ToolException(f"Failed to get guild: {str(e)}") from e
@@ -5,6 +5,8 @@ from langchain_core.runnables import RunnableConfig
 from langchain_core.tools.base import ToolException
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.cache import DiscordCache, get_discord_cache
+
 
 def attachment_to_dict(attachment: Attachment) -> dict:
     """Convert attachment to dictionary representation."""
@@ -81,8 +83,10 @@ class GetMessageInput(BaseModel):
     )
 
 
-def create_get_message_tool(client: Client):
+def create_get_message_tool(client: Client, cache: DiscordCache | None = None):
     """Create a tool for retrieving a specific Discord message."""
+    if cache is None:
+        cache = get_discord_cache(client)
 
     @tool(args_schema=GetMessageInput)
     async def get_message(
@@ -106,11 +110,7 @@ def create_get_message_tool(client: Client):
         if not channel_id and config:
             channel_id = config.get("configurable").get("channel_id")
         try:
-            channel = await client.fetch_channel(channel_id)
-            if not channel:
-                raise ToolException(f"Channel {channel_id} not found")
-
-            message = await channel.fetch_message(message_id)
+            message = await cache.get_message(channel_id, message_id)
             return to_dict(message)
 
         except NotFound as err:
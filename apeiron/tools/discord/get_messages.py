@@ -0,0 +1,65 @@
+from discord import Client
+from discord.errors import Forbidden, NotFound
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import tool
+from langchain_core.tools.base import ToolException
+from pydantic import BaseModel, Field
+
+from apeiron.tools.discord.batch import MAX_BATCH_SIZE, gather_items
+from apeiron.tools.discord.cache import DiscordCache, get_discord_cache
+from apeiron.tools.discord.get_message import to_dict
+
+
+class GetMessagesInput(BaseModel):
+    """Arguments for retrieving several Discord messages."""
+
+    message_ids: list[int] = Field(
+        description="The IDs of the messages to retrieve", max_length=MAX_BATCH_SIZE
+    )
+    channel_id: int | None = Field(
+        None, description="The ID of the channel containing the messages"
+    )
+
+
+def create_get_messages_tool(
+    client: Client, cache: DiscordCache | None = None, max_concurrency: int = 8
+):
+    """Create a tool for retrieving several Discord messages at once."""
+    if cache is None:
+        cache = get_discord_cache(client)
+
+    @tool(args_schema=GetMessagesInput)
+    async def get_messages(
+        message_ids: list[int],
+        channel_id: int | None = None,
+        config: RunnableConfig | None = None,
+    ) -> list[dict]:
+        """Get several messages of a channel at once.
+
+        Args:
+            message_ids: The IDs of the messages to retrieve.
+            channel_id: The ID of the channel containing the messages.
+            config: Optional RunnableConfig object.
+
+        Returns:
+            The message information, or the error of each message that could
+            not be retrieved.
+        """
+        if not channel_id and config:
+            channel_id = config.get("configurable").get("channel_id")
+
+        async def fetch(message_id: int) -> dict:
+            try:
+                return to_dict(await cache.get_message(channel_id, message_id))
+            except NotFound as err:
+                raise ToolException(
+                    f"Message {message_id} not found in channel {channel_id}"
+                ) from err
+            except Forbidden as err:
+                raise ToolException(
+                    f"Cannot access message {message_id} in channel {channel_id}"
+                ) from err
+
+        return await gather_items(message_ids, fetch, max_concurrency)
+
+    return get_messages
@@ -3,6 +3,8 @@ from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.cache import DiscordCache, get_discord_cache
+
 
 def to_dict(user: User) -> dict:
     """Convert user to dictionary representation."""
@@ -24,8 +26,10 @@ class GetUserInput(BaseModel):
     user_id: int | None = Field(None, description="Discord user ID to look up")
 
 
-def create_get_user_tool(client: Client):
+def create_get_user_tool(client: Client, cache: DiscordCache | None = None):
     """Create a tool for retrieving Discord user profile information."""
+    if cache is None:
+        cache = get_discord_cache(client)
 
     @tool(args_schema=GetUserInput)
     async def get_user(
@@ -43,7 +47,7 @@ def create_get_user_tool(client: Client):
         """
         if user_id is None and config:
             user_id = config.get("configurable").get("user_id")
-        user = await client.fetch_user(user_id)
+        user = await cache.get_user(user_id)
         return to_dict(user)
 
     return get_user
@@ -0,0 +1,42 @@
+from discord import Client
+from langchain_core.tools import tool
+from pydantic import BaseModel, Field
+
+from apeiron.tools.discord.batch import MAX_BATCH_SIZE, gather_items
+from apeiron.tools.discord.cache import DiscordCache, get_discord_cache
+from apeiron.tools.discord.get_user import to_dict
+
+
+class GetUsersInput(BaseModel):
+    """Arguments for retrieving several Discord user profiles."""
+
+    user_ids: list[int] = Field(
+        description="Discord user IDs to look up", max_length=MAX_BATCH_SIZE
+    )
+
+
+def create_get_users_tool(
+    client: Client, cache: DiscordCache | None = None, max_concurrency: int = 8
+):
+    """Create a tool for retrieving several Discord user profiles at once."""
+    if cache is None:
+        cache = get_discord_cache(client)
+
+    @tool(args_schema=GetUsersInput)
+    async def get_users(user_ids: list[int]) -> list[dict]:
+        """Get the profile information of several users at once.
+
+        Args:
+            user_ids: The IDs of the users to look up.
+
+        Returns:
+            The user information, or the error of each user that could not be
+            looked up.
+        """
+
+        async def fetch(user_id: int) -> dict:
+            return to_dict(await cache.get_user(user_id))
+
+        return await gather_items(user_ids, fetch, max_concurrency)
+
+    return get_users
@@ -3,6 +3,8 @@ from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.cache import DiscordCache, get_discord_cache
+
 
 def to_dict(channel: TextChannel) -> dict:
     """Convert channel to dictionary representation."""
@@ -27,8 +29,10 @@ class ListChannelsInput(BaseModel):
     )
 
 
-def create_list_channels_tool(client: Client):
+def create_list_channels_tool(client: Client, cache: DiscordCache | None = None):
     """Create a tool for listing Discord channels."""
+    if cache is None:
+        cache = get_discord_cache(client)
 
     @tool(args_schema=ListChannelsInput)
     async def list_channels(
@@ -46,7 +50,7 @@ def create_list_channels_tool(client: Client):
         """
         if guild_id is None and config:
             guild_id = config.get("configurable").get("guild_id")
-        guild = await client.fetch_guild(guild_id)
+        guild = await cache.get_guild(guild_id)
         channels = await guild.fetch_channels()
         return [to_dict(channel) for channel in channels]
 
@@ -5,6 +5,7 @@ from langchain_core.tools import tool
 from langchain_core.tools.base import ToolException
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.cache import DiscordCache, get_discord_cache
 from apeiron.tools.discord.get_emoji import to_dict
 
 
@@ -16,8 +17,10 @@ class ListEmojisInput(BaseModel):
     )
 
 
-def create_list_emojis_tool(client: Client):
+def create_list_emojis_tool(client: Client, cache: DiscordCache | None = None):
     """Create a tool for listing emojis in a Discord guild."""
+    if cache is None:
+        cache = get_discord_cache(client)
 
     @tool(args_schema=ListEmojisInput)
     async def list_emojis(
@@ -39,9 +42,9 @@ def create_list_emojis_tool(client: Client):
         if guild_id is None and config:
             guild_id = config.get("configurable").get("guild_id")
         try:
-            guild = await client.fetch_guild(guild_id)
-            emojis = await guild.fetch_emojis()
-            return [to_dict(emoji) for emoji in emojis]
+            guild = await cache.get_guild(guild_id)
+            # Guild payloads from both the gateway and the REST API hold emojis
+            return [to_dict(emoji) for emoji in guild.emojis]
         except (Forbidden, NotFound) as e:
             raise ToolException(f"Failed to list emojis: {str(e)}") from e
 
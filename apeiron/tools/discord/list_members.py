@@ -1,10 +1,16 @@
-from discord import Client, Member
+import heapq
+import operator
+from collections.abc import Iterable
+
+from discord import Client, Member, Object
 from discord.errors import Forbidden, NotFound
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from langchain_core.tools.base import ToolException
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.cache import DiscordCache, get_discord_cache
+
 
 def to_dict(member: Member) -> dict:
     """Convert member to dictionary representation."""
@@ -22,6 +28,35 @@ def to_dict(member: Member) -> dict:
     }
 
 
+def select_members(
+    members: Iterable[Member],
+    limit: int,
+    after: int | None = None,
+    before: int | None = None,
+) -> list[Member]:
+    """Select the members closest to the given IDs, ordered by ID.
+
+    Only ``limit`` members are kept in a heap while iterating over the given
+    members, so the member lists of large guilds are never sorted in full.
+
+    Args:
+        members: Iterable of members to select from
+        limit: Maximum number of members to select
+        after: Only select members with a greater ID
+        before: Only select members with a lower ID
+
+    Returns:
+        Selected members ordered by ID
+    """
+    if after is not None:
+        members = (m for m in members if m.id > after)
+    if before is not None:
+        members = (m for m in members if m.id < before)
+        # The closest members before the ID are the ones with the largest IDs
+        return heapq.nlargest(limit, members, key=operator.attrgetter("id"))[::-1]
+    return heapq.nsmallest(limit, members, key=operator.attrgetter("id"))
+
+
 class ListMembersInput(BaseModel):
     """Arguments for listing Discord guild members."""
 
@@ -37,8 +72,10 @@ class ListMembersInput(BaseModel):
     limit: int = Field(100, description="Number of members to retrieve (max 100)")
 
 
-def create_list_members_tool(client: Client):
+def create_list_members_tool(client: Client, cache: DiscordCache | None = None):
     """Create a tool for listing Discord guild members."""
+    if cache is None:
+        cache = get_discord_cache(client)
 
     @tool(args_schema=ListMembersInput)
     async def list_members(
@@ -66,13 +103,21 @@ def create_list_members_tool(client: Client):
         if guild_id is None and config:
             guild_id = config.get("configurable").get("guild_id")
         try:
-            guild = await client.fetch_guild(guild_id)
-            kwargs = {"limit": limit}
-            if before:
-                kwargs["before"] = before
-            if after:
-                kwargs["after"] = after
+            guild = await cache.get_guild(guild_id)
+            after_id = int(after) if after else None
+            before_id = int(before) if before else None
+            # The gateway cache holds every member once the guild is chunked
+            if guild.chunked:
+                members = select_members(guild.members, limit, after_id, before_id)
+                return [to_dict(member) for member in members]
 
+            if before_id is not None:
+                raise ToolException(
+                    "Listing members before an ID needs the guild member cache"
+                )
+            kwargs = {"limit": limit}
+            if after_id is not None:
+                kwargs["after"] = Object(id=after_id)
             members = await guild.fetch_members(**kwargs).flatten()
             return [to_dict(member) for member in members]
         except (Forbidden, NotFound) as e:
@@ -1,10 +1,15 @@
-from discord import Client
+import math
+from collections.abc import Callable
+
+import orjson
+from discord import Client, Object
 from discord.errors import Forbidden, NotFound
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from langchain_core.tools.base import ToolException
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.cache import DiscordCache, get_discord_cache
 from apeiron.tools.discord.get_message import to_dict
 
 
@@ -24,10 +29,101 @@ class ListMessagesInput(BaseModel):
         None, description="Optional message ID to read messages around"
     )
     limit: int = Field(100, description="Number of messages to retrieve (max 100)")
+    max_tokens: int | None = Field(
+        None,
+        description=(
+            "Optional token budget of the result, enables paging: messages are "
+            "read until the budget is reached and a cursor to continue is returned"
+        ),
+    )
+    max_bytes: int | None = Field(
+        None, description="Optional byte budget of the result, enables paging"
+    )
+    cursor: str | None = Field(
+        None, description="Cursor returned by a previous call to read the next page"
+    )
+
+
+def _parse_message_id(name: str, value: str) -> int:
+    """Parse a message ID argument, rejecting the IDs that are not numeric."""
+    value = value.strip()
+    if not value.isdigit():
+        raise ToolException(f"Invalid {name} message ID: {value}")
+    return int(value)
+
 
+def _format_cursor(bounds: dict[str, int]) -> str:
+    """Format the bounds of the next page into a continuation cursor."""
+    return ",".join(f"{direction}:{id_}" for direction, id_ in bounds.items())
 
-def create_list_messages_tool(client: Client):
-    """Create a tool for reading messages from a Discord channel."""
+
+def _parse_cursor(cursor: str) -> dict[str, int]:
+    """Parse a continuation cursor into the bounds of the next page."""
+    bounds = {}
+    for part in cursor.split(","):
+        direction, _, message_id = part.partition(":")
+        if (
+            direction not in ("before", "after")
+            or direction in bounds
+            or not message_id.isdigit()
+        ):
+            raise ToolException(f"Invalid cursor: {cursor}")
+        bounds[direction] = int(message_id)
+    return bounds
+
+
+def create_list_messages_tool(
+    client: Client,
+    cache: DiscordCache | None = None,
+    get_token_ids: Callable[[str], list[int]] | None = None,
+):
+    """Create a tool for reading messages from a Discord channel.
+
+    Args:
+        client: Discord client
+        cache: Entity cache shared between the tools
+        get_token_ids: Function encoding a text into token IDs to enforce the
+            token budget, tokens are estimated from the size of the text if None
+    """
+    if cache is None:
+        cache = get_discord_cache(client)
+
+    def count_tokens(text: str) -> int:
+        if get_token_ids is None:
+            return math.ceil(len(text) / 4)
+        return len(get_token_ids(text))
+
+    async def read_pages(
+        channel, limit: int, max_tokens: int | None, max_bytes: int | None, **kwargs
+    ) -> dict:
+        """Read messages page by page until the limit or a budget is reached."""
+        messages, tokens, size = [], 0, 0
+        last_id = None
+        # Pages of 100 messages are only requested as the iteration goes on
+        async for message in channel.history(limit=limit, **kwargs):
+            data = to_dict(message)
+            text = orjson.dumps(data).decode()
+            message_tokens = count_tokens(text) if max_tokens is not None else 0
+            over_budget = (
+                max_tokens is not None and tokens + message_tokens > max_tokens
+            ) or (max_bytes is not None and size + len(text) > max_bytes)
+            if over_budget and messages:
+                break
+            messages.append(data)
+            tokens += message_tokens
+            size += len(text)
+            last_id = message.id
+        else:
+            if len(messages) < limit:
+                # The history is exhausted
+                last_id = None
+        if last_id is None:
+            return {"messages": messages, "cursor": None}
+        # Messages are read oldest first when reading after a message, the
+        # other bound of the range is kept for the next pages
+        bounds = {name: bound.id for name, bound in kwargs.items()}
+        bounds["after" if "after" in kwargs else "before"] = last_id
+        return {"messages": messages, "cursor": _format_cursor(bounds)}
 
     @tool(args_schema=ListMessagesInput)
     async def list_messages(
@@ -36,8 +132,11 @@ def create_list_messages_tool(client: Client):
         after: str | None = None,
         around: str | None = None,
         limit: int = 100,
+        max_tokens: int | None = None,
+        max_bytes: int | None = None,
+        cursor: str | None = None,
         config: RunnableConfig | None = None,
-    ) -> list[dict]:
+    ) -> list[dict] | dict:
         """Read messages from a Discord channel with optional filters.
 
         Args:
@@ -45,11 +144,16 @@ def create_list_messages_tool(client: Client):
             before: Optional message ID to read messages before.
             after: Optional message ID to read messages after.
             around: Optional message ID to read messages around.
-            limit: Number of messages to retrieve (max 100).
+            limit: Number of messages to retrieve (max 100 without paging).
+            max_tokens: Optional token budget of the result, enables paging.
+            max_bytes: Optional byte budget of the result, enables paging.
+            cursor: Cursor returned by a previous call to read the next page.
             config: Optional RunnableConfig object.
 
         Returns:
-            List containing message objects with metadata and content.
+            List containing message objects with metadata and content, or with
+            paging, the messages and a cursor to read the next page (None once
+            there are no more messages).
 
         Raises:
             ToolException: If the messages fail to read.
@@ -57,15 +161,25 @@ def create_list_messages_tool(client: Client):
         if channel_id is None and config:
             channel_id = config.get("configurable").get("channel_id")
         try:
-            channel = await client.fetch_channel(channel_id)
-            kwargs = {"limit": limit}
-            if before:
-                kwargs["before"] = before
-            if after:
-                kwargs["after"] = after
-            if around:
-                kwargs["around"] = around
+            channel = await cache.get_channel(channel_id)
+            kwargs = {}
+            if cursor:
+                for direction, message_id in _parse_cursor(cursor).items():
+                    kwargs[direction] = Object(id=message_id)
+            else:
+                if before:
+                    kwargs["before"] = Object(id=_parse_message_id("before", before))
+                if after:
+                    kwargs["after"] = Object(id=_parse_message_id("after", after))
+                if around:
+                    kwargs["around"] = Object(id=_parse_message_id("around", around))
+
+            if max_tokens is not None or max_bytes is not None or cursor:
+                if "around" in kwargs:
+                    raise ToolException("Paging is not supported around a message")
+                return await read_pages(channel, limit, max_tokens, max_bytes, **kwargs)
 
+            kwargs["limit"] = limit
             messages = []
             async for message in channel.history(**kwargs):
                 messages.append(to_dict(message))
@@ -0,0 +1,85 @@
+from typing import Literal
+
+from discord import Client
+from discord.errors import Forbidden, NotFound
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import tool
+from langchain_core.tools.base import ToolException
+from pydantic import BaseModel, Field
+
+from apeiron.tools.discord.cache import DiscordCache, get_discord_cache
+from apeiron.tools.discord.directory import (
+    DiscordDirectory,
+    get_discord_directory,
+)
+
+
+class ResolveInput(BaseModel):
+    """Arguments for resolving names to Discord IDs."""
+
+    query: str = Field(description="Name of a member, custom emoji or channel")
+    types: list[Literal["member", "emoji", "channel"]] | None = Field(
+        None, description="Optional types of entities to look up, all by default"
+    )
+    guild_id: int | None = Field(
+        None, description="Discord guild (server) ID to look up names in"
+    )
+    limit: int = Field(5, description="Maximum number of matches to return")
+    fuzzy: bool = Field(True, description="Whether to also return approximate matches")
+
+
+def create_resolve_tool(
+    client: Client,
+    cache: DiscordCache | None = None,
+    directory: DiscordDirectory | None = None,
+):
+    """Create a tool for resolving names to Discord IDs."""
+    if cache is None:
+        cache = get_discord_cache(client)
+    if directory is None:
+        directory = get_discord_directory(client)
+
+    @tool(args_schema=ResolveInput)
+    async def resolve(
+        query: str,
+        types: list[Literal["member", "emoji", "channel"]] | None = None,
+        guild_id: int | None = None,
+        limit: int = 5,
+        fuzzy: bool = True,
+        config: RunnableConfig | None = None,
+    ) -> list[dict]:
+        """Resolve a name to the IDs of matching members, emojis or channels.
+
+        Args:
+            query: Name of a member, custom emoji or channel.
+            types: Optional types of entities to look up, all by default.
+            guild_id: The ID of the guild to look up names in.
+            limit: Maximum number of matches to return.
+            fuzzy: Whether to also return approximate matches.
+            config: Optional RunnableConfig object.
+
+        Returns:
+            List of matches, best first, with their ID, name, mention and score.
+
+        Raises:
+            ToolException: If the guild cannot be accessed.
+        """
+        if guild_id is None and config:
+            guild_id = config.get("configurable").get("guild_id")
+        try:
+            guild = await cache.get_guild(guild_id)
+        except (Forbidden, NotFound) as e:
+            raise ToolException(f"Failed to resolve names: {str(e)}") from e
+        matches = directory.get(guild).search(query, types, limit, fuzzy)
+        return [
+            {
+                "type": entry.type,
+                "id": str(entry.id),
+                "name": entry.name,
+                "mention": entry.mention,
+                "score": round(score, 2),
+            }
+            for entry, score in matches
+        ]
+
+    return resolve
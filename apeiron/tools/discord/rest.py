@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any
+
+from discord.http import HTTPClient, Route
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Priority of a Discord REST request, lower runs first."""
+
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+# Routes of user-visible actions: messages, reactions and typing indicators
+HIGH_PRIORITY_PREFIXES = (
+    "/channels/{channel_id}/messages",
+    "/channels/{channel_id}/typing",
+)
+
+
+def get_route_priority(route: Route) -> Priority:
+    """Get the priority of a request from its route."""
+    if route.method == "GET":
+        return Priority.LOW
+    if route.path.startswith(HIGH_PRIORITY_PREFIXES):
+        return Priority.HIGH
+    return Priority.NORMAL
+
+
+@dataclass(frozen=True)
+class RestSchedulerStats:
+    """Snapshot of the REST scheduler queues and wait times per priority."""
+
+    pending: dict[str, int]
+    in_flight: int
+    completed: int
+    wait_time_avg: dict[str, float]
+    wait_time_max: dict[str, float]
+
+
+@dataclass
+class _Waiter:
+    bucket: str
+    future: asyncio.Future
+    enqueued_at: float
+
+
+class RestScheduler:
+    """Prioritized scheduler in front of the py-cord HTTP client.
+
+    py-cord serializes the requests of a rate limit bucket in arrival order,
+    so a burst of reads can delay a reply sharing its bucket. The scheduler
+    hands at most one request per bucket to py-cord at a time, always picking
+    the waiting request of the highest priority, and paces all requests with
+    a global token bucket. ``reserved`` slots of ``max_concurrency`` are kept
+    for high priority requests.
+    """
+
+    def __init__(
+        self,
+        http: HTTPClient,
+        rate: float = 45.0,
+        burst: int = 10,
+        max_concurrency: int = 16,
+        reserved: int = 4,
+        wait_time_window: int = 1024,
+    ):
+        self.http = http
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.reserved = reserved
+        self._request = http.request
+        self._queues: dict[Priority, deque[_Waiter]] = {p: deque() for p in Priority}
+        self._busy: set[str] = set()
+        self._in_flight = 0
+        self._completed = 0
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._timer: asyncio.TimerHandle | None = None
+        self._wait_times: dict[Priority, deque[float]] = {
+            p: deque(maxlen=wait_time_window) for p in Priority
+        }
+
+    def install(self):
+        """Route the requests of the HTTP client through the scheduler."""
+        self.http.request = self.request
+
+    async def request(self, route: Route, **kwargs) -> Any:
+        """Send a request once the scheduler grants it a slot."""
+        priority = get_route_priority(route)
+        waiter = _Waiter(
+            bucket=route.bucket,
+            future=asyncio.get_running_loop().create_future(),
+            enqueued_at=time.monotonic(),
+        )
+        self._queues[priority].append(waiter)
+        self._pump()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release(waiter.bucket)
+            elif waiter in self._queues[priority]:
+                self._queues[priority].remove(waiter)
+            raise
+        try:
+            return await self._request(route, **kwargs)
+        finally:
+            self._release(waiter.bucket)
+
+    def stats(self) -> RestSchedulerStats:
+        """Get a snapshot of the scheduler statistics."""
+        return RestSchedulerStats(
+            pending={p.name.lower(): len(q) for p, q in self._queues.items()},
+            in_flight=self._in_flight,
+            completed=self._completed,
+            wait_time_avg={
+                p.name.lower(): sum(w) / len(w) if w else 0.0
+                for p, w in self._wait_times.items()
+            },
+            wait_time_max={
+                p.name.lower(): max(w, default=0.0) for p, w in self._wait_times.items()
+            },
+        )
+
+    def _release(self, bucket: str):
+        self._busy.discard(bucket)
+        self._in_flight -= 1
+        self._completed += 1
+        self._pump()
+
+    def _pump(self):
+        """Grant slots to the waiting requests, highest priority first."""
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._refilled_at) * self.rate
+        )
+        self._refilled_at = now
+        for priority, queue in self._queues.items():
+            limit = self.max_concurrency
+            if priority != Priority.HIGH:
+                limit -= self.reserved
+            i = 0
+            while i < len(queue) and self._in_flight < limit:
+                if self._tokens < 1:
+                    self._schedule_pump((1 - self._tokens) / self.rate)
+                    return
+                waiter = queue[i]
+                if waiter.future.done():
+                    del queue[i]
+                    continue
+                if waiter.bucket in self._busy:
+                    # Keep the order of the requests of a bucket
+                    i += 1
+                    continue
+                del queue[i]
+                self._busy.add(waiter.bucket)
+                self._in_flight += 1
+                self._tokens -= 1
+                wait_time = now - waiter.enqueued_at
+                self._wait_times[priority].append(wait_time)
+                if wait_time > 1.0:
+                    logger.debug(
+                        "Sending %s request after waiting %.3fs",
+                        priority.name.lower(),
+                        wait_time,
+                    )
+                waiter.future.set_result(None)
+
+    def _schedule_pump(self, delay: float):
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._pump()
@@ -1,11 +1,19 @@
-from discord import Client
+from discord import Client, Member
 from discord.errors import Forbidden, NotFound
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from langchain_core.tools.base import ToolException
 from pydantic import BaseModel, Field
 
-from apeiron.tools.discord.list_members import to_dict
+from apeiron.tools.discord.cache import DiscordCache, get_discord_cache
+from apeiron.tools.discord.list_members import select_members, to_dict
+
+
+def _matches_query(member: Member, query: str) -> bool:
+    """Check if a lowercased query prefixes the username or nickname of a member."""
+    return member.name.lower().startswith(query) or bool(
+        member.nick and member.nick.lower().startswith(query)
+    )
 
 
 class SearchMembersInput(BaseModel):
@@ -20,8 +28,10 @@ class SearchMembersInput(BaseModel):
     limit: int = Field(1000, description="Number of members to retrieve (max 100)")
 
 
-def create_search_members_tool(client: Client):
+def create_search_members_tool(client: Client, cache: DiscordCache | None = None):
     """Create a tool for searching Discord guild members."""
+    if cache is None:
+        cache = get_discord_cache(client)
 
     @tool(args_schema=SearchMembersInput)
     async def search_members(
@@ -47,8 +57,15 @@ def create_search_members_tool(client: Client):
         if guild_id is None and config:
             guild_id = config.get("configurable").get("guild_id")
         try:
-            guild = await client.fetch_guild(guild_id)
-            members = await guild.search_members(query=query, limit=limit)
+            guild = await cache.get_guild(guild_id)
+            # Match like the REST search does, on the gateway cache when complete
+            if guild.chunked:
+                query = query.lower()
+                members = select_members(
+                    (m for m in guild.members if _matches_query(m, query)), limit
+                )
+            else:
+                members = await guild.search_members(query=query, limit=limit)
             return [to_dict(member) for member in members]
         except (Forbidden, NotFound) as e:
             raise ToolException(f"Failed to search members: {str(e)}") from e
@@ -5,6 +5,8 @@ from langchain_core.tools import tool
 from langchain_core.tools.base import ToolException
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.cache import DiscordCache, get_discord_cache
+
 
 class SendMessageInput(BaseModel):
     """Arguments for sending Discord messages."""
@@ -36,8 +38,10 @@ class SendMessageInput(BaseModel):
     )
 
 
-def create_send_message_tool(client: Client):
+def create_send_message_tool(client: Client, cache: DiscordCache | None = None):
     """Create a tool for sending messages to a Discord channel."""
+    if cache is None:
+        cache = get_discord_cache(client)
 
     @tool(args_schema=SendMessageInput)
     async def send_message(
@@ -81,7 +85,7 @@ def create_send_message_tool(client: Client):
         if not channel_id and config:
             channel_id = config.get("configurable").get("channel_id")
         try:
-            channel = await client.fetch_channel(channel_id)
+            channel = await cache.get_channel(channel_id)
             if not channel:
                 raise ToolException(f"Channel {channel_id} not found")
 
@@ -0,0 +1,135 @@
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from discord import Message
+from discord.errors import HTTPException
+from langchain_core.messages import AIMessageChunk
+from langchain_core.runnables import Runnable, RunnableConfig
+
+logger = logging.getLogger(__name__)
+
+# Maximum length of the content of a Discord message
+MAX_MESSAGE_LENGTH = 2000
+
+
+def _get_chunk_text(chunk: AIMessageChunk) -> str:
+    """Get the text of a streamed message chunk."""
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(
+        content if isinstance(content, str) else content.get("text", "")
+        for content in chunk.content
+        if isinstance(content, str) or content.get("type") == "text"
+    )
+
+
+async def astream_agent(
+    graph: Runnable,
+    input: dict,
+    config: RunnableConfig,
+    on_text: Callable[[str], Awaitable[None]],
+) -> dict[str, Any]:
+    """Run a ReAct agent graph, reporting the text of its answer as it streams.
+
+    Only the text generated by the ``agent`` node is reported, and the text of
+    a model call is dropped as soon as the call turns out to be a tool call.
+
+    Args:
+        graph: Compiled ReAct agent graph
+        input: Input of the graph
+        config: Config of the graph run
+        on_text: Coroutine function called with the text of the current model
+            call each time it grows
+
+    Returns:
+        Final values of the graph state
+    """
+    values: dict[str, Any] = {}
+    step = None
+    text = ""
+    is_tool_call = False
+    async for mode, chunk in graph.astream(
+        input, config, stream_mode=["messages", "values"]
+    ):
+        if mode == "values":
+            values = chunk
+            continue
+        message, metadata = chunk
+        if metadata.get("langgraph_node") != "agent" or not isinstance(
+            message, AIMessageChunk
+        ):
+            continue
+        if metadata.get("langgraph_step") != step:
+            step = metadata.get("langgraph_step")
+            text = ""
+            is_tool_call = False
+        if message.tool_call_chunks:
+            is_tool_call = True
+        if is_tool_call:
+            continue
+        if chunk_text := _get_chunk_text(message):
+            text += chunk_text
+            await on_text(text)
+    return values
+
+
+class DraftReply:
+    """Reply posted while a response is generated and edited in place.
+
+    The draft is posted once the text reaches ``min_length`` characters, then
+    edited at most every ``edit_interval`` seconds to stay within the Discord
+    edit rate limits. It is edited with the final content, or deleted when the
+    agent decides not to respond.
+    """
+
+    def __init__(
+        self, message: Message, min_length: int = 40, edit_interval: float = 1.0
+    ):
+        self.message = message
+        self.min_length = min_length
+        self.edit_interval = edit_interval
+        self.draft: Message | None = None
+        self._content: str | None = None
+        self._edited_at = 0.0
+
+    async def update(self, text: str):
+        """Post or edit the draft with the text generated so far."""
+        content = text.strip()[:MAX_MESSAGE_LENGTH]
+        if not content or content == self._content:
+            return
+        if self.draft is None:
+            if len(content) >= self.min_length:
+                self.draft = await self.message.reply(content=content)
+                self._content = content
+                self._edited_at = time.monotonic()
+        elif time.monotonic() - self._edited_at >= self.edit_interval:
+            await self._edit(content)
+
+    async def finish(self, content: str) -> bool:
+        """Edit the draft with the final content.
+
+        Returns:
+            Whether a draft was posted and holds the final content
+        """
+        if self.draft is None:
+            return False
+        if content != self._content:
+            await self._edit(content)
+        return True
+
+    async def discard(self):
+        """Delete the draft if it was posted."""
+        if self.draft is None:
+            return
+        draft, self.draft = self.draft, None
+        try:
+            await draft.delete()
+        except HTTPException as e:
+            logger.warning(f"Failed to delete draft reply: {str(e)}")
+
+    async def _edit(self, content: str):
+        self._edited_at = time.monotonic()
+        self._content = content
+        await self.draft.edit(content=content)
@@ -1,18 +1,38 @@
-import json
+from collections.abc import Container, Sequence
 
 from discord import Client, Message
-from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 
+from apeiron.tools.discord.encoding import EventEncoder
 from apeiron.tools.discord.get_message import to_dict
 
 
-def create_chat_message(message: Message) -> AIMessage | HumanMessage:
-    """Create a message event as AIMessage or HumanMessage."""
-    message_payload = to_dict(message)
-    event_data = {"type": "on_message_event", "payload": message_payload}
+def create_chat_message(
+    message: Message,
+    encoder: EventEncoder | None = None,
+    duplicate_urls: Container[str] = (),
+    history: Sequence[BaseMessage] = (),
+) -> AIMessage | HumanMessage:
+    """Create a message event as AIMessage or HumanMessage.
+
+    Args:
+        message: Discord message of the event
+        encoder: Encoder of the event text, JSON by default
+        duplicate_urls: Attachment URLs of the images to leave out, already
+            sent to the model
+        history: Previous messages of the thread, oldest first
+
+    Returns:
+        Chat message of the event
+    """
+    if encoder is None:
+        encoder = EventEncoder()
+    event = encoder.encode(create_thread_id(message), to_dict(message), history)
     content = []
     for attachment in message.attachments:
         if attachment.content_type and attachment.content_type.startswith("image/"):
+            if attachment.url in duplicate_urls:
+                continue
             content.append(
                 {
                     "type": "image_url",
@@ -20,9 +40,9 @@ def create_chat_message(message: Message) -> AIMessage | HumanMessage:
                 }
             )
     if content:
-        content.append({"type": "text", "text": json.dumps(event_data)})
+        content.append({"type": "text", "text": event})
     else:
-        content = json.dumps(event_data)
+        content = event
 
     return (
         AIMessage(content=content)
@@ -0,0 +1,318 @@
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.load import dumpd
+from langchain_core.load.serializable import Serializable
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SpanRecord:
+    """Span of a run, recorded without serializing its inputs and outputs."""
+
+    run_id: UUID
+    parent_run_id: UUID | None
+    name: str
+    span_type: str
+    start_time_ns: int
+    inputs: Any = None
+    outputs: Any = None
+    end_time_ns: int | None = None
+    error: str | None = None
+
+
+@dataclass
+class TraceRecord:
+    """Spans of a root run and of its child runs."""
+
+    root_run_id: UUID
+    sampled: bool
+    spans: list[SpanRecord] = field(default_factory=list)
+    error: bool = False
+
+
+def _to_json(value: Any) -> Any:
+    """Convert run inputs and outputs to JSON compatible values."""
+
+    def default(obj: Any) -> Any:
+        if isinstance(obj, Serializable):
+            return dumpd(obj)
+        if isinstance(obj, BaseModel):
+            return obj.model_dump(mode="json")
+        return str(obj)
+
+    return json.loads(json.dumps(value, default=default))
+
+
+def export_to_mlflow(traces: list[TraceRecord], client: Any = None):
+    """Log traces to the MLflow tracking server.
+
+    Args:
+        traces: Traces to log
+        client: MLflow client, a client of the configured server if None
+    """
+    if client is None:
+        # Imported on first use, mlflow takes seconds to import
+        from mlflow import MlflowClient
+
+        client = MlflowClient()
+    for trace in traces:
+        root, *children = trace.spans
+        span = client.start_trace(
+            name=root.name,
+            span_type=root.span_type,
+            inputs=_to_json(root.inputs),
+            start_time_ns=root.start_time_ns,
+        )
+        request_id = span.request_id
+        span_ids = {root.run_id: span.span_id}
+        for child in children:
+            span_ids[child.run_id] = client.start_span(
+                name=child.name,
+                request_id=request_id,
+                parent_id=span_ids.get(child.parent_run_id, span.span_id),
+                span_type=child.span_type,
+                inputs=_to_json(child.inputs),
+                start_time_ns=child.start_time_ns,
+            ).span_id
+        # End the children before their parents
+        for child in reversed(children):
+            client.end_span(
+                request_id=request_id,
+                span_id=span_ids[child.run_id],
+                outputs=_to_json(child.outputs),
+                attributes={"error": child.error} if child.error else None,
+                status="ERROR" if child.error else "OK",
+                end_time_ns=child.end_time_ns or root.end_time_ns,
+            )
+        client.end_trace(
+            request_id=request_id,
+            outputs=_to_json(root.outputs),
+            attributes={"error": root.error} if root.error else None,
+            status="ERROR" if trace.error else "OK",
+            end_time_ns=root.end_time_ns,
+        )
+
+
+class TraceExporter:
+    """Export traces from a background thread in batches.
+
+    Traces wait in a queue of at most ``max_queue_size`` traces, and are
+    dropped when the queue is full so tracing never holds more memory or
+    slows the runs down when the tracking server lags behind.
+    """
+
+    def __init__(
+        self,
+        export: Callable[[list[TraceRecord]], None] = export_to_mlflow,
+        max_queue_size: int = 1024,
+        batch_size: int = 32,
+        flush_interval: float = 5.0,
+    ):
+        self.export = export
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue: queue.Queue[TraceRecord | None] = queue.Queue(max_queue_size)
+        self._thread = threading.Thread(
+            target=self._run, name="trace-exporter", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, trace: TraceRecord):
+        """Queue a trace for export, dropping it if the queue is full."""
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float | None = None):
+        """Export the queued traces and stop the background thread."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        batch: list[TraceRecord] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                trace = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                trace = False
+            if trace:
+                batch.append(trace)
+            if batch and (
+                trace is None
+                or len(batch) >= self.batch_size
+                or time.monotonic() >= deadline
+            ):
+                self._export(batch)
+                batch = []
+            if trace is None:
+                return
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+
+    def _export(self, batch: list[TraceRecord]):
+        try:
+            self.export(batch)
+            self.exported += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.warning(f"Failed to export {len(batch)} traces: {str(e)}")
+
+
+class SampledTracer(BaseCallbackHandler):
+    """Trace a sample of the runs, and every run that failed.
+
+    Whether a run is sampled is decided when its root run starts. The spans of
+    every run are recorded as plain references, then serialized and exported
+    from the background exporter only when the run is sampled or a span
+    failed. At most ``max_spans`` spans are recorded per run.
+    """
+
+    # Only records references, no need to run in a worker thread
+    run_inline = True
+
+    def __init__(
+        self,
+        exporter: TraceExporter,
+        sample_rate: float = 0.1,
+        max_spans: int = 1000,
+    ):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.max_spans = max_spans
+        self._traces: dict[UUID, TraceRecord] = {}
+        self._spans: dict[UUID, SpanRecord] = {}
+        # Nearest recorded ancestor of the hidden runs
+        self._parents: dict[UUID, UUID | None] = {}
+
+    def _start(
+        self,
+        span_type: str,
+        name: str,
+        inputs: Any,
+        run_id: UUID,
+        parent_run_id: UUID | None,
+        tags: list[str] | None,
+    ):
+        trace = self._traces.get(parent_run_id) if parent_run_id else None
+        if trace is None:
+            trace = TraceRecord(run_id, random.random() < self.sample_rate)
+        self._traces[run_id] = trace
+        # Children of hidden runs are attached to their nearest visible ancestor
+        parent_run_id = self._parents.get(parent_run_id, parent_run_id)
+        # Skip the internal runs of the graphs, like the channel writes
+        if parent_run_id and tags and "langsmith:hidden" in tags:
+            self._parents[run_id] = parent_run_id
+            return
+        if len(trace.spans) >= self.max_spans:
+            return
+        span = SpanRecord(
+            run_id, parent_run_id, name, span_type, time.time_ns(), inputs
+        )
+        trace.spans.append(span)
+        self._spans[run_id] = span
+
+    def _end(self, run_id: UUID, outputs: Any = None, error: BaseException = None):
+        trace = self._traces.pop(run_id, None)
+        self._parents.pop(run_id, None)
+        if span := self._spans.pop(run_id, None):
+            span.end_time_ns = time.time_ns()
+            span.outputs = outputs
+            if error is not None:
+                span.error = repr(error)
+        if trace is None:
+            return
+        if error is not None:
+            trace.error = True
+        # Head sampled or failed traces are exported once their root run ends
+        if trace.root_run_id == run_id and (trace.sampled or trace.error):
+            self.exporter.submit(trace)
+
+    def on_chain_start(
+        self,
+        serialized: dict[str, Any],
+        inputs: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        tags: list[str] | None = None,
+        **kwargs,
+    ):
+        name = kwargs.get("name") or (serialized or {}).get("name", "chain")
+        self._start("CHAIN", name, inputs, run_id, parent_run_id, tags)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs):
+        self._end(run_id, outputs)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._end(run_id, error=error)
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: list,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        tags: list[str] | None = None,
+        **kwargs,
+    ):
+        name = kwargs.get("name") or serialized.get("name", "chat_model")
+        self._start("CHAT_MODEL", name, messages, run_id, parent_run_id, tags)
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs):
+        self._end(run_id, response)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._end(run_id, error=error)
+
+    def on_tool_start(
+        self,
+        serialized: dict[str, Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        tags: list[str] | None = None,
+        inputs: dict[str, Any] | None = None,
+        **kwargs,
+    ):
+        name = kwargs.get("name") or serialized.get("name", "tool")
+        self._start("TOOL", name, inputs or input_str, run_id, parent_run_id, tags)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs):
+        self._end(run_id, output)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._end(run_id, error=error)
+
+
+def create_tracer() -> SampledTracer | None:
+    """Create the sampled tracer if selected by the environment."""
+    if os.getenv("APEIRON_TRACING", "autolog") != "sampled":
+        return None
+    exporter = TraceExporter(
+        max_queue_size=int(os.getenv("APEIRON_TRACING_QUEUE_SIZE", "1024")),
+        batch_size=int(os.getenv("APEIRON_TRACING_BATCH_SIZE", "32")),
+        flush_interval=float(os.getenv("APEIRON_TRACING_FLUSH_INTERVAL", "5.0")),
+    )
+    return SampledTracer(
+        exporter, sample_rate=float(os.getenv("APEIRON_TRACING_SAMPLE_RATE", "0.1"))
+    )
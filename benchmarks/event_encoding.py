@@ -0,0 +1,118 @@
+"""Compare the size of the JSON and compact encodings of message events.
+
+Recorded events are read from a JSON Lines file of ``{"thread_id", "payload"}``
+objects, where the payloads are created by ``get_message.to_dict``. Without
+a file, a synthetic conversation is generated.
+
+Usage:
+    python -m benchmarks.event_encoding --input events.jsonl
+"""
+
+import json
+import random
+import time
+from datetime import UTC, datetime, timedelta
+
+import click
+from langchain_core.messages import HumanMessage
+
+from apeiron.tokenizers import get_token_counter
+from apeiron.tools.discord.encoding import CompactEventEncoder, EventEncoder
+
+WORDS = (
+    "hey did anyone see the new update yesterday i think the boss fight is way "
+    "harder now lol what build are you running flowers are blooming in the "
+    "garden again ✨ can someone help me with my project tonight"
+).split()
+
+
+def generate_events(
+    count: int, threads: int, users: int, seed: int
+) -> list[tuple[str, dict]]:
+    """Generate message events of users chatting in a few channels."""
+    rng = random.Random(seed)
+    authors = [
+        {
+            "id": str(rng.randrange(10**17, 10**18)),
+            "name": f"user{i}",
+            "display_name": f"User {i}" if i % 2 else f"user{i}",
+            "bot": False,
+            "avatar_url": (
+                f"https://cdn.discordapp.com/avatars/{i}/"
+                f"{rng.getrandbits(128):032x}.png?size=1024"
+            ),
+        }
+        for i in range(users)
+    ]
+    guild_id = str(rng.randrange(10**17, 10**18))
+    channel_ids = [str(rng.randrange(10**17, 10**18)) for _ in range(threads)]
+    timestamp = datetime(2025, 3, 1, tzinfo=UTC)
+    events = []
+    for _ in range(count):
+        channel_id = rng.choice(channel_ids)
+        timestamp += timedelta(seconds=rng.uniform(1, 120))
+        payload = {
+            "content": " ".join(rng.choices(WORDS, k=rng.randint(3, 25))),
+            "id": str(rng.randrange(10**17, 10**18)),
+            "author": rng.choice(authors),
+            "channel_id": channel_id,
+            "guild_id": guild_id,
+            "timestamp": str(timestamp),
+            "edited_timestamp": None,
+            "attachments": [],
+        }
+        events.append((f"guild/{guild_id}/channel/{channel_id}", payload))
+    return events
+
+
+def load_events(path: str) -> list[tuple[str, dict]]:
+    """Load recorded message events from a JSON Lines file."""
+    with open(path) as f:
+        return [
+            (event["thread_id"], event["payload"])
+            for event in map(json.loads, f)
+            if event
+        ]
+
+
+@click.command()
+@click.option("--input", "path", default=None, help="JSON Lines file of events")
+@click.option("--count", default=1000, help="Number of generated events")
+@click.option("--threads", default=5, help="Number of generated threads")
+@click.option("--users", default=20, help="Number of generated users")
+@click.option("--seed", default=0, help="Seed of the generated events")
+@click.option("--model", default="pixtral-large-2411", help="Tokenizer model")
+def main(path: str | None, count: int, threads: int, users: int, seed: int, model: str):
+    events = load_events(path) if path else generate_events(count, threads, users, seed)
+    counter = get_token_counter(model)
+    results = {}
+    for name, encoder in (("json", EventEncoder()), ("compact", CompactEventEncoder())):
+        histories: dict[str, list[HumanMessage]] = {}
+        texts = []
+        start = time.perf_counter()
+        for thread_id, payload in events:
+            history = histories.setdefault(thread_id, [])
+            texts.append(encoder.encode(thread_id, payload, history))
+            history.append(HumanMessage(content=texts[-1]))
+        duration = time.perf_counter() - start
+        results[name] = (
+            sum(len(text.encode()) for text in texts),
+            sum(counter.count(text) for text in texts),
+            duration,
+        )
+
+    click.echo(f"{len(events)} events")
+    click.echo(f"{'encoding':>9} {'bytes':>10} {'tokens':>10} {'us/event':>9}")
+    for name, (size, tokens, duration) in results.items():
+        click.echo(
+            f"{name:>9} {size:>10} {tokens:>10} {duration / len(events) * 1e6:>9.1f}"
+        )
+    (json_size, json_tokens, _), (size, tokens, _) = results.values()
+    click.echo(
+        f"savings: {1 - size / json_size:.1%} bytes, {1 - tokens / json_tokens:.1%}"
+        " tokens"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+"""In-process fakes of Discord and of the models for the offline benchmarks.
+
+The fake Discord answers the REST requests of a real py-cord client and feeds
+it gateway payloads, so the events go through the parsing, the listeners and
+the REST scheduler of the bot like in production. The scripted chat model
+answers the agent after a configurable latency, calling tools first.
+"""
+
+import asyncio
+import io
+import random
+import re
+import time
+from collections.abc import Callable
+from datetime import UTC, datetime
+from types import SimpleNamespace
+from typing import Any
+
+from aiohttp import web
+from discord import Client, NotFound
+from discord.http import Route
+from discord.user import ClientUser
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from PIL import Image
+
+from apeiron.sharding import get_shard_id
+
+WORDS = (
+    "hey did anyone see the new update yesterday i think the boss fight is way "
+    "harder now lol what build are you running flowers are blooming in the "
+    "garden again can someone help me with my project tonight"
+).split()
+
+EPOCH = datetime(2015, 1, 1, tzinfo=UTC)
+
+
+def _path_pattern(path: str) -> re.Pattern:
+    """Compile a pattern matching the URLs of a route path."""
+    return re.compile(re.sub(r"\{(\w+)\}", r"(?P<\1>[^/]+)", path) + "$")
+
+
+class FakeDiscord:
+    """Fake Discord API answering the requests of a py-cord client.
+
+    Guilds, channels and users are generated from ``seed``, so fakes created
+    with the same arguments in several processes agree on them. The channels
+    are spread over the guilds. Every REST request takes ``latency`` seconds,
+    and ``on_response`` is called with the channel ID and the referenced
+    message ID, if any, of the messages sent and of the reactions added by
+    the bot.
+    """
+
+    def __init__(
+        self,
+        channels: int = 10,
+        users: int = 50,
+        guilds: int = 1,
+        latency: float = 0.05,
+        seed: int = 0,
+        on_response: Callable[[int, int | None], None] | None = None,
+    ):
+        self.rng = random.Random(seed)
+        self.latency = latency
+        self.on_response = on_response
+        self.requests = 0
+        self._next_id = 0
+        self._patterns: dict[str, re.Pattern] = {}
+        self.bot_user = self._user_payload("apeiron", bot=True)
+        self.users = [self._user_payload(f"user{i}") for i in range(users)]
+        self.guild_ids = [self._random_snowflake() for _ in range(guilds)]
+        self.channel_ids = [self._random_snowflake() for _ in range(channels)]
+        self.channel_guilds = {
+            channel_id: self.guild_ids[i % guilds]
+            for i, channel_id in enumerate(self.channel_ids)
+        }
+        self.messages: dict[int, list[dict]] = {
+            channel_id: [] for channel_id in self.channel_ids
+        }
+
+    def snowflake(self) -> int:
+        """Create an ID, increasing with the creation order like Discord IDs."""
+        self._next_id += 1
+        elapsed = int((datetime.now(UTC) - EPOCH).total_seconds() * 1000)
+        return (elapsed << 22) + self._next_id % (1 << 22)
+
+    def _random_snowflake(self) -> int:
+        # Spread over time, the shard of a guild depends on its creation time
+        return self.rng.randrange(1 << 40) << 22 | self.rng.randrange(1 << 22)
+
+    def install(self, client: Client):
+        """Connect a client to the fake API, as if its gateway was ready.
+
+        Only the guilds of the shards of a sharded client are added to it.
+        """
+        client.http.request = self.request
+        state = client._connection
+        state.user = ClientUser(state=state, data=self.bot_user)
+        shard_ids = getattr(client, "shard_ids", None)
+        for guild_id in self.guild_ids:
+            if (
+                shard_ids is None
+                or get_shard_id(guild_id, client.shard_count) in shard_ids
+            ):
+                state._add_guild_from_data(self._guild_payload(guild_id))
+
+    def create_message(
+        self,
+        channel_id: int,
+        content: str | None = None,
+        attachments: int = 0,
+        image_url: str | None = None,
+    ) -> dict:
+        """Create the gateway payload of a message of a random user.
+
+        Args:
+            channel_id: ID of the channel of the message
+            content: Text of the message, random words mentioning the bot if
+                None
+            attachments: Number of image attachments
+            image_url: Base URL of the attachments
+
+        Returns:
+            Gateway payload of the message
+        """
+        if content is None:
+            words = " ".join(self.rng.choices(WORDS, k=self.rng.randint(3, 25)))
+            content = f"<@{self.bot_user['id']}> {words}"
+        payload = self._message_payload(
+            channel_id, self.rng.choice(self.users), content
+        )
+        payload["guild_id"] = str(self.channel_guilds[channel_id])
+        payload["mentions"] = [self.bot_user] if self.bot_user["id"] in content else []
+        for _ in range(attachments):
+            attachment_id = self.snowflake()
+            payload["attachments"].append(
+                {
+                    "id": str(attachment_id),
+                    "filename": "image.png",
+                    "size": 0,
+                    "url": f"{image_url}/{channel_id}/{attachment_id}/image.png",
+                    "proxy_url": f"{image_url}/{channel_id}/{attachment_id}/image.png",
+                    "content_type": "image/png",
+                    "width": 1024,
+                    "height": 1024,
+                }
+            )
+        return payload
+
+    def dispatch_message(self, client: Client, payload: dict) -> bool:
+        """Send the payload of a message to the gateway of the client.
+
+        Like the Discord gateway, the messages of the guilds that are not on
+        the shards of the client are not sent to it.
+
+        Returns:
+            Whether the message was sent to the client
+        """
+        guild_id = payload.get("guild_id")
+        if guild_id is not None and client.get_guild(int(guild_id)) is None:
+            return False
+        self._store(payload)
+        client._connection.parse_message_create(payload)
+        return True
+
+    async def request(self, route: Route, **kwargs) -> Any:
+        """Answer a REST request of the client."""
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        pattern = self._patterns.get(route.path)
+        if pattern is None:
+            pattern = self._patterns[route.path] = _path_pattern(route.path)
+        groups = pattern.search(route.url).groupdict()
+        params = {k: int(v) if v.isdigit() else v for k, v in groups.items()}
+        channel_id = params.get("channel_id")
+        match route.method, route.path:
+            case "POST", "/channels/{channel_id}/typing":
+                return None
+            case "POST", "/channels/{channel_id}/messages":
+                data = kwargs.get("json") or {}
+                payload = self._message_payload(
+                    channel_id, self.bot_user, data.get("content") or ""
+                )
+                self._store(payload)
+                reference = data.get("message_reference") or {}
+                message_id = reference.get("message_id")
+                if self.on_response:
+                    self.on_response(channel_id, message_id and int(message_id))
+                return payload
+            case "PATCH", "/channels/{channel_id}/messages/{message_id}":
+                data = kwargs.get("json") or {}
+                payload = self._message_payload(
+                    channel_id, self.bot_user, data.get("content") or ""
+                )
+                payload["id"] = str(params["message_id"])
+                return payload
+            case "DELETE", "/channels/{channel_id}/messages/{message_id}":
+                return None
+            case (
+                "PUT",
+                "/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me",
+            ):
+                if self.on_response:
+                    self.on_response(channel_id, params["message_id"])
+                return None
+            case "GET", "/channels/{channel_id}/messages":
+                limit = int((kwargs.get("params") or {}).get("limit", 50))
+                return self.messages.get(channel_id, [])[-limit:][::-1]
+            case "GET", "/channels/{channel_id}/messages/{message_id}":
+                for payload in self.messages.get(channel_id, []):
+                    if payload["id"] == str(params["message_id"]):
+                        return payload
+            case "GET", "/users/{user_id}":
+                for user in (self.bot_user, *self.users):
+                    if user["id"] == str(params["user_id"]):
+                        return user
+        raise NotFound(
+            SimpleNamespace(status=404, reason="Not Found"),
+            {"code": 10000, "message": f"Unknown route {route.method} {route.url}"},
+        )
+
+    def _user_payload(self, name: str, bot: bool = False) -> dict:
+        return {
+            "id": str(self._random_snowflake()),
+            "username": name,
+            "global_name": name.title(),
+            "discriminator": "0",
+            "avatar": None,
+            "bot": bot,
+        }
+
+    def _guild_payload(self, guild_id: int) -> dict:
+        channel_ids = [
+            channel_id
+            for channel_id, channel_guild_id in self.channel_guilds.items()
+            if channel_guild_id == guild_id
+        ]
+        return {
+            "id": str(guild_id),
+            "name": f"Guild {self.guild_ids.index(guild_id)}",
+            "owner_id": self.users[0]["id"],
+            "member_count": len(self.users) + 1,
+            "roles": [
+                {
+                    "id": str(guild_id),
+                    "name": "@everyone",
+                    "permissions": str((1 << 41) - 1),
+                    "position": 0,
+                    "color": 0,
+                    "hoist": False,
+                    "managed": False,
+                    "mentionable": False,
+                }
+            ],
+            "channels": [
+                {
+                    "id": str(channel_id),
+                    "type": 0,
+                    "name": f"channel-{i}",
+                    "position": i,
+                    "permission_overwrites": [],
+                    "guild_id": str(guild_id),
+                }
+                for i, channel_id in enumerate(channel_ids)
+            ],
+            "members": [
+                {"user": user, "roles": [], "joined_at": EPOCH.isoformat()}
+                for user in (self.bot_user, *self.users)
+            ],
+            "emojis": [],
+            "stickers": [],
+            "threads": [],
+        }
+
+    def _message_payload(self, channel_id: int, author: dict, content: str) -> dict:
+        payload = {
+            "id": str(self.snowflake()),
+            "channel_id": str(channel_id),
+            "author": author,
+            "content": content,
+            "timestamp": datetime.now(UTC).isoformat(),
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": [],
+            "pinned": False,
+            "type": 0,
+        }
+        return payload
+
+    def _store(self, payload: dict):
+        messages = self.messages.setdefault(int(payload["channel_id"]), [])
+        messages.append(payload)
+        # Keep the history bounded, like the message cache of the client
+        del messages[:-100]
+
+
+class ImageServer:
+    """Local HTTP server of generated images, standing in for the CDN.
+
+    ``count`` noise images of ``size`` pixels are generated up front so the
+    server costs little next to the bot, and each URL path is served one of
+    them picked by the path.
+    """
+
+    def __init__(self, size: int = 1024, count: int = 16, seed: int = 0):
+        self.size = size
+        self.count = count
+        self.seed = seed
+        self.url: str | None = None
+        self._images: list[bytes] = []
+        self._runner: web.AppRunner | None = None
+
+    async def start(self):
+        """Start serving images on a free local port."""
+        self._images = await asyncio.to_thread(self._create_images)
+        app = web.Application()
+        app.router.add_get("/{path:.*}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}/attachments"
+
+    async def close(self):
+        """Stop the server."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        data = self._images[hash(request.path) % len(self._images)]
+        return web.Response(body=data, content_type="image/png")
+
+    def _create_images(self) -> list[bytes]:
+        rng = random.Random(self.seed)
+        images = []
+        for _ in range(self.count):
+            small = Image.frombytes("RGB", (32, 32), rng.randbytes(32 * 32 * 3))
+            output = io.BytesIO()
+            small.resize((self.size, self.size)).save(output, format="PNG")
+            images.append(output.getvalue())
+        return images
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model answering after a random latency, calling tools first.
+
+    Each agent run calls ``tool_name`` without arguments ``tool_calls`` times,
+    then answers with ``reply_words`` words. Every call takes ``latency``
+    seconds on average, give or take ``jitter`` of it.
+    """
+
+    latency: float = 0.5
+    jitter: float = 0.5
+    tool_calls: int = 1
+    tool_name: str = "get_user"
+    reply_words: int = 40
+    seed: int = 0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: list, tool_choice: Any = None, **kwargs):
+        tools = [convert_to_openai_tool(tool) for tool in tools]
+        return self.bind(tools=tools, tool_choice=tool_choice, **kwargs)
+
+    def get_token_ids(self, text: str) -> list[int]:
+        # About 4 characters per token, no tokenizer to load
+        return list(range(len(text) // 4 + 1))
+
+    def _generate(self, messages: list[BaseMessage], *args, **kwargs) -> ChatResult:
+        time.sleep(self._get_latency())
+        return self._create_result(messages, **kwargs)
+
+    async def _agenerate(
+        self, messages: list[BaseMessage], *args, **kwargs
+    ) -> ChatResult:
+        await asyncio.sleep(self._get_latency())
+        return self._create_result(messages, **kwargs)
+
+    def _get_latency(self) -> float:
+        self.calls += 1
+        rng = random.Random(self.seed * 1_000_003 + self.calls)
+        return max(0.0, self.latency * (1 + self.jitter * rng.uniform(-1, 1)))
+
+    def _create_result(
+        self, messages: list[BaseMessage], tools: list | None = None, **kwargs
+    ) -> ChatResult:
+        names = [tool["function"]["name"] for tool in tools or []]
+        words = " ".join(random.Random(self.calls).choices(WORDS, k=self.reply_words))
+        if names == ["Response"]:
+            # Structured response of the agent
+            message = AIMessage(
+                content="",
+                tool_calls=[
+                    {
+                        "name": "Response",
+                        "args": {"type": "reply", "content": words},
+                        "id": f"call_{self.calls}",
+                    }
+                ],
+            )
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        turn = 0
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            turn += isinstance(message, ToolMessage)
+        if turn < self.tool_calls and self.tool_name in names:
+            message = AIMessage(
+                content="",
+                tool_calls=[
+                    {"name": self.tool_name, "args": {}, "id": f"call_{self.calls}"}
+                ],
+            )
+        else:
+            message = AIMessage(content=words)
+        return ChatResult(generations=[ChatGeneration(message=message)])
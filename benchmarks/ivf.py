@@ -0,0 +1,116 @@
+"""Compare the IVF index of the memory-mapped store with exact search.
+
+Usage:
+    python -m benchmarks.ivf --sizes 10000,100000,1000000 --nprobe 1,4,16,64
+"""
+
+import statistics
+import time
+from functools import partial
+
+import click
+import numpy as np
+
+from apeiron.stores.ivf import IVFIndex
+
+
+def generate_vectors(
+    size: int, dims: int, n_clusters: int, rng: np.random.Generator
+) -> np.ndarray:
+    """Generate normalized vectors scattered around random cluster centers."""
+    centers = rng.standard_normal((n_clusters, dims), dtype=np.float32)
+    vectors = np.empty((size, dims), dtype=np.float32)
+    for start in range(0, size, 65536):
+        end = min(start + 65536, size)
+        chunk = centers[rng.integers(0, n_clusters, end - start)]
+        chunk += rng.standard_normal(chunk.shape, dtype=np.float32)
+        vectors[start:end] = chunk / np.linalg.norm(chunk, axis=1, keepdims=True)
+    return vectors
+
+
+def exact_search(
+    vectors: np.ndarray, query: np.ndarray, k: int, chunk_size: int = 65536
+) -> np.ndarray:
+    """Get the rows of the k most similar vectors by scanning in chunks."""
+    scores = np.concatenate(
+        [
+            vectors[start : start + chunk_size] @ query
+            for start in range(0, len(vectors), chunk_size)
+        ]
+    )
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def ivf_search(
+    index: IVFIndex, vectors: np.ndarray, query: np.ndarray, k: int, nprobe: int
+) -> np.ndarray:
+    """Get the rows of the k most similar vectors of the probed lists."""
+    rows, scores = index.search(vectors, query, nprobe)
+    top = np.argpartition(-scores, min(k, len(rows)) - 1)[:k]
+    return rows[top[np.argsort(-scores[top])]]
+
+
+def measure(fn, queries: np.ndarray) -> tuple[list[np.ndarray], float, float]:
+    """Run a search for every query and get the p50 and p95 latencies in ms."""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(fn(query))
+        latencies.append((time.perf_counter() - start) * 1000)
+    quantiles = statistics.quantiles(latencies, n=20, method="inclusive")
+    return results, statistics.median(latencies), quantiles[18]
+
+
+@click.command()
+@click.option("--sizes", default="10000,100000,1000000", help="Numbers of vectors")
+@click.option("--dims", default=256, help="Dimensions of the vectors")
+@click.option("--nprobe", default="1,4,16,64", help="Numbers of lists to probe")
+@click.option("--queries", default=100, help="Number of queries per size")
+@click.option("--k", default=10, help="Number of neighbors to retrieve")
+@click.option("--clusters", default=1000, help="Number of generated clusters")
+@click.option("--seed", default=0, help="Seed of the generated vectors")
+def main(
+    sizes: str,
+    dims: int,
+    nprobe: str,
+    queries: int,
+    k: int,
+    clusters: int,
+    seed: int,
+):
+    rng = np.random.default_rng(seed)
+    click.echo(f"latency percentiles of n={queries} queries per search")
+    click.echo(f"{'size':>9} {'search':>12} {'p50 ms':>9} {'p95 ms':>9} {'recall':>7}")
+    for size in map(int, sizes.split(",")):
+        vectors = generate_vectors(size, dims, clusters, rng)
+        # Queries are perturbed copies of stored vectors
+        samples = vectors[rng.choice(size, queries, replace=False)]
+        samples = samples + 0.1 * rng.standard_normal(samples.shape, dtype=np.float32)
+        samples /= np.linalg.norm(samples, axis=1, keepdims=True)
+
+        expected, p50, p95 = measure(partial(exact_search, vectors, k=k), samples)
+        click.echo(f"{size:>9} {'exact':>12} {p50:>9.2f} {p95:>9.2f} {1.0:>7.3f}")
+
+        start = time.perf_counter()
+        index = IVFIndex.build(vectors, np.arange(size))
+        click.echo(
+            f"{size:>9} {'build':>12} {(time.perf_counter() - start) * 1000:>9.0f}"
+        )
+        for n in map(int, nprobe.split(",")):
+            found, p50, p95 = measure(
+                partial(ivf_search, index, vectors, k=k, nprobe=n), samples
+            )
+            recall = np.mean(
+                [
+                    len(set(f.tolist()) & set(e.tolist())) / k
+                    for f, e in zip(found, expected, strict=True)
+                ]
+            )
+            click.echo(
+                f"{size:>9} {f'ivf/{n}':>12} {p50:>9.2f} {p95:>9.2f} {recall:>7.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
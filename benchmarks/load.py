@@ -0,0 +1,268 @@
+"""Measure the latency and throughput of the bot under synthetic traffic.
+
+Runs the handlers of ``create_bot`` against the in-process fake Discord and
+the scripted chat model of ``benchmarks.fakes``, so no gateway connection or
+model account is needed. Messages mentioning the bot are sent following a
+traffic profile, and the latency of a message is the time until the bot
+replies to it or reacts to it, or to a later message of the same burst.
+
+Profiles:
+    channels: messages spread over many channels at a steady rate
+    bursty: bursts of messages in a few channels
+    images: like channels, with image attachments served by a local server
+
+The configuration of the bot is read from the environment as usual, e.g.
+``APEIRON_COALESCE_WINDOW`` or ``APEIRON_MAX_CONCURRENCY``.
+
+Usage:
+    python -m benchmarks.load --profile bursty --duration 30 --rate 20
+"""
+
+import asyncio
+import gc
+import os
+import random
+import resource
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+
+import click
+
+
+@dataclass
+class Event:
+    """Message sent by the traffic generator."""
+
+    time: float
+    channel_index: int
+    attachments: int = 0
+
+
+@dataclass
+class LoadStats:
+    """Latencies of the answered messages and memory samples of a run."""
+
+    sent: dict[int, list[tuple[int, float]]] = field(default_factory=dict)
+    latencies: list[float] = field(default_factory=list)
+    memory: list[tuple[float, int, int]] = field(default_factory=list)
+    first_sent: float | None = None
+    last_answered: float | None = None
+
+    def add_message(self, channel_id: int, message_id: int):
+        """Record a message sent to the bot."""
+        now = time.monotonic()
+        if self.first_sent is None:
+            self.first_sent = now
+        self.sent.setdefault(channel_id, []).append((message_id, now))
+
+    def add_response(self, channel_id: int, message_id: int | None):
+        """Answer the messages of a channel up to the referenced message."""
+        now = time.monotonic()
+        pending = self.sent.get(channel_id, [])
+        answered = [
+            sent_at
+            for sent_id, sent_at in pending
+            if message_id is None or sent_id <= message_id
+        ]
+        if not answered:
+            return
+        self.sent[channel_id] = pending[len(answered) :]
+        self.latencies.extend(now - sent_at for sent_at in answered)
+        self.last_answered = now
+
+    @property
+    def pending(self) -> int:
+        return sum(len(messages) for messages in self.sent.values())
+
+
+def generate_events(
+    profile: str, duration: float, rate: float, channels: int, seed: int
+) -> list[Event]:
+    """Generate the messages of a traffic profile, in sending order."""
+    rng = random.Random(seed)
+    events = []
+    now = 0.0
+    while True:
+        now += rng.expovariate(rate)
+        if now >= duration:
+            return events
+        match profile:
+            case "channels":
+                events.append(Event(now, rng.randrange(channels)))
+            case "images":
+                events.append(Event(now, rng.randrange(channels), rng.randint(1, 2)))
+            case "bursty":
+                size = rng.randint(2, 8)
+                channel_index = rng.randrange(min(channels, 3))
+                burst_time = now
+                for _ in range(size):
+                    events.append(Event(burst_time, channel_index))
+                    burst_time += rng.uniform(0.05, 0.3)
+                # Space the bursts out to keep the average rate of messages
+                now += (size - 1) / rate
+            case _:
+                raise ValueError(f"Invalid profile: {profile}")
+
+
+def get_rss() -> int:
+    """Get the resident memory of the process, in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Peak instead of current memory where procfs is not available
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def add_memory_sample(stats: LoadStats, start: float):
+    """Record the resident and the traced memory of the process."""
+    traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+    stats.memory.append((time.monotonic() - start, get_rss(), traced))
+
+
+async def sample_memory(stats: LoadStats, start: float, interval: float):
+    """Record the memory of the process every ``interval`` seconds."""
+    while True:
+        add_memory_sample(stats, start)
+        await asyncio.sleep(interval)
+
+
+async def run(
+    events: list[Event],
+    channels: int,
+    users: int,
+    rest_latency: float,
+    model_latency: float,
+    tool_calls: int,
+    drain_timeout: float,
+    sample_interval: float,
+    seed: int,
+) -> LoadStats:
+    from discord import AutoShardedBot, Intents
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    from apeiron.app import create_bot
+    from benchmarks.fakes import FakeDiscord, ImageServer, ScriptedChatModel
+
+    stats = LoadStats()
+    discord = FakeDiscord(
+        channels=channels,
+        users=users,
+        latency=rest_latency,
+        seed=seed,
+        on_response=stats.add_response,
+    )
+    bot = AutoShardedBot(intents=Intents.all())
+    discord.install(bot)
+    create_bot(
+        bot=bot,
+        chat_model=ScriptedChatModel(
+            latency=model_latency, tool_calls=tool_calls, seed=seed
+        ),
+        embeddings=DeterministicFakeEmbedding(size=1536),
+    )
+    images = ImageServer()
+    if any(event.attachments for event in events):
+        await images.start()
+
+    start = time.monotonic()
+    sampler = asyncio.create_task(sample_memory(stats, start, sample_interval))
+    try:
+        for event in events:
+            await asyncio.sleep(max(0.0, start + event.time - time.monotonic()))
+            channel_id = discord.channel_ids[event.channel_index]
+            payload = discord.create_message(
+                channel_id, attachments=event.attachments, image_url=images.url
+            )
+            discord.dispatch_message(bot, payload)
+            stats.add_message(channel_id, int(payload["id"]))
+
+        deadline = time.monotonic() + drain_timeout
+        while stats.pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+    finally:
+        sampler.cancel()
+        await images.close()
+    add_memory_sample(stats, start)
+    return stats
+
+
+@click.command()
+@click.option(
+    "--profile",
+    type=click.Choice(["channels", "bursty", "images"]),
+    default="channels",
+    help="Traffic profile",
+)
+@click.option("--duration", default=30.0, help="Duration of the traffic, in seconds")
+@click.option("--rate", default=10.0, help="Messages per second")
+@click.option("--channels", default=50, help="Number of channels")
+@click.option("--users", default=200, help="Number of users")
+@click.option("--rest-latency", default=0.05, help="Latency of the Discord API")
+@click.option("--model-latency", default=0.5, help="Latency of the model calls")
+@click.option("--tool-calls", default=1, help="Tool calls per agent run")
+@click.option("--drain-timeout", default=60.0, help="Wait for the last answers")
+@click.option("--sample-interval", default=1.0, help="Memory sampling interval")
+@click.option("--trace-memory", is_flag=True, help="Trace the Python allocations")
+@click.option("--seed", default=0, help="Seed of the traffic and of the model")
+def main(
+    profile: str,
+    duration: float,
+    rate: float,
+    channels: int,
+    users: int,
+    rest_latency: float,
+    model_latency: float,
+    tool_calls: int,
+    drain_timeout: float,
+    sample_interval: float,
+    trace_memory: bool,
+    seed: int,
+):
+    # The scripted model needs no tokenizer, unlike the default model
+    os.environ["APEIRON_MODEL"] = "scripted"
+    if profile == "images":
+        os.environ.setdefault("APEIRON_IMAGE_MAX_SIZE", "512")
+    if trace_memory:
+        tracemalloc.start()
+    events = generate_events(profile, duration, rate, channels, seed)
+    stats = asyncio.run(
+        run(
+            events,
+            channels,
+            users,
+            rest_latency,
+            model_latency,
+            tool_calls,
+            drain_timeout,
+            sample_interval,
+            seed,
+        )
+    )
+    gc.collect()
+
+    latencies = stats.latencies
+    click.echo(f"{len(events)} messages, {len(latencies)} answered")
+    if len(latencies) >= 2:
+        percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+        click.echo(
+            f"latency (n={len(latencies)}): p50 {percentiles[49]:.3f}s,"
+            f" p95 {percentiles[94]:.3f}s, p99 {percentiles[98]:.3f}s,"
+            f" max {max(latencies):.3f}s"
+        )
+    if stats.first_sent is not None and stats.last_answered is not None:
+        elapsed = stats.last_answered - stats.first_sent
+        click.echo(f"throughput: {len(latencies) / elapsed:.1f} messages/s")
+
+    click.echo(f"{'time':>8} {'rss MiB':>9} {'traced MiB':>11}")
+    step = max(1, len(stats.memory) // 10)
+    for elapsed, rss, traced in (*stats.memory[:-1:step], stats.memory[-1]):
+        click.echo(f"{elapsed:>7.1f}s {rss / 2**20:>9.1f} {traced / 2**20:>11.1f}")
+    (_, first_rss, _), (_, last_rss, _) = stats.memory[0], stats.memory[-1]
+    click.echo(f"memory growth: {(last_rss - first_rss) / 2**20:+.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Check the shard partitioning with several bot processes and a fake gateway.
+
+Starts ``--processes`` processes running the handlers of ``create_bot``, each
+on the shards assigned to it by ``APEIRON_SHARD_PROCESSES`` and
+``APEIRON_SHARD_PROCESS_INDEX``, with a checkpoint database per shard. The
+fake gateway of the main process sends each message to every process, each
+process drops the messages of the guilds that are not on its shards, and
+the harness checks that:
+
+- the shards are partitioned between the processes
+- every message is answered by the process running its shard
+- the checkpoints of each thread are in the database of its shard
+
+Usage:
+    python -m benchmarks.sharding --processes 3 --shard-count 8
+"""
+
+import asyncio
+import multiprocessing
+import os
+import queue
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import click
+
+from apeiron.sharding import get_shard_id, get_thread_shard_id
+from benchmarks.load import LoadStats
+
+
+def run_process(
+    index: int,
+    env: dict[str, str],
+    options: dict,
+    inbox: multiprocessing.Queue,
+    outbox: multiprocessing.Queue,
+):
+    """Run a bot process receiving the messages of its shards from the inbox."""
+    os.environ.update(env)
+    asyncio.run(serve(index, options, inbox, outbox))
+
+
+async def serve(
+    index: int,
+    options: dict,
+    inbox: multiprocessing.Queue,
+    outbox: multiprocessing.Queue,
+):
+    from discord import AutoShardedBot, Intents
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    from apeiron.app import create_bot
+    from apeiron.sharding import create_shard_config, get_shard_status
+    from benchmarks.fakes import FakeDiscord, ScriptedChatModel
+
+    shards = create_shard_config()
+    bot = AutoShardedBot(
+        intents=Intents.all(),
+        shard_count=shards.shard_count,
+        shard_ids=shards.shard_ids,
+    )
+    discord = FakeDiscord(
+        channels=options["channels"],
+        guilds=options["guilds"],
+        latency=options["rest_latency"],
+        seed=options["seed"],
+        on_response=lambda channel_id, message_id: outbox.put(
+            ("answer", index, channel_id, message_id)
+        ),
+    )
+    discord.install(bot)
+    create_bot(
+        bot=bot,
+        chat_model=ScriptedChatModel(
+            latency=options["model_latency"], seed=options["seed"] + index
+        ),
+        embeddings=DeterministicFakeEmbedding(size=1536),
+    )
+    outbox.put(("ready", index, shards.shard_ids, get_shard_status(bot)))
+    while (payload := await asyncio.to_thread(inbox.get)) is not None:
+        discord.dispatch_message(bot, payload)
+    # Let the last checkpoints be written
+    await asyncio.sleep(0.5)
+    outbox.put(("done", index, None, None))
+
+
+def get_checkpoint_threads(path: Path) -> set[str]:
+    """Get the threads with checkpoints in a checkpoint database."""
+    conn = sqlite3.connect(path)
+    try:
+        return {row[0] for row in conn.execute("SELECT thread_id FROM checkpoints")}
+    finally:
+        conn.close()
+
+
+@click.command()
+@click.option("--processes", default=3, help="Number of bot processes")
+@click.option("--shard-count", default=8, help="Total number of shards")
+@click.option("--guilds", default=24, help="Number of guilds")
+@click.option("--channels", default=48, help="Number of channels")
+@click.option("--messages", default=200, help="Number of messages")
+@click.option("--rate", default=20.0, help="Messages per second")
+@click.option("--rest-latency", default=0.02, help="Latency of the Discord API")
+@click.option("--model-latency", default=0.1, help="Latency of the model calls")
+@click.option("--timeout", default=120.0, help="Wait for the answers")
+@click.option("--seed", default=0, help="Seed of the fake Discord")
+def main(
+    processes: int,
+    shard_count: int,
+    guilds: int,
+    channels: int,
+    messages: int,
+    rate: float,
+    rest_latency: float,
+    model_latency: float,
+    timeout: float,
+    seed: int,
+):
+    from benchmarks.fakes import FakeDiscord
+
+    options = {
+        "channels": channels,
+        "guilds": guilds,
+        "rest_latency": rest_latency,
+        "model_latency": model_latency,
+        "seed": seed,
+    }
+    gateway = FakeDiscord(channels=channels, guilds=guilds, seed=seed)
+    directory = Path(tempfile.mkdtemp(prefix="apeiron-sharding-"))
+    context = multiprocessing.get_context("spawn")
+    outbox = context.Queue()
+    inboxes = [context.Queue() for _ in range(processes)]
+    workers = []
+    for index, inbox in enumerate(inboxes):
+        env = {
+            "APEIRON_SHARD_COUNT": str(shard_count),
+            "APEIRON_SHARD_PROCESSES": str(processes),
+            "APEIRON_SHARD_PROCESS_INDEX": str(index),
+            "APEIRON_CHECKPOINTER": "sqlite",
+            "APEIRON_CHECKPOINT_PATH": str(directory / "checkpoints-{shard_id}.sqlite"),
+            # The scripted model needs no tokenizer, unlike the default model
+            "APEIRON_MODEL": "scripted",
+        }
+        worker = context.Process(
+            target=run_process, args=(index, env, options, inbox, outbox)
+        )
+        worker.start()
+        workers.append(worker)
+
+    errors = []
+    owners: dict[int, int] = {}
+    for _ in range(processes):
+        _, index, shard_ids, status = outbox.get(timeout=timeout)
+        click.echo(f"process {index}: shards {shard_ids}, status {status}")
+        for shard_id in shard_ids:
+            if shard_id in owners:
+                errors.append(f"shard {shard_id} run by {owners[shard_id]}, {index}")
+            owners[shard_id] = index
+    if sorted(owners) != list(range(shard_count)):
+        errors.append(f"shards not run: {set(range(shard_count)) - set(owners)}")
+
+    stats = LoadStats()
+    answered_by: dict[int, set[int]] = {}
+    owner_of_channel = {
+        channel_id: owners.get(get_shard_id(guild_id, shard_count))
+        for channel_id, guild_id in gateway.channel_guilds.items()
+    }
+
+    def receive(block: bool):
+        try:
+            kind, index, channel_id, message_id = outbox.get(block, timeout=0.1)
+        except queue.Empty:
+            return
+        if kind == "answer":
+            stats.add_response(channel_id, message_id)
+            answered_by.setdefault(channel_id, set()).add(index)
+
+    # Each process keeps the messages of the guilds on its own shards
+    start = time.monotonic()
+    for i in range(messages):
+        channel_id = gateway.channel_ids[i % len(gateway.channel_ids)]
+        payload = gateway.create_message(channel_id)
+        for inbox in inboxes:
+            inbox.put(payload)
+        stats.add_message(channel_id, int(payload["id"]))
+        while time.monotonic() < start + (i + 1) / rate:
+            receive(block=True)
+    deadline = time.monotonic() + timeout
+    while stats.pending and time.monotonic() < deadline:
+        receive(block=True)
+
+    for inbox in inboxes:
+        inbox.put(None)
+    for worker in workers:
+        worker.join(timeout)
+
+    if stats.pending:
+        errors.append(f"{stats.pending} messages not answered")
+    for channel_id, indexes in answered_by.items():
+        if indexes != {owner_of_channel[channel_id]}:
+            errors.append(
+                f"channel {channel_id} answered by {indexes},"
+                f" owned by {owner_of_channel[channel_id]}"
+            )
+    for path in sorted(directory.glob("checkpoints-*.sqlite")):
+        shard_id = int(path.stem.removeprefix("checkpoints-"))
+        threads = get_checkpoint_threads(path)
+        click.echo(f"shard {shard_id}: {len(threads)} threads")
+        for thread_id in threads:
+            if get_thread_shard_id(thread_id, shard_count) != shard_id:
+                errors.append(f"thread {thread_id} saved by shard {shard_id}")
+
+    if len(stats.latencies) >= 2:
+        percentiles = statistics.quantiles(stats.latencies, n=100, method="inclusive")
+        click.echo(
+            f"latency (n={len(stats.latencies)}): p50 {percentiles[49]:.3f}s,"
+            f" p99 {percentiles[98]:.3f}s"
+        )
+    for error in errors:
+        click.echo(f"error: {error}", err=True)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
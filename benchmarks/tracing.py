@@ -0,0 +1,99 @@
+"""Measure the overhead of the sampled tracer on agent runs.
+
+Runs a ReAct agent backed by a fake chat model calling a tool, without
+callbacks and with the sampled tracer at a few sample rates. Traces are
+exported to a function discarding them, so only the instrumentation is
+measured, not the tracking server.
+
+Usage:
+    python -m benchmarks.tracing --runs 200 --rate 0 --rate 0.1 --rate 1
+"""
+
+import asyncio
+import time
+from typing import Any
+
+import click
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+from langgraph.prebuilt import create_react_agent
+
+from apeiron.tracing import SampledTracer, TraceExporter
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model calling the tool once, then answering."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def bind_tools(self, tools: Any, **kwargs) -> "FakeChatModel":
+        return self
+
+    def _generate(self, messages: list[BaseMessage], *args, **kwargs) -> ChatResult:
+        if isinstance(messages[-1], ToolMessage):
+            message = AIMessage(content="It is sunny.")
+        else:
+            message = AIMessage(
+                content="",
+                tool_calls=[
+                    {"name": "get_weather", "args": {"city": "Paris"}, "id": "1"}
+                ],
+            )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+@tool
+def get_weather(city: str) -> str:
+    """Get the weather of a city."""
+    return f"Sunny in {city}"
+
+
+async def run(graph: Any, runs: int, callbacks: list) -> float:
+    """Run the agent, returning the average duration of a run in seconds."""
+    start = time.perf_counter()
+    for i in range(runs):
+        await graph.ainvoke(
+            {"messages": [("user", f"Weather in Paris? {i}")]},
+            {"callbacks": callbacks},
+        )
+    return (time.perf_counter() - start) / runs
+
+
+@click.command()
+@click.option("--runs", default=200, help="Number of agent runs per setting")
+@click.option(
+    "--rate",
+    "rates",
+    multiple=True,
+    type=float,
+    default=(0.0, 0.1, 1.0),
+    help="Sample rates to measure",
+)
+def main(runs: int, rates: tuple[float, ...]):
+    graph = create_react_agent(FakeChatModel(), [get_weather])
+    # Warm up the graph before measuring
+    asyncio.run(run(graph, 10, []))
+
+    exporter = TraceExporter(export=lambda traces: None, flush_interval=0.1)
+    baseline = asyncio.run(run(graph, runs, []))
+    click.echo(f"{'setting':>12} {'us/run':>9} {'overhead':>9}")
+    click.echo(f"{'none':>12} {baseline * 1e6:>9.1f} {'':>9}")
+    for rate in rates:
+        tracer = SampledTracer(exporter, sample_rate=rate)
+        duration = asyncio.run(run(graph, runs, [tracer]))
+        click.echo(
+            f"{f'rate={rate:g}':>12} {duration * 1e6:>9.1f}"
+            f" {duration / baseline - 1:>9.1%}"
+        )
+    exporter.close()
+    click.echo(
+        f"exported {exporter.exported} traces, dropped {exporter.dropped} traces"
+    )
+
+
+if __name__ == "__main__":
+    main()
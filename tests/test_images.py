@@ -0,0 +1,116 @@
+import asyncio
+import io
+from collections import defaultdict
+from collections.abc import Awaitable, Callable
+
+import pytest
+from PIL import Image
+
+from apeiron.images import ImageCache
+from benchmarks.fakes import ImageServer
+
+
+def run_with_server(test: Callable[[ImageServer], Awaitable[None]], **kwargs):
+    """Run a test against a local image server."""
+
+    async def main():
+        server = ImageServer(**kwargs)
+        await server.start()
+        try:
+            await test(server)
+        finally:
+            await server.close()
+
+    asyncio.run(main())
+
+
+def get_image_urls(server: ImageServer) -> dict[int, list[str]]:
+    """Get attachment URLs of the server by the image they are served."""
+    urls = defaultdict(list)
+    for i in range(10 * server.count):
+        path = f"/attachments/{i}.png"
+        # The server picks the image of a path by its hash
+        urls[hash(path) % server.count].append(f"{server.url}/{i}.png?ex={i}")
+    return urls
+
+
+def test_get_downloads_and_downscales():
+    async def test(server: ImageServer):
+        cache = ImageCache(max_size=64)
+        try:
+            url = next(iter(get_image_urls(server).values()))[0]
+            image = await cache.get(url)
+            assert image.media_type == "image/jpeg"
+            assert Image.open(io.BytesIO(image.data)).size == (64, 64)
+            assert cache.stats.misses == 1
+            assert cache.stats.downloaded_bytes > len(image.data)
+            # Signed URLs of the same attachment are served from the cache
+            assert await cache.get(url.replace("?ex=", "?ex=1")) is image
+            assert cache.stats.hits == 1
+            data_urls = await cache.get_data_urls([url])
+            assert data_urls[url].startswith("data:image/jpeg;base64,")
+        finally:
+            await cache.close()
+
+    run_with_server(test, size=256)
+
+
+def test_evicts_least_recently_used_images():
+    async def test(server: ImageServer):
+        urls = [urls[0] for urls in get_image_urls(server).values()][:3]
+        probe = ImageCache(max_size=64)
+        try:
+            sizes = [len((await probe.get(url)).data) for url in urls]
+        finally:
+            await probe.close()
+        cache = ImageCache(max_size=64, max_bytes=sum(sizes) - 1)
+        try:
+            await cache.get(urls[0])
+            await cache.get(urls[1])
+            await cache.get(urls[0])
+            await cache.get(urls[2])
+            assert cache.peek(urls[0]) is not None
+            assert cache.peek(urls[1]) is None
+            assert cache.peek(urls[2]) is not None
+            assert cache._size == sizes[0] + sizes[2]
+        finally:
+            await cache.close()
+
+    run_with_server(test, size=256)
+
+
+def test_rejects_large_downloads():
+    async def test(server: ImageServer):
+        cache = ImageCache(max_size=64, max_download_bytes=1000)
+        try:
+            url = next(iter(get_image_urls(server).values()))[0]
+            with pytest.raises(ValueError):
+                await cache.get(url)
+            assert await cache.get_data_urls([url]) == {}
+            assert cache.stats.errors == 1
+            assert cache.peek(url) is None
+        finally:
+            await cache.close()
+
+    run_with_server(test, size=256)
+
+
+def test_get_duplicates_of_the_channel():
+    async def test(server: ImageServer):
+        cache = ImageCache(max_size=64)
+        try:
+            image_urls = get_image_urls(server)
+            same = next(urls for urls in image_urls.values() if len(urls) >= 3)
+            other = next(urls[0] for urls in image_urls.values() if urls is not same)
+            channel = (1, 10)
+            assert await cache.get_duplicates([same[0], same[1], other], channel) == {
+                same[1]
+            }
+            # Compared with the previous images of the channel only
+            assert await cache.get_duplicates([same[2]], channel) == {same[2]}
+            assert await cache.get_duplicates([same[2]], (2, 20)) == set()
+            assert cache.stats.duplicates == 2
+        finally:
+            await cache.close()
+
+    run_with_server(test, size=256)
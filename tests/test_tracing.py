@@ -0,0 +1,104 @@
+from types import SimpleNamespace
+from typing import Any
+from uuid import uuid4
+
+from apeiron.tracing import SampledTracer, TraceRecord, export_to_mlflow
+
+
+class FakeMlflowClient:
+    """MLflow client recording the calls of the trace export."""
+
+    def __init__(self):
+        self.calls: list[tuple[str, dict[str, Any]]] = []
+
+    def start_trace(self, **kwargs) -> SimpleNamespace:
+        self.calls.append(("start_trace", kwargs))
+        return SimpleNamespace(request_id="trace", span_id=kwargs["name"])
+
+    def start_span(self, **kwargs) -> SimpleNamespace:
+        self.calls.append(("start_span", kwargs))
+        return SimpleNamespace(span_id=kwargs["name"])
+
+    def end_span(self, **kwargs):
+        self.calls.append(("end_span", kwargs))
+
+    def end_trace(self, **kwargs):
+        self.calls.append(("end_trace", kwargs))
+
+
+class ListExporter:
+    """Exporter keeping the submitted traces."""
+
+    def __init__(self):
+        self.traces: list[TraceRecord] = []
+
+    def submit(self, trace: TraceRecord):
+        self.traces.append(trace)
+
+
+def run_graph(tracer: SampledTracer, fail: bool = False):
+    """Send the callbacks of a graph calling a model from a hidden step.
+
+    The hidden tag of the step is not inherited by the model call, like the
+    local tags of a runnable.
+    """
+    root, hidden, model = uuid4(), uuid4(), uuid4()
+    tracer.on_chain_start({}, {"text": "hello"}, run_id=root, name="root")
+    tracer.on_chain_start(
+        {}, {}, run_id=hidden, parent_run_id=root, tags=["langsmith:hidden"]
+    )
+    tracer.on_chat_model_start(
+        {"name": "model"}, [["hello"]], run_id=model, parent_run_id=hidden
+    )
+    if fail:
+        tracer.on_llm_error(ValueError("boom"), run_id=model)
+        tracer.on_chain_error(ValueError("boom"), run_id=hidden)
+        tracer.on_chain_error(ValueError("boom"), run_id=root)
+        return
+    tracer.on_llm_end("hi", run_id=model)
+    tracer.on_chain_end({}, run_id=hidden)
+    tracer.on_chain_end({"text": "hi"}, run_id=root)
+
+
+def test_children_of_hidden_runs_are_attached_to_their_visible_ancestor():
+    exporter = ListExporter()
+    tracer = SampledTracer(exporter, sample_rate=1.0)
+    run_graph(tracer)
+
+    (trace,) = exporter.traces
+    spans = {span.name: span for span in trace.spans}
+    assert "hidden" not in spans
+    assert spans["model"].parent_run_id == spans["root"].run_id
+    assert not tracer._traces and not tracer._spans and not tracer._parents
+
+
+def test_failed_runs_are_exported_when_not_sampled():
+    exporter = ListExporter()
+    run_graph(SampledTracer(exporter, sample_rate=0.0))
+    assert not exporter.traces
+
+    run_graph(SampledTracer(exporter, sample_rate=0.0), fail=True)
+    (trace,) = exporter.traces
+    assert trace.error
+
+
+def test_export_to_mlflow_logs_spans_under_their_parents():
+    exporter = ListExporter()
+    run_graph(SampledTracer(exporter, sample_rate=1.0))
+    client = FakeMlflowClient()
+    export_to_mlflow(exporter.traces, client)
+
+    names = [name for name, _ in client.calls]
+    assert names[0] == "start_trace" and names[-1] == "end_trace"
+    assert names.count("start_span") == names.count("end_span") > 0
+    start_trace = client.calls[0][1]
+    assert start_trace["inputs"] == {"text": "hello"}
+    started = {
+        kwargs["name"]: kwargs for name, kwargs in client.calls if name == "start_span"
+    }
+    # The model span is the child of the root span, not of the hidden run
+    assert started["model"]["parent_id"] == "root"
+    ended = [kwargs for name, kwargs in client.calls if name == "end_span"]
+    assert all(kwargs["status"] == "OK" for kwargs in ended)
+    # Children end before their parents
+    assert ended[0]["span_id"] == "model"